@@ -0,0 +1,53 @@
+"""Measures the bytes saved by compressing the responses of the existing routes.
+
+Run from the project folder:
+    python -m benchmarks.bench_compression
+"""
+import re
+import time
+from crayfish_analysis_app import create_app
+from config import TestingConfig
+
+
+def main():
+    app = create_app(TestingConfig)
+    client = app.test_client()
+
+    dashboard = client.get("/dashboard/").get_data(as_text=True)
+    scripts = re.findall(r'src="(/dashboard/_dash-component-suites/[^"]+)"', dashboard)
+    bar_callback = {
+        "output": "bar-chart.figure",
+        "outputs": {"id": "bar-chart", "property": "figure"},
+        "inputs": [{"id": "bar-update-button", "property": "n_clicks", "value": None}],
+        "changedPropIds": [],
+        "state": [{"id": id_, "property": "value", "value": value} for id_, value in
+                  [("bar-carapace-length-min", None), ("bar-carapace-length-max", None),
+                   ("bar-weight-min", None), ("bar-weight-max", None), ("bar-sex", ["M", "F"])]],
+    }
+    requests = [
+        ("GET /crayfish1", lambda headers: client.get("/crayfish1", headers=headers)),
+        ("GET /crayfish2", lambda headers: client.get("/crayfish2", headers=headers)),
+        ("GET /crayfish1/download", lambda headers: client.get("/crayfish1/download", headers=headers)),
+        ("GET /crayfish2/download", lambda headers: client.get("/crayfish2/download", headers=headers)),
+        ("GET /dashboard/", lambda headers: client.get("/dashboard/", headers=headers)),
+        ("bar chart callback", lambda headers: client.post("/dashboard/_dash-update-component", json=bar_callback,
+                                                           headers=headers)),
+        (f"{len(scripts)} dashboard scripts", lambda headers: [client.get(script, headers=headers)
+                                                              for script in scripts]),
+    ]
+
+    print(f"{'response':<24} {'plain (B)':>10} {'gzip (B)':>10} {'saved':>6} {'time (ms)':>10}")
+    for name, send in requests:
+        plain = send({})
+        start = time.perf_counter()
+        compressed = send({"Accept-Encoding": "gzip"})
+        elapsed = (time.perf_counter() - start) * 1000
+        plain_size = sum(len(r.data) for r in plain) if isinstance(plain, list) else len(plain.data)
+        compressed_size = (sum(len(r.data) for r in compressed) if isinstance(compressed, list)
+                           else len(compressed.data))
+        print(f"{name:<24} {plain_size:>10} {compressed_size:>10} {1 - compressed_size / plain_size:>6.0%} "
+              f"{elapsed:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
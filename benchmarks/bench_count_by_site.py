@@ -0,0 +1,60 @@
+"""Compares counting the bar chart one site at a time with counting every site in one pass.
+
+Run from the project folder:
+    python -m benchmarks.bench_count_by_site
+"""
+import timeit
+import numpy as np
+import pandas as pd
+from crayfish_analysis_app.dash_app.app import count_crayfish
+from crayfish_analysis_app.dash_app.range_index import count_by_site
+from crayfish_analysis_app.dash_app.dataset import compact_survey
+
+
+def make_survey2(num_sites, rows_per_site, seed=0):
+    """
+    Makes crayfish2 style rows for a number of made up sites
+    Args:
+        num_sites (int): The number of sites
+        rows_per_site (int): The number of crayfish caught at each site
+        seed (int): Seed for the random numbers
+    Raises:
+        NA
+    Returns:
+        survey2 (DataFrame): The rows, one per crayfish
+        site_list (list): The sites
+    """
+    rng = np.random.default_rng(seed)
+    num_rows = num_sites * rows_per_site
+    site_list = [f"SITE{i:04d}" for i in range(num_sites)]
+    survey2 = pd.DataFrame({
+        "site": np.repeat(site_list, rows_per_site),
+        "gender": rng.choice(["M", "F"], num_rows),
+        "length": rng.normal(35, 8, num_rows).clip(5),
+        "weight": rng.normal(15, 6, num_rows).clip(1),
+    })
+    return compact_survey(survey2), site_list
+
+
+def main():
+    print(f"{'sites':>6} {'rows':>9} {'loop (ms)':>10} {'one pass (ms)':>14} {'speed up':>9}")
+    for num_sites in (4, 100, 300, 1000):
+        survey2, site_list = make_survey2(num_sites, 500)
+        filters = (20, 50, 5, 30, ['M', 'F'])
+
+        def loop():
+            return [count_crayfish(survey2, site, *filters) for site in site_list]
+
+        def one_pass():
+            return count_by_site(survey2, site_list, *filters)
+
+        assert loop() == one_pass()
+        repeat = max(1, 200 // num_sites)
+        loop_time = min(timeit.repeat(loop, number=repeat, repeat=3)) / repeat * 1000
+        one_pass_time = min(timeit.repeat(one_pass, number=repeat, repeat=3)) / repeat * 1000
+        print(f"{num_sites:>6} {len(survey2):>9} {loop_time:>10.2f} {one_pass_time:>14.2f} "
+              f"{loop_time / one_pass_time:>8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Times the forum relationship loads with and without the foreign key indexes, on a database with 150,000 likes.
+
+Run from the project folder:
+    python -m benchmarks.bench_forum_indexes
+"""
+import random
+import tempfile
+import timeit
+from pathlib import Path
+from sqlalchemy import text
+from sqlalchemy.orm import selectinload
+from crayfish_analysis_app import create_app
+from crayfish_analysis_app.models import db, User, Post, Comment, Like, remove_user_from_post_counts
+from config import TestingConfig
+
+NUM_USERS = 5000
+NUM_POSTS = 20000
+NUM_LIKES = 150000
+NUM_COMMENTS = 50000
+# Indexes on the columns the relationships and delete_user look up, the unique like index is not dropped
+FOREIGN_KEY_INDEXES = ["ix_post_author", "ix_comment_post_id", "ix_comment_author", "ix_like_post_id"]
+
+
+def fill_database():
+    """
+    Adds made up users, posts, likes and comments
+    Args:
+        NA
+    Raises:
+        NA
+    Returns:
+        NA
+    """
+    rng = random.Random(0)
+    db.session.execute(db.insert(User), [{"id": i, "username": f"user{i}", "email": f"user{i}@test.com",
+                                          "password": "x"} for i in range(1, NUM_USERS + 1)])
+    db.session.execute(db.insert(Post), [{"id": i, "text": f"Post {i}", "author": rng.randint(1, NUM_USERS)}
+                                         for i in range(1, NUM_POSTS + 1)])
+    likes = set()
+    while len(likes) < NUM_LIKES:
+        likes.add((rng.randint(1, NUM_USERS), rng.randint(1, NUM_POSTS)))
+    db.session.execute(db.insert(Like), [{"author": author, "post_id": post_id} for author, post_id in likes])
+    db.session.execute(db.insert(Comment), [{"text": "A comment", "author": rng.randint(1, NUM_USERS),
+                                             "post_id": rng.randint(1, NUM_POSTS)} for _ in range(NUM_COMMENTS)])
+    db.session.commit()
+
+
+def time_loads():
+    """
+    Times the loads the forum and delete_user make
+    Args:
+        NA
+    Raises:
+        NA
+    Returns:
+        timings (dict): Milliseconds for each load
+    """
+    page = list(range(NUM_POSTS - 19, NUM_POSTS + 1))
+
+    def forum_page():
+        db.session.expunge_all()
+        posts = db.session.execute(db.select(Post).where(Post.id.in_(page))
+                                   .options(selectinload(Post.likes), selectinload(Post.comments))).scalars().all()
+        return sum(len(post.likes) + len(post.comments) for post in posts)
+
+    def lazy_likes():
+        db.session.expunge_all()
+        return sum(len(db.session.get(Post, post_id).likes) for post_id in page)
+
+    def user_posts():
+        db.session.expunge_all()
+        return len(db.session.get(User, 1).posts)
+
+    def delete_user_counts():
+        remove_user_from_post_counts(1)
+        db.session.rollback()
+
+    loads = {"forum page (selectin)": forum_page, "20 lazy post.likes": lazy_likes,
+             "user.posts": user_posts, "delete_user counts": delete_user_counts}
+    return {name: min(timeit.repeat(load, number=5, repeat=3)) / 5 * 1000 for name, load in loads.items()}
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        class BenchmarkConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = "sqlite:///" + str(Path(folder).joinpath("bench.db"))
+            SQLALCHEMY_ECHO = False
+
+        app = create_app(BenchmarkConfig)
+        with app.app_context():
+            fill_database()
+            with_indexes = time_loads()
+            for name in FOREIGN_KEY_INDEXES:
+                db.session.execute(text(f"DROP INDEX {name}"))
+            db.session.commit()
+            without_indexes = time_loads()
+            db.session.remove()
+            db.engine.dispose()
+
+    print(f"{NUM_LIKES} likes, {NUM_COMMENTS} comments, {NUM_POSTS} posts")
+    print(f"{'load':<24} {'no index (ms)':>14} {'index (ms)':>11} {'speed up':>9}")
+    for name in with_indexes:
+        print(f"{name:<24} {without_indexes[name]:>14.2f} {with_indexes[name]:>11.2f} "
+              f"{without_indexes[name] / with_indexes[name]:>8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
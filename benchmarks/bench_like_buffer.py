@@ -0,0 +1,115 @@
+"""Compares liking posts with one commit per like against the write-behind like buffer, with many threads
+liking at once on a SQLite file with a short busy timeout.
+
+Run from the project folder:
+    python -m benchmarks.bench_like_buffer
+"""
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+from crayfish_analysis_app import create_app
+from crayfish_analysis_app.like_buffer import LikeBuffer
+from crayfish_analysis_app.models import db, User, Post, Like, toggle_like
+from config import TestingConfig
+
+NUM_USERS = 200
+NUM_POSTS = 50
+LIKES_PER_THREAD = 200
+# Seconds a connection waits for the write lock before "database is locked", the sqlite3 default is 5
+BUSY_TIMEOUT = 0.1
+
+
+def run_burst(app, toggle, num_threads):
+    """
+    Has every thread like and unlike random posts as fast as it can
+    Args:
+        app (Flask): The app
+        toggle (function): Called with (user_id, post_id) for each click
+        num_threads (int): The number of threads clicking at once
+    Raises:
+        NA
+    Returns:
+        seconds (float): The time taken for all the clicks
+        latencies (list): The seconds each click took
+        errors (int): The number of clicks that failed
+    """
+    latencies = []
+    errors = []
+    start = threading.Barrier(num_threads + 1)
+
+    def clicker(seed):
+        rng = random.Random(seed)
+        with app.app_context():
+            start.wait()
+            for _ in range(LIKES_PER_THREAD):
+                before = time.perf_counter()
+                try:
+                    toggle(rng.randint(1, NUM_USERS), rng.randint(1, NUM_POSTS))
+                except Exception:
+                    db.session.rollback()
+                    errors.append(1)
+                latencies.append(time.perf_counter() - before)
+            db.session.remove()
+
+    threads = [threading.Thread(target=clicker, args=(i,)) for i in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    began = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - began, latencies, len(errors)
+
+
+def check_counts():
+    """True if every stored like count matches the like rows"""
+    likes = db.select(db.func.count(Like.id)).where(Like.post_id == Post.id).scalar_subquery()
+    return db.session.execute(db.select(db.func.count(Post.id)).where(Post.like_count != likes)).scalar() == 0
+
+
+def main():
+    print(f"{'mode':<10} {'threads':>7} {'clicks/s':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} {'errors':>7} "
+          f"{'counts ok':>9}")
+    for mode in ("commit", "buffer"):
+        for num_threads in (1, 8, 32):
+            with tempfile.TemporaryDirectory() as folder:
+                class BenchmarkConfig(TestingConfig):
+                    SQLALCHEMY_DATABASE_URI = "sqlite:///" + str(Path(folder).joinpath("bench.db"))
+                    SQLALCHEMY_ECHO = False
+                    SQLALCHEMY_ENGINE_OPTIONS = {"connect_args": {"timeout": BUSY_TIMEOUT},
+                                                 "pool_size": 64, "max_overflow": 0}
+
+                app = create_app(BenchmarkConfig)
+                with app.app_context():
+                    db.session.execute(db.insert(User), [{"id": i, "username": f"user{i}",
+                                                          "email": f"user{i}@test.com", "password": "x"}
+                                                         for i in range(1, NUM_USERS + 1)])
+                    db.session.execute(db.insert(Post), [{"id": i, "text": f"Post {i}", "author": 1}
+                                                         for i in range(1, NUM_POSTS + 1)])
+                    db.session.commit()
+
+                if mode == "commit":
+                    seconds, latencies, errors = run_burst(app, toggle_like, num_threads)
+                else:
+                    like_buffer = LikeBuffer(app)
+                    seconds, latencies, errors = run_burst(app, like_buffer.toggle, num_threads)
+                    # Include writing the last batch
+                    began = time.perf_counter()
+                    with app.app_context():
+                        like_buffer.flush()
+                    seconds += time.perf_counter() - began
+
+                with app.app_context():
+                    counts_ok = check_counts()
+                    db.engine.dispose()
+
+            latencies.sort()
+            print(f"{mode:<10} {num_threads:>7} {len(latencies) / seconds:>9.0f} "
+                  f"{latencies[len(latencies) // 2] * 1000:>9.2f} {latencies[len(latencies) * 99 // 100] * 1000:>9.2f} "
+                  f"{errors:>7} {str(counts_ok):>9}")
+
+
+if __name__ == '__main__':
+    main()
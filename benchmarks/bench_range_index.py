@@ -0,0 +1,42 @@
+"""Compares answering the bar chart filters by scanning the rows with answering them from the range index,
+and shows which of the two RangeCountIndex.count_by_site picks. The costs in range_index.py come from it.
+
+Run from the project folder:
+    python -m benchmarks.bench_range_index
+"""
+import timeit
+import numpy as np
+from crayfish_analysis_app.dash_app.range_index import count_by_site, trees_are_quicker
+from crayfish_analysis_app.dash_app.range_index import RangeCountIndex
+from benchmarks.bench_count_by_site import make_survey2
+
+
+def main():
+    rng = np.random.default_rng(1)
+    print(f"{'sites':>6} {'rows':>9} {'build (ms)':>11} {'scan (ms)':>10} {'trees (ms)':>11} {'picked':>7}")
+    for num_sites, rows_per_site in ((4, 500), (4, 2000), (4, 16000), (4, 500000), (20, 8000), (20, 16000),
+                                     (100, 8000), (100, 16000), (300, 500)):
+        survey2, site_list = make_survey2(num_sites, rows_per_site)
+        index = RangeCountIndex(survey2)
+        build_time = timeit.timeit(lambda: index.count_with_trees(site_list, 0, 0, 0, 0, ['M', 'F']),
+                                   number=1) * 1000
+
+        queries = []
+        for _ in range(50):
+            length_min, length_max = sorted(rng.uniform(10, 60, 2))
+            weight_min, weight_max = sorted(rng.uniform(0, 35, 2))
+            queries.append((length_min, length_max, weight_min, weight_max, ['M', 'F']))
+        for query in queries:
+            assert count_by_site(survey2, site_list, *query) == index.count_with_trees(site_list, *query)
+
+        scan_time = min(timeit.repeat(lambda: [count_by_site(survey2, site_list, *query) for query in queries],
+                                      number=1, repeat=5)) / len(queries) * 1000
+        trees_time = min(timeit.repeat(lambda: [index.count_with_trees(site_list, *query) for query in queries],
+                                       number=1, repeat=5)) / len(queries) * 1000
+        picked = "trees" if trees_are_quicker(len(survey2), len(site_list)) else "scan"
+        print(f"{num_sites:>6} {len(survey2):>9} {build_time:>11.1f} {scan_time:>10.3f} {trees_time:>11.3f} "
+              f"{picked:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Compares reading a whole survey table as JSON through the Marshmallow schema with reading plain rows
+with SQLAlchemy Core and encoding them with orjson, see survey_json.py.
+
+Run from the project folder:
+    python -m benchmarks.bench_survey_json
+"""
+import json
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from crayfish_analysis_app import create_app
+from crayfish_analysis_app.models import db, Crayfish1
+from crayfish_analysis_app.schemas import Crayfish1Schema
+from crayfish_analysis_app.survey_json import dumps, survey_records
+from config import TestingConfig
+
+SITES = ["DGB2016", "CON2016", "PAD2017", "MRT2017"]
+METHODS = ["Drawdown", "Trapping", "Handsearch"]
+
+
+def add_rows(num_rows, seed=0):
+    """
+    Fills the crayfish1 table with made up rows
+    Args:
+        num_rows (int): The number of rows
+        seed (int): Seed for the random numbers
+    Raises:
+        NA
+    Returns:
+        NA
+    """
+    rng = np.random.default_rng(seed)
+    sites = rng.choice(SITES, num_rows)
+    methods = rng.choice(METHODS, num_rows)
+    genders = rng.choice(["M", "F"], num_rows)
+    lengths = rng.normal(35, 8, num_rows).clip(5).round(1)
+    db.session.execute(db.delete(Crayfish1))
+    db.session.execute(db.insert(Crayfish1), [
+        {"site": str(site), "method": str(method), "gender": str(gender), "length": float(length)}
+        for site, method, gender, length in zip(sites, methods, genders, lengths)])
+    db.session.commit()
+
+
+def marshmallow_path():
+    """The way the routes read records before, an ORM object per row dumped by the schema"""
+    crayfish_list = db.session.execute(db.select(Crayfish1).order_by(Crayfish1.id)).scalars().all()
+    body = json.dumps(Crayfish1Schema(many=True).dump(crayfish_list)).encode()
+    # Forget the objects, so each run loads them again like a new request
+    db.session.expunge_all()
+    return body
+
+
+def core_path():
+    """Plain rows read with SQLAlchemy Core and encoded with orjson"""
+    return dumps(survey_records(Crayfish1))
+
+
+def best_time(function, repeat):
+    """The shortest time out of a number of runs, with the body from the last run"""
+    times = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        body = function()
+        times.append(time.perf_counter() - began)
+    return min(times), body
+
+
+def main():
+    print(f"{'rows':>9} {'marshmallow (s)':>16} {'core + orjson (s)':>18} {'speed up':>9} {'size (MB)':>10}")
+    for num_rows in (10_000, 100_000, 1_000_000):
+        with tempfile.TemporaryDirectory() as folder:
+            class BenchmarkConfig(TestingConfig):
+                SQLALCHEMY_DATABASE_URI = "sqlite:///" + str(Path(folder).joinpath("bench.db"))
+                SQLALCHEMY_ECHO = False
+
+            app = create_app(BenchmarkConfig)
+            with app.app_context():
+                add_rows(num_rows)
+                repeat = 3 if num_rows < 1_000_000 else 1
+                slow, slow_body = best_time(marshmallow_path, repeat)
+                fast, fast_body = best_time(core_path, repeat)
+                # Both give the same records
+                assert json.loads(slow_body) == json.loads(fast_body)
+                db.engine.dispose()
+        print(f"{num_rows:>9} {slow:>16.2f} {fast:>18.2f} {slow / fast:>8.1f}x {len(fast_body) / 1e6:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 """Flask config class for the flask_bp app."""
+import os
 import pathlib
 
 
@@ -15,6 +16,58 @@ class Config(object):
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False
 
+    # Data behind the dashboard, loaded in a background thread when the app starts
+    # "database" reads the crayfish1 and crayfish2 tables, "excel" reads prepared_datasets.xlsx
+    DASHBOARD_DATA_SOURCE = "database"
+    DASHBOARD_EXCEL_FILE = basedir.joinpath("data", "prepared_datasets.xlsx")
+    DASHBOARD_SNAPSHOT_DIR = basedir.joinpath("data", "snapshots")
+    DASHBOARD_WARM_ON_START = True
+    # Number of charts kept by the dashboard figure cache, 0 turns the cache off
+    DASHBOARD_FIGURE_CACHE_SIZE = 256
+
+    # Compressing responses, brotli is used only when the brotli package is installed
+    COMPRESSION_ENABLED = True
+    COMPRESSION_ALGORITHMS = ["br", "gzip"]
+    COMPRESSION_GZIP_LEVEL = 6
+    COMPRESSION_BROTLI_QUALITY = 4
+    # Smaller responses are sent as they are, compressing them saves almost nothing
+    COMPRESSION_MIN_SIZE = 500
+    COMPRESSION_MIMETYPES = ["text/html", "text/css", "text/csv", "text/plain", "text/javascript",
+                             "application/javascript", "application/json", "image/svg+xml"]
+    # Number of compressed static files kept in memory
+    COMPRESSION_CACHE_SIZE = 64
+
+    # Number of posts on each page of the forum and of a user's posts
+    FORUM_PAGE_SIZE = 20
+    # Number of comments loaded at a time when the comments of a post are opened
+    COMMENT_PAGE_SIZE = 20
+    # Number of rendered post cards kept in memory, 0 turns the cache off
+    POST_CARD_CACHE_SIZE = 1000
+    # Number of records on a page of the crayfish1 and crayfish2 pages
+    SURVEY_PAGE_SIZE = 100
+    # Number of records on a page of /api/crayfish1 and /api/crayfish2, and the most a client can ask for
+    SURVEY_API_PAGE_SIZE = 100
+    SURVEY_API_MAX_LIMIT = 1000
+
+    # Passes live forum updates to the open forum pages. "local" only reaches the pages served by the
+    # same process, "database" goes through the forum_event table so it works with several worker processes.
+    # With "database", a page that reconnects to a worker which had no stream open when the events it missed
+    # were published is told to reload, as that worker only hands on events read since its first stream
+    LIVE_EVENTS_BROKER = "local"
+    LIVE_EVENTS_POLL_INTERVAL = 0.5
+    # Seconds between the keep-alive comments sent down an idle stream
+    LIVE_EVENTS_HEARTBEAT = 15
+
+    # Answers likes from memory and writes them in one transaction every LIKE_BUFFER_WINDOW seconds,
+    # for bursts of likes that would otherwise wait on the SQLite write lock, see like_buffer.py
+    LIKE_BUFFER_ENABLED = False
+    LIKE_BUFFER_WINDOW = 0.05
+
+    # Accounts with more posts, comments and likes than this are deleted in a background thread,
+    # this many rows per transaction
+    ACCOUNT_PURGE_THRESHOLD = 5000
+    ACCOUNT_PURGE_BATCH_SIZE = 500
+
     # Configuring the mail server
     # Using the gmail server using flask-mail
     MAIL_SERVER = 'smtp.gmail.com'
@@ -45,3 +98,6 @@ class TestingConfig(Config):
 
     TESTING = True
     SQLALCHEMY_ECHO = True
+    DASHBOARD_WARM_ON_START = False
+    # The tests point this at a copy of data/database.db, so they never change the real one, see tests/conftest.py
+    SQLALCHEMY_DATABASE_URI = os.environ.get("TEST_DATABASE_URI", Config.SQLALCHEMY_DATABASE_URI)
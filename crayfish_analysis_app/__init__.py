@@ -2,6 +2,14 @@ from flask import Flask
 from .models import db, login_manager
 from flask_marshmallow import Marshmallow
 from .dash_app.app import create_dash_app
+from .compression import ResponseCompressor
+from .migrations import upgrade_database
+from .commands import register_commands
+from .fragment_cache import FragmentCache
+from .search import create_search_table
+from .accounts import AccountPurger
+from .live import create_broker
+from .like_buffer import LikeBuffer
 from flask_mail import Mail
 from config import Config
 
@@ -25,11 +33,35 @@ def create_app(config_class_name):
 
     create_dash_app(app)
 
+    # Rendered forum post cards, reused until the post changes
+    app.extensions["post_card_cache"] = FragmentCache(app.config.get("POST_CARD_CACHE_SIZE", 1000))
+
+    # Live forum updates, see live.py
+    app.extensions["forum_events"] = create_broker(app)
+
+    # Likes written in batches, see like_buffer.py
+    app.extensions["like_buffer"] = (LikeBuffer(app, app.config.get("LIKE_BUFFER_WINDOW", 0.05))
+                                     if app.config.get("LIKE_BUFFER_ENABLED") else None)
+
+    # Compress the responses of the Flask routes and the Dash app
+    app.extensions["compression"] = ResponseCompressor(app)
+
     with app.app_context():
 
         db.create_all()
+        upgrade_database()
+        # Forum search is turned off if this SQLite was built without FTS5
+        app.extensions["forum_search"] = create_search_table()
+        # Deletes large accounts in the background, and finishes any left unfinished by the last run
+        app.extensions["account_purger"] = AccountPurger(app)
+        app.extensions["account_purger"].resume()
+        # Load the dashboard data in the background, only now the crayfish tables exist and are upgraded
+        if app.config.get("DASHBOARD_WARM_ON_START", False):
+            app.extensions["crayfish_dataset"].warm()
         print("Database created successfully!")
 
+    register_commands(app)
+
     login_manager.init_app(app)
 
     # initialising the extension with flask app
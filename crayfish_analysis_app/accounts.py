@@ -0,0 +1,157 @@
+import threading
+from .models import db, User, Post, Comment, Like, adjust_post_count, remove_user_from_post_counts
+from .search import unindex_user
+
+
+def account_size(user_id):
+    """
+    Counts the rows that go when an account is deleted: the user's posts, likes and comments,
+    and the likes and comments of other users on their posts
+    Args:
+        user_id (int): The id of the user
+    Raises:
+        NA
+    Returns:
+        num (int): The number of rows
+    """
+    on_posts = db.session.execute(db.select(db.func.count(Post.id),
+                                            db.func.sum(Post.like_count + Post.comment_count))
+                                  .where(Post.author == user_id)).one()
+    likes = db.session.execute(db.select(db.func.count(Like.id)).where(Like.author == user_id)).scalar()
+    comments = db.session.execute(db.select(db.func.count(Comment.id)).where(Comment.author == user_id)).scalar()
+    return on_posts[0] + (on_posts[1] or 0) + likes + comments
+
+
+def delete_account(user_id):
+    """
+    Deletes an account in one transaction. The foreign keys make the database delete the user's posts,
+    likes and comments, and everything on their posts, see enable_foreign_keys in models.py
+    Args:
+        user_id (int): The id of the user
+    Raises:
+        NA
+    Returns:
+        NA
+    """
+    # Take the user's likes and comments off the counts of the posts they are on
+    remove_user_from_post_counts(user_id)
+    # Take the user's posts and comments out of the search, it has no foreign keys
+    unindex_user(user_id)
+    db.session.execute(db.delete(User).where(User.id == user_id))
+    db.session.commit()
+
+
+def purge_account(user_id, batch_size):
+    """
+    Deletes an account a batch of rows at a time, committing after each batch so other requests
+    can write to the database in between
+    Args:
+        user_id (int): The id of the user
+        batch_size (int): The number of likes, comments or posts deleted in each transaction
+    Raises:
+        NA
+    Returns:
+        NA
+    """
+    unindex_user(user_id)
+    db.session.commit()
+    # The user's likes and comments on other posts, with the counts of those posts
+    for model, column in ((Like, "like_count"), (Comment, "comment_count")):
+        while True:
+            ids = db.session.execute(db.select(model.id).where(model.author == user_id)
+                                     .limit(batch_size)).scalars().all()
+            if not ids:
+                break
+            on_posts = db.session.execute(db.select(model.post_id, db.func.count(model.id))
+                                          .where(model.id.in_(ids)).group_by(model.post_id))
+            for post_id, num in on_posts.all():
+                adjust_post_count(post_id, column, -num)
+            db.session.execute(db.delete(model).where(model.id.in_(ids)))
+            db.session.commit()
+    # The user's posts, the database deletes the likes and comments on each post with it
+    while True:
+        ids = db.session.execute(db.select(Post.id).where(Post.author == user_id)
+                                 .limit(batch_size)).scalars().all()
+        if not ids:
+            break
+        db.session.execute(db.delete(Post).where(Post.id.in_(ids)))
+        db.session.commit()
+    db.session.execute(db.delete(User).where(User.id == user_id))
+    db.session.commit()
+
+
+class AccountPurger:
+    """
+    Deletes large accounts in a background thread, so the request that deletes the account returns
+    straight away. The account is marked as deleting first, which logs it out and stops it logging in,
+    and accounts still marked when the app starts are purged again.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.threshold = flask_app.config.get("ACCOUNT_PURGE_THRESHOLD", 5000)
+        self.batch_size = flask_app.config.get("ACCOUNT_PURGE_BATCH_SIZE", 500)
+        self._threads = {}
+
+    def delete(self, user_id):
+        """
+        Deletes an account, in the background if it has more rows than ACCOUNT_PURGE_THRESHOLD
+        Args:
+            user_id (int): The id of the user
+        Raises:
+            NA
+        Returns:
+            background (bool): True if the account is being deleted in the background
+        """
+        if account_size(user_id) <= self.threshold:
+            delete_account(user_id)
+            return False
+        db.session.execute(db.update(User).where(User.id == user_id).values(deleting=True))
+        db.session.commit()
+        self.start(user_id)
+        return True
+
+    def start(self, user_id):
+        """
+        Starts purging an account marked as deleting
+        Args:
+            user_id (int): The id of the user
+        Raises:
+            NA
+        Returns:
+            thread (Thread): The thread doing the purge
+        """
+        thread = threading.Thread(target=self._purge, args=(user_id,), name=f"account-purge-{user_id}",
+                                  daemon=True)
+        self._threads[user_id] = thread
+        thread.start()
+        return thread
+
+    def resume(self):
+        """
+        Starts purging the accounts left marked as deleting when the app last stopped
+        Args:
+            NA
+        Raises:
+            NA
+        Returns:
+            threads (list): The threads doing the purges
+        """
+        user_ids = db.session.execute(db.select(User.id).where(User.deleting)).scalars().all()
+        return [self.start(user_id) for user_id in user_ids]
+
+    def wait(self):
+        """Waits for the purges that are running to finish"""
+        for thread in list(self._threads.values()):
+            thread.join()
+
+    def _purge(self, user_id):
+        with self.flask_app.app_context():
+            try:
+                purge_account(user_id, self.batch_size)
+            except Exception as e:
+                # The account stays marked, the purge is started again when the app next starts
+                db.session.rollback()
+                print(f"Could not finish deleting account {user_id}: {e}")
+            finally:
+                self._threads.pop(user_id, None)
@@ -0,0 +1,27 @@
+import click
+from .models import reconcile_post_counts
+from .search import rebuild_search_index
+
+
+def register_commands(app):
+    """
+    Adds the maintenance commands to the flask command line
+    Args:
+        app (Flask): The Flask app
+    Raises:
+        NA
+    Returns:
+        NA
+    """
+
+    @app.cli.command("reconcile-post-counts")
+    def reconcile_post_counts_command():
+        """Count the likes and comments of every post again and fix the stored counts."""
+        num = reconcile_post_counts()
+        click.echo(f"Fixed the counts of {num} posts.")
+
+    @app.cli.command("rebuild-search-index")
+    def rebuild_search_index_command():
+        """Fill the forum search table again from the posts and comments."""
+        num = rebuild_search_index()
+        click.echo(f"Indexed {num} posts and comments.")
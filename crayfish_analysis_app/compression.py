@@ -0,0 +1,144 @@
+import gzip
+import threading
+from collections import OrderedDict
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    # brotli is optional, without it responses are only gzipped
+    brotli = None
+
+
+def compress(data, encoding, level):
+    """
+    Compresses a response body
+    Args:
+        data (bytes): The response body
+        encoding (str): 'br' or 'gzip'
+        level (int): The gzip level, or the brotli quality
+    Raises:
+        ValueError: If the encoding is not supported
+    Returns:
+        data (bytes): The compressed body
+    """
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(data, quality=level)
+    if encoding == "gzip":
+        # mtime=0 gives the same bytes for the same body, so the ETag of a cached body stays valid
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class ResponseCompressor:
+    """
+    Compresses responses for clients that accept it. Only successful responses with an allowed content
+    type and a body of at least the minimum size are compressed.
+
+    Responses with an ETag or a max-age, such as the static files and the versioned Dash javascript,
+    are the same each time they are sent, so their compressed bodies are kept and reused.
+    """
+
+    def __init__(self, app):
+        self.enabled = app.config.get("COMPRESSION_ENABLED", True)
+        self.encodings = [encoding for encoding in app.config.get("COMPRESSION_ALGORITHMS", ["br", "gzip"])
+                          if encoding != "br" or brotli is not None]
+        self.levels = {"gzip": app.config.get("COMPRESSION_GZIP_LEVEL", 6),
+                       "br": app.config.get("COMPRESSION_BROTLI_QUALITY", 4)}
+        self.min_size = app.config.get("COMPRESSION_MIN_SIZE", 500)
+        self.mimetypes = set(app.config.get("COMPRESSION_MIMETYPES", []))
+        self.cache_size = app.config.get("COMPRESSION_CACHE_SIZE", 64)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        app.after_request(self.after_request)
+
+    def choose_encoding(self):
+        """
+        Picks the first configured encoding that the client accepts
+        Args:
+            NA
+        Raises:
+            NA
+        Returns:
+            encoding (str): 'br' or 'gzip', None if the client accepts neither
+        """
+        for encoding in self.encodings:
+            if request.accept_encodings[encoding] > 0:
+                return encoding
+        return None
+
+    def after_request(self, response):
+        """
+        Compresses the response if it should be
+        Args:
+            response (Response): The response made by the view
+        Raises:
+            NA
+        Returns:
+            response (Response): The response, compressed or not
+        """
+        # Streamed responses are sent as they are made, except files which can be read in one go
+        streamed = response.is_streamed and not response.direct_passthrough
+        if (not self.enabled or response.status_code != 200 or streamed
+                or "Content-Encoding" in response.headers or response.mimetype not in self.mimetypes):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = self.choose_encoding()
+        if encoding is None:
+            return response
+
+        # Static files are sent straight from the file, read them so they can be compressed
+        response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        etag, _weak = response.get_etag()
+        # Files with an ETag and the versioned Dash javascript never change for the same URL
+        immutable = etag is not None or bool(response.cache_control.max_age)
+        key = (request.full_path, etag, encoding)
+        compressed = self._cache_get(key) if immutable else None
+        if compressed is None:
+            compressed = compress(data, encoding, self.levels[encoding])
+            if immutable:
+                self._cache_put(key, compressed)
+
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        if etag:
+            # The compressed body is not byte for byte the same as the original
+            response.set_etag(etag, weak=True)
+        with self._lock:
+            self.bytes_in += len(data)
+            self.bytes_out += len(compressed)
+        return response
+
+    def _cache_get(self, key):
+        with self._lock:
+            compressed = self._cache.get(key)
+            if compressed is not None:
+                self._cache.move_to_end(key)
+            return compressed
+
+    def _cache_put(self, key, compressed):
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._cache[key] = compressed
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def stats(self):
+        """
+        Gives the number of bytes before and after compression
+        Args:
+            NA
+        Raises:
+            NA
+        Returns:
+            stats (dict): The bytes in and out and the number of cached bodies
+        """
+        with self._lock:
+            return {"bytes_in": self.bytes_in, "bytes_out": self.bytes_out, "cached": len(self._cache)}
@@ -1,33 +1,30 @@
-import pandas as pd
 from pathlib import Path
 from dash import dash, html, dcc, Input, Output, State, ctx
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
 import numpy as np
+from .dataset import CrayfishDataset
+from .distribution import mean_and_sd, kernel_density
+from .figure_cache import FigureCache
+from .site_summary import SiteSummary, METHODS
 
 
-def read_excel_multi_index(excel_file):
+# Dashboard names for the measurements and the columns that hold them
+INFO_COLUMNS = {'Carapace length  (mm)': 'length', 'Weight (g)': 'weight'}
+
+
+def site_rows(df, site):
     """
-    This function imports the newly created Excel file in the correct format
+    Gives the crayfish caught at a site
     Args:
-        excel_file (xlsx): The proj Excel file
+        df (DataFrame): The survey rows, one per crayfish
+        site (string): The site where the crayfish were caught
     Raises:
         NA
     Returns:
-        df1_final (DataFrame): The first sheet in the proj Excel file as a dataframe
-        df2_final (DataFrame): The second sheet in the proj Excel file as a dataframe
+        rows (DataFrame): The rows for the site
     """
-    df1_final = pd.read_excel(excel_file, header=[0, 1, 2],
-                              sheet_name="Sheet_name_1")  # Gets the file as a multi-index dataframe
-    df1_final = df1_final.drop(df1_final.columns[:1], axis=1)  # Drops column, which is an index
-    df1_final.columns = df1_final.columns.set_names(["Site", "Method", "Info"])  # Adds the names to the levels
-    df1_final = df1_final.drop(0).reset_index(drop=True)  # Drops the first row which is all NaN
-
-    df2_final = pd.read_excel(excel_file, header=[0, 1], sheet_name="Sheet_name_2")
-    df2_final = df2_final.drop(df2_final.columns[:1], axis=1)
-    df2_final.columns = df2_final.columns.set_names(["Site", "Info"])
-    df2_final = df2_final.drop(0).reset_index(drop=True)
-    return df1_final, df2_final
+    return df[df['site'] == site]
 
 
 def count_crayfish(df, site, length_min, length_max, weight_min, weight_max, sex):
@@ -47,43 +44,25 @@ def count_crayfish(df, site, length_min, length_max, weight_min, weight_max, sex
     Returns:
         num (int): The number of crayfish that were found that fit the conditions provided
     """
-    num = sum((df[site, 'Carapace length  (mm)'] >= length_min) &
-              (df[site, 'Carapace length  (mm)'] <= length_max) &
-              (df[site, 'Weight (g)'] >= weight_min) &
-              (df[site, 'Weight (g)'] <= weight_max) &
-              (df[site, 'Gender'].isin(list(sex)))  # Finding the number of crayfish that meet the condition
-              )
-    return num
-
-
-def find_min_and_max(df, attribute):
-    """
-    This function find the minimum and maximum value for an attribute of the crayfish
-    Args:
-        df (DataFrame): The dataframe that holds our data
-        attribute (string): The size (Carapace length  (mm))
-                            or the weight (Weight (g)) of the crayfish
-    Raises:
-        NA
-    Returns:
-        minimum (int): The minimum value for the attribute in the dataframe
-        maximum (int): The maximum value for the attribute in the dataframe
-    """
-    # Finding the lowest value for the attribute for each site
-    list_min = df.iloc[:, df.columns.get_level_values(1) == attribute].min()
-    list_max = df.iloc[:, df.columns.get_level_values(1) == attribute].max()
-    # Finding the lowest value for the attribute for all sites
-    minimum = min(list(list_min))
-    maximum = max(list(list_max))
-
-    return minimum, maximum
-
-
-def set_value_if_none(length_min, length_max, weight_min, weight_max):
+    rows = site_rows(df, site)
+    length = rows['length'].to_numpy()
+    weight = rows['weight'].to_numpy()
+    # The limits are compared as float32, like the data, so a limit typed in matches the same stored value
+    num = np.count_nonzero((length >= np.float32(length_min)) &
+                           (length <= np.float32(length_max)) &
+                           (weight >= np.float32(weight_min)) &
+                           (weight <= np.float32(weight_max)) &
+                           rows['gender'].isin(list(sex)).to_numpy()  # Finding the number of crayfish that meet the condition
+                           )
+    return int(num)
+
+
+def set_value_if_none(data, length_min, length_max, weight_min, weight_max):
     """
     Used give the bar chart their default search value or
     sets new search value given by user on the website
     Args:
+        data (CrayfishDataset): The loaded dataset which holds the default values
         length_min (float): The user input form website
         length_max (float): The user input form website
         weight_min (float): The user input form website
@@ -106,13 +85,13 @@ def set_value_if_none(length_min, length_max, weight_min, weight_max):
     """
     # set default value
     if length_min is None:
-        length_min = length_minimum
+        length_min = data.length_minimum
     if length_max is None:
-        length_max = length_maximum
+        length_max = data.length_maximum
     if weight_min is None:
-        weight_min = weight_minimum
+        weight_min = data.weight_minimum
     if weight_max is None:
-        weight_max = weight_maximum
+        weight_max = data.weight_maximum
 
     return length_min, length_max, weight_min, weight_max
 
@@ -129,11 +108,9 @@ def num_m_f(df, site):
         count_f (int): Number of female crayfish in the site
         count_m (int): Number of male crayfish in the site
     """
-    count_f = list((df[site] == "F").sum())
-    count_f = sum(count_f)  # Find the total number of females
-
-    count_m = list((df[site] == "M").sum())
-    count_m = sum(count_m)  # Find the total number of males
+    counts = site_rows(df, site)['gender'].value_counts()
+    count_f = int(counts.get("F", 0))  # Find the total number of females
+    count_m = int(counts.get("M", 0))  # Find the total number of males
 
     return count_f, count_m
 
@@ -155,24 +132,229 @@ def mean_stats(df, site):
         mean_f (float): The average length of the female crayfish
         mean_m (float): The average length of the male crayfish
     """
-    count_f, count_m = num_m_f(df, site)
-
-    mean_f = round((sum(df.loc[df[site, 'Drawdown', 'Gender'] == 'F', (site, 'Drawdown', 'Carapace length  (mm)')])
-                    + sum(
-                df.loc[df[site, 'Handsearch', 'Gender'] == 'F', (site, 'Handsearch', 'Carapace length  (mm)')])
-                    + sum(df.loc[df[site, 'Trapping', 'Gender'] == 'F',
-                                 (site, 'Trapping', 'Carapace length  (mm)')])) / count_f,
-                   2)  # Average length for female
+    rows = site_rows(df, site)
+    # Add up in float64 so the averages are the same as with the original data
+    means = rows['length'].astype(float).groupby(rows['gender'], observed=True).mean()
 
-    mean_m = round((sum(df.loc[df[site, 'Drawdown', 'Gender'] == 'M', (site, 'Drawdown', 'Carapace length  (mm)')])
-                    + sum(
-                df.loc[df[site, 'Handsearch', 'Gender'] == 'M', (site, 'Handsearch', 'Carapace length  (mm)')])
-                    + sum(df.loc[df[site, 'Trapping', 'Gender'] == 'M',
-                                 (site, 'Trapping', 'Carapace length  (mm)')])) / count_m, 2)  # Average length for male
+    mean_f = round(float(means.get('F', np.nan)), 2)  # Average length for female
+    mean_m = round(float(means.get('M', np.nan)), 2)  # Average length for male
 
     return mean_f, mean_m
 
 
+def method_stats(df, site):
+    """
+    Gives the number of crayfish caught and their average length for each trapping method in the site
+    Args:
+        df (DataFrame): The dataframe that holds our data
+        site (string): The site that is going to be searched
+    Raises:
+        NA
+    Returns:
+        count_t (list): The number of crayfish caught by Drawdown, Handsearch and Trapping
+        mean_t (list): The average length of the crayfish caught by each method
+    """
+    rows = site_rows(df, site)
+    stats = rows['length'].astype(float).groupby(rows['method'], observed=True).agg(['count', 'mean'])
+    stats = stats.reindex(METHODS)
+
+    count_t = [int(count) for count in stats['count'].fillna(0)]
+    mean_t = [round(float(mean), 2) for mean in stats['mean']]
+    return count_t, mean_t
+
+
+def bar_chart(data, length_min, length_max, weight_min, weight_max, sex):
+    """
+    Makes the bar chart of the number of crayfish caught at each site
+    Args:
+        data (SurveyData): The loaded data
+        length_min (float): minimum length of crayfish
+        length_max (float): maximum length of crayfish
+        weight_min (float): minimum weight of crayfish
+        weight_max (float): maximum weight of crayfish
+        sex (list): a list contains 'M' or 'F'
+    Raises:
+        NA
+    Returns:
+        fig(class): the bar chart for the selection
+    """
+    # go through dataframe and find values which comply with the selection
+    count = data.range_index.count_by_site(data.site_list, length_min, length_max, weight_min, weight_max, sex)
+    # generate the graph
+    fig = go.Figure()
+    # enabling the hover-over
+    fig.add_trace(go.Bar(
+        x=data.site_list,
+        y=count,
+    ))
+    # customise the hoverover
+    fig.update_traces(hovertemplate='Site: %{x}<br>Number of Crayfish Caught: %{y}  <extra></extra>')
+    # additional customisation to the chart
+    fig.update_layout(
+        xaxis_title='Site',
+        yaxis_title="Number of Crayfish Caught",
+        font=dict(size=15),
+        yaxis_range=[0, 700],
+        paper_bgcolor="white",
+    ),
+
+    return fig
+
+
+def pie_charts(data, site):
+    """
+    Makes the sex ratio and trapping method pie charts for a site
+    Args:
+        data (SurveyData): The loaded data
+        site (str) : The desired site to be displayed
+    Raises:
+        NA
+    Returns:
+        fig1, fig2 (class): the pie charts for the chosen site
+    """
+    # the numbers were worked out when the data was loaded
+    summary = data.site_summaries.get(site, SiteSummary())
+    # the total number of male and female crayfish at the site
+    count_f, count_m = summary.num_m_f
+    # the number of crayfish and their average length based on trapping method
+    count_t, mean_t = summary.method_stats
+    # the average length of each sex at the site
+    mean_f, mean_m = summary.mean_stats
+    # generating the graph and customising the male/female chart
+    fig1 = go.Figure(go.Pie(labels=['Female', 'Male'],
+                            values=[count_f, count_m],
+                            title='Sex Ratio for <br> ' + site,
+                            hole=.5,
+                            customdata=[mean_f, mean_m],
+                            hovertemplate="Average length (mm): %{customdata}<extra></extra>"))
+    # additional customisation to the chart
+    fig1.update_layout(
+        font=dict(
+            size=15,
+        ),
+        paper_bgcolor="white",
+
+    )
+    # generating the graph and customising the trapping chart
+    fig2 = go.Figure(go.Pie(labels=['Drawdown', 'Handsearch', 'Trapping'],
+                            values=count_t,
+                            hole=.6,
+                            title='Trapping Methods in <br>' + site,
+                            customdata=mean_t,
+                            hovertemplate="Average length (mm): %{customdata}<extra></extra>"))
+    # additional customisation to the chart
+    fig2.update_layout(
+        font=dict(
+            size=15,
+        ),
+        paper_bgcolor="white",
+    )
+
+    return fig1, fig2
+
+
+def distribution_chart(data, site_selection, sex, info, curve='normal'):
+    """
+    Makes the weight or length distribution curves for the selected sites
+    Args:
+        data (SurveyData): The loaded data
+        site_selection (list) : The desired sites to be displayed
+        sex (list) : The desired sex to be displayed
+        info (str): 'Carapace length  (mm)' or 'Weight (g)'
+        curve (str): 'normal' for a normal curve with the mean and sd of the site,
+                     'kde' for a kernel density estimate of the measurements
+    Raises:
+        NA
+    Returns:
+        fig (class): the distribution graph
+    """
+    column = INFO_COLUMNS[info]
+    # every curve is drawn on the same x values
+    grid = data.grids[column]
+
+    fig = go.Figure()
+    # enabling the hover over feature
+    for site in site_selection:
+        if curve == 'kde':
+            sub_df = site_rows(data.survey2, site)
+            values = sub_df.loc[sub_df['gender'].isin(list(sex)), column].to_numpy()
+            density = kernel_density(values, grid)
+        else:
+            mean, sd = mean_and_sd(data.moments, site, sex, column)
+            density = normal_dist_probability(grid, mean, sd)
+        fig.add_trace(go.Scatter(x=grid, y=density, name=site))
+
+    # customising the chart appearance and features
+    fig.update_layout(
+        # title="Title",
+        xaxis_title=info,
+        yaxis_title="Probability Density",
+        legend_title="Site",
+        font=dict(
+            size=15),
+        paper_bgcolor="white",
+
+    ),
+    if curve != 'kde':
+        # the kernel density is on a different scale, so its axis fits the curves instead
+        fig.update_layout(yaxis_range=[0, 30])
+    # customising the hover over feature
+    fig.update_traces(hovertemplate=info + ': %{x} <br>Probability Density: %{y}')
+
+    return fig
+
+
+def population_chart(data, option):
+    """
+    Makes the population line chart for site DGB
+    Args:
+        data (SurveyData): The loaded data
+        option (list) : The desired data the users wish to see on the chart
+    Raises:
+        NA
+    Returns:
+        fig (class): the linegraph graph
+    """
+    # finding the total number of male and female crayfish at each site
+    count_2016_f, count_2016_m = data.site_summaries.get('DGB2016', SiteSummary()).num_m_f
+    count_2017_f, count_2017_m = data.site_summaries.get('DGB2017', SiteSummary()).num_m_f
+    # updating chart to show population of both male and female
+    if option == ["M", "F"] or option == ["F", "M"]:
+        fig = go.Figure(data=go.Scatter(x=[2016, 2017],
+                                        y=[count_2016_f + count_2016_m,
+                                           count_2017_f + count_2017_m]))
+    # updating chart to show population of male
+    elif option == ["M"]:
+        fig = go.Figure(data=go.Scatter(x=[2016, 2017],
+                                        y=[count_2016_m,
+                                           count_2017_m]))
+    # updating chart to show population of female
+    elif option == ["F"]:
+        fig = go.Figure(data=go.Scatter(x=[2016, 2017],
+                                        y=[count_2016_f,
+                                           count_2017_f]))
+    # updating chart to make it empty
+    else:
+        fig = go.Figure()
+    # customising the chart by addint title, axis etc
+    fig.update_layout(
+        title={"text": 'Population Trend for Site DGB',
+               "font": {"size": 18},
+               'x': 0.5},
+
+        xaxis_title="Year",
+        yaxis_title="Population",
+        font=dict(
+            size=15),
+        yaxis_range=[count_2017_m - 100, count_2016_f + count_2016_m + 100],
+        paper_bgcolor="white",
+    ),
+    # enabling hover over feature
+    fig.update_xaxes(dtick="M2")
+    fig.update_traces(hovertemplate='Year: %{x} <br>Population: %{y}<extra></extra>')
+    return fig
+
+
 # function to open modal
 def toggle_modal(n1, is_open):
     """
@@ -190,12 +372,9 @@ def toggle_modal(n1, is_open):
     return is_open
 
 
-# import data
+# default location of the data, can be changed with the DASHBOARD_EXCEL_FILE and DASHBOARD_SNAPSHOT_DIR config
 excel = Path(__file__).parents[2].joinpath("data/prepared_datasets.xlsx")
-df1, df2 = read_excel_multi_index(excel)
-site_list = list(df2.columns.get_level_values(0).unique())
-length_minimum, length_maximum = find_min_and_max(df2, 'Carapace length  (mm)')
-weight_minimum, weight_maximum = find_min_and_max(df2, 'Weight (g)')
+snapshot_dir = Path(__file__).parents[2].joinpath("data/snapshots")
 
 
 # Creates the Dash app
@@ -204,6 +383,17 @@ def create_dash_app(flask_app):
     :param flask_app: A configured Flask app
     :return dash_app: A configured Dash app registered to the Flask app
     """
+    # The data is only loaded when the dashboard is first used, or in the background if warming is turned on,
+    # which create_app starts once the tables are set up
+    dataset = CrayfishDataset(flask_app,
+                              flask_app.config.get("DASHBOARD_DATA_SOURCE", "database"),
+                              flask_app.config.get("DASHBOARD_EXCEL_FILE", excel),
+                              flask_app.config.get("DASHBOARD_SNAPSHOT_DIR", snapshot_dir))
+    flask_app.extensions["crayfish_dataset"] = dataset
+    # Charts already built for the same inputs and data version are reused
+    figure_cache = FigureCache(flask_app.config.get("DASHBOARD_FIGURE_CACHE_SIZE", 256))
+    flask_app.extensions["crayfish_figure_cache"] = figure_cache
+
     # Register the Dash app to a route '/dashboard/' on a Flask app
     app = dash.Dash(__name__, server=flask_app, url_base_pathname="/dashboard/",
                     meta_tags=[{"name": "viewport", "content": "width=device-width, initial-scale=1", }],
@@ -216,6 +406,9 @@ def create_dash_app(flask_app):
         fluid=True,
         children=[
 
+            # used to fill in the site dropdowns once the page has loaded
+            dcc.Location(id='dashboard-url'),
+
             # create garbage id to carry the output from app.clientside_callback
             dcc.Store(id='title-1'),
             dcc.Store(id='title-2'),
@@ -362,7 +555,7 @@ def create_dash_app(flask_app):
                           direction="horizontal"),
 
                 html.H6("Site:"),
-                dcc.Dropdown(site_list, 'DGB2016',
+                dcc.Dropdown([], 'DGB2016',
                              id='pie-site-selection'),
 
                 dcc.Graph(id='pie-chart-sex-ratio'),
@@ -438,7 +631,7 @@ def create_dash_app(flask_app):
                                       n_clicks=0)],
                           direction="horizontal"),
                 html.H6("Sites:"),
-                dcc.Dropdown(site_list, site_list, id='distribution-site', multi=True),
+                dcc.Dropdown([], [], id='distribution-site', multi=True),
                 dbc.Stack([
                     html.H6("Sex:"),
                     dbc.Checklist(id='dist-sex', options=[{"label": "M", "value": 'M'}, {"label": "F", "value": 'F'}],
@@ -455,6 +648,12 @@ def create_dash_app(flask_app):
                 dbc.Button("Carapace Length", id='dist-length', value='Carapace length  (mm)', outline=True,
                            color="primary", size='sm'),
                 dbc.Button("Weight", id='dist-weight', value='Weight (g)', outline=True, color="primary", size='sm'),
+                dbc.RadioItems(id='dist-curve',
+                               options=[{"label": "Normal curve", "value": 'normal'},
+                                        {"label": "Kernel density", "value": 'kde'}],
+                               value='normal',
+                               inline=True
+                               ),
                 dcc.Graph(id='normal-distribution'),
 
                 # Create a store to memorise the previous button pressed by users
@@ -544,6 +743,9 @@ def create_dash_app(flask_app):
                         "Use the sites dropdown, sex checkboxes, and data types checkboxes to specify which crayfish "
                         "you "
                         "would like to view data for."),
+                    dbc.ModalBody(
+                        "The normal curves use the mean and standard deviation of each site, the kernel density "
+                        "follows the measurements themselves."),
                 ],
                 id="dist-modal",
                 size="xl",
@@ -565,6 +767,33 @@ def create_dash_app(flask_app):
         ],
     )
 
+    @app.callback(
+        Output('pie-site-selection', 'options'),
+        Output('pie-site-selection', 'value'),
+        Output('distribution-site', 'options'),
+        Output('distribution-site', 'value'),
+        Input('dashboard-url', 'pathname'),
+        State('pie-site-selection', 'value')
+    )
+    def update_site_options(_pathname, pie_site):
+        """
+        This function fills in the site dropdowns, so the layout does not need the data to be loaded
+        Args:
+            _pathname: useless variable passed from callback
+            pie_site (str): the site selected in the pie chart dropdown
+        Raises:
+            NA
+        Returns:
+            site_list (list): the sites for the pie chart dropdown
+            pie_site (str): the selected site, or the first site if it is not in the data
+            site_list (list): the sites for the distribution dropdown
+            site_list (list): all sites are selected in the distribution dropdown by default
+        """
+        site_list = dataset.load().site_list
+        if pie_site not in site_list:
+            pie_site = site_list[0] if site_list else None
+        return site_list, pie_site, site_list, site_list
+
     @app.callback(
         Output('bar-chart', 'figure'),
         Input('bar-update-button', 'n_clicks'),
@@ -593,32 +822,14 @@ def create_dash_app(flask_app):
         """
         # assigning default value when there is no selection
         # shows everything in the dataframe
-        count = []
+        data = dataset.load()
 
-        length_min, length_max, weight_min, weight_max = set_value_if_none(length_min, length_max, weight_min,
+        length_min, length_max, weight_min, weight_max = set_value_if_none(data, length_min, length_max, weight_min,
                                                                            weight_max)
-        # go through dataframe and find values which comply with the selection
-        for site in site_list:
-            count.append(count_crayfish(df2, site, length_min, length_max, weight_min, weight_max, sex))
-        # generate the graph
-        fig = go.Figure()
-        # enabling the hover-over
-        fig.add_trace(go.Bar(
-            x=site_list,
-            y=count,
-        ))
-        # customise the hoverover
-        fig.update_traces(hovertemplate='Site: %{x}<br>Number of Crayfish Caught: %{y}  <extra></extra>')
-        # additional customisation to the chart
-        fig.update_layout(
-            xaxis_title='Site',
-            yaxis_title="Number of Crayfish Caught",
-            font=dict(size=15),
-            yaxis_range=[0, 700],
-            paper_bgcolor="white",
-        ),
-
-        return fig
+        sex = sorted(set(sex or []))
+        key = ('bar', float(length_min), float(length_max), float(weight_min), float(weight_max), tuple(sex))
+        return figure_cache.get_or_build(data.version, key,
+                                         lambda: bar_chart(data, length_min, length_max, weight_min, weight_max, sex))
 
     @app.callback(
         Output('pie-chart-sex-ratio', 'figure'),
@@ -635,46 +846,8 @@ def create_dash_app(flask_app):
         Returns:
             fig1, fig2 (class): the updated pie charts for the chosen sites
         """
-        # finding the total number of male and female crayfish at each site
-        count_f, count_m = num_m_f(df1, site)
-        # finding the number of crayfish based on trapping method
-        count_t = [df1[site, 'Drawdown', 'Gender'].count(), df1[site, 'Handsearch', 'Gender'].count(),
-                   df1[site, 'Trapping', 'Gender'].count()]
-        # finding the mean stats on the site
-        mean_f, mean_m = mean_stats(df1, site)
-        # generating the graph and customising the male/female chart
-        fig1 = go.Figure(go.Pie(labels=['Female', 'Male'],
-                                values=[count_f, count_m],
-                                title='Sex Ratio for <br> ' + site,
-                                hole=.5,
-                                customdata=[mean_f, mean_m],
-                                hovertemplate="Average length (mm): %{customdata}<extra></extra>"))
-        # additional customisation to the chart
-        fig1.update_layout(
-            font=dict(
-                size=15,
-            ),
-            paper_bgcolor="white",
-
-        )
-        # generating the graph and customising the trapping chart
-        fig2 = go.Figure(go.Pie(labels=['Drawdown', 'Handsearch', 'Trapping'],
-                                values=count_t,
-                                hole=.6,
-                                title='Trapping Methods in <br>' + site,
-                                customdata=[round(df1[site, 'Drawdown', 'Carapace length  (mm)'].mean(), 2),
-                                            round(df1[site, 'Handsearch', 'Carapace length  (mm)'].mean(), 2),
-                                            round(df1[site, 'Trapping', 'Carapace length  (mm)'].mean(), 2)],
-                                hovertemplate="Average length (mm): %{customdata}<extra></extra>"))
-        # additional customisation to the chart
-        fig2.update_layout(
-            font=dict(
-                size=15,
-            ),
-            paper_bgcolor="white",
-        )
-
-        return fig1, fig2
+        data = dataset.load()
+        return figure_cache.get_or_build(data.version, ('pie', site), lambda: pie_charts(data, site))
 
     @app.callback(
         Output('normal-distribution', 'figure'),
@@ -683,9 +856,10 @@ def create_dash_app(flask_app):
         Input('dist-length', 'n_clicks'),
         Input('dist-weight', 'n_clicks'),
         Input('dist-sex', 'value'),
+        Input('dist-curve', 'value'),
         Input('dist-btn-id-prev', 'data'),
     )
-    def update_distribution(site_selection, _btn_length, _btn_weight, sex, button_id_prev):
+    def update_distribution(site_selection, _btn_length, _btn_weight, sex, curve, button_id_prev):
         """
         This function is used to update the weight and length distribution chart based on filter
         Args:
@@ -693,6 +867,7 @@ def create_dash_app(flask_app):
             _btn_length: useless variable from callback
             _btn_weight: useless variable from callback
             sex (list) : The desired sex to be displayed
+            curve (str): 'normal' or 'kde', how the curves are drawn
             button_id_prev (str): id which store the users previous selection
         Raises:
             Exception error: neither length and weight is selected to be shown
@@ -711,7 +886,9 @@ def create_dash_app(flask_app):
         elif button_id in ['dist-length', 'dist-weight']:
             button_id_prev = button_id
         else:
-            button_id = button_id_prev
+            # the dropdown can be filled in before any button is pressed
+            button_id = button_id_prev or 'dist-length'
+            button_id_prev = button_id
         # checking if weight or length has been selected
         if button_id == 'dist-length':
             info = 'Carapace length  (mm)'
@@ -719,55 +896,19 @@ def create_dash_app(flask_app):
             info = 'Weight (g)'
         else:
             raise Exception("Error Occurred")
-        # creating a list of data to be displayed
-        num_point = 1000
-        dist_data_list = []
-        dist_mean_list = []
-        dist_sd_list = []
         # checking if site is in the list
         if isinstance(site_selection, list):
             pass
         else:
             site_selection = list(site_selection)
 
-        # Calculate mean and standard deviation of the data set for graph output
-        for site in site_selection:
-            sub_df = df2[df2[site, 'Gender'].isin(list(sex))]
-            mean = sub_df[site, info].mean()
-            sd = sub_df[site, info].std()
-            data = np.random.normal(mean, sd, num_point)
-            # Adapted from code from 'Borislav Hadzhiev' on the bobbyhadz blog at
-            # https://stackoverflow.com/questions/23096417/python-removing-all-negative-values-in-array
-            # Accessed 01/02/22
-            data = np.sort(data)
-            data = data[np.searchsorted(data, 0):]
-            dist_data_list.append(data)
-            dist_mean_list.append(mean)
-            dist_sd_list.append(sd)
-
-        fig = go.Figure()
-        i = 0
-        # enabling the hover over feature
-        for data in dist_data_list:
-            fig.add_trace(go.Scatter(x=data, y=normal_dist_probability(data, dist_mean_list[i], dist_sd_list[i]),
-                                     name=site_selection[i]))
-            i += 1
-
-        # customising the chart appearance and features
-        fig.update_layout(
-            # title="Title",
-            xaxis_title=info,
-            yaxis_title="Probability Density",
-            legend_title="Site",
-            font=dict(
-                size=15),
-            yaxis_range=[0, 30],
-            paper_bgcolor="white",
-
-        ),
-        # customising the hover over feature
-        fig.update_traces(hovertemplate=info + ': %{x} <br>Probability Density: %{y}')
-
+        data = dataset.load()
+        # the order of the sites is kept as it sets the order of the curves
+        sex = sorted(set(sex or []))
+        curve = curve or 'normal'
+        key = ('distribution', info, curve, tuple(site_selection), tuple(sex))
+        fig = figure_cache.get_or_build(data.version, key,
+                                        lambda: distribution_chart(data, site_selection, sex, info, curve))
         return fig, button_id_prev
 
     @app.callback(
@@ -784,44 +925,10 @@ def create_dash_app(flask_app):
         Returns:
             fig (class): the updated linegraph graph
         """
-        # finding the total number of male and female crayfish at each site
-        count_2016_f, count_2016_m = num_m_f(df1, 'DGB2016')
-        count_2017_f, count_2017_m = num_m_f(df1, 'DGB2017')
-        # updating chart to show population of both male and female
-        if option == ["M", "F"] or option == ["F", "M"]:
-            fig = go.Figure(data=go.Scatter(x=[2016, 2017],
-                                            y=[count_2016_f + count_2016_m,
-                                               count_2017_f + count_2017_m]))
-        # updating chart to show population of male
-        elif option == ["M"]:
-            fig = go.Figure(data=go.Scatter(x=[2016, 2017],
-                                            y=[count_2016_m,
-                                               count_2017_m]))
-        # updating chart to show population of female
-        elif option == ["F"]:
-            fig = go.Figure(data=go.Scatter(x=[2016, 2017],
-                                            y=[count_2016_f,
-                                               count_2017_f]))
-        # updating chart to make it empty
-        else:
-            fig = go.Figure()
-        # customising the chart by addint title, axis etc
-        fig.update_layout(
-            title={"text": 'Population Trend for Site DGB',
-                   "font": {"size": 18},
-                   'x': 0.5},
-
-            xaxis_title="Year",
-            yaxis_title="Population",
-            font=dict(
-                size=15),
-            yaxis_range=[count_2017_m - 100, count_2016_f + count_2016_m + 100],
-            paper_bgcolor="white",
-        ),
-        # enabling hover over feature
-        fig.update_xaxes(dtick="M2")
-        fig.update_traces(hovertemplate='Year: %{x} <br>Population: %{y}<extra></extra>')
-        return fig
+        data = dataset.load()
+        option = sorted(set(option or []))
+        return figure_cache.get_or_build(data.version, ('population', tuple(option)),
+                                         lambda: population_chart(data, option))
 
     # callback for modal
     app.callback(
@@ -0,0 +1,353 @@
+import threading
+from collections import deque
+import pandas as pd
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from crayfish_analysis_app.helper_functions import find_min_and_max
+from crayfish_analysis_app.models import db, Crayfish1, Crayfish2
+from .distribution import measurement_grid, site_sex_moments
+from .range_index import RangeCountIndex
+from .site_summary import summarise_sites, updated_summaries
+from .snapshot import read_excel_snapshot
+
+# Columns read from the crayfish1 and crayfish2 tables, the id is used as the index of the dataframes
+SURVEY_COLUMNS = {
+    "crayfish1": ["site", "method", "gender", "length"],
+    "crayfish2": ["site", "gender", "length", "weight"],
+}
+SURVEY_MODELS = {"crayfish1": Crayfish1, "crayfish2": Crayfish2}
+
+
+class ChangeJournal:
+    """
+    Counts the committed writes to the crayfish1 and crayfish2 tables and remembers which rows
+    they touched, so the dashboard can apply just those rows instead of reading the tables again.
+
+    Only the writes committed through the sessions of this process are seen. Rows written by other
+    worker processes, or straight to the database file, reach the dashboard when it next reads the
+    whole tables, e.g. after a restart or once the journal has dropped the entries it needs.
+    """
+
+    def __init__(self, max_entries=10000):
+        self._lock = threading.Lock()
+        self._entries = deque(maxlen=max_entries)
+        self.version = 0
+        # The newest version with rows dropped from the journal, the changes after a version before
+        # this one are no longer all known
+        self._dropped_version = 0
+
+    def record(self, changes):
+        """
+        Bumps the data version for one commit
+        Args:
+            changes (set): (table name, row id) pairs that were inserted, updated or deleted
+        Raises:
+            NA
+        Returns:
+            version (int): The new data version
+        """
+        with self._lock:
+            self.version += 1
+            for table, row_id in changes:
+                if len(self._entries) == self._entries.maxlen:
+                    self._dropped_version = self._entries[0][0]
+                self._entries.append((self.version, table, row_id))
+            return self.version
+
+    def changes_since(self, version):
+        """
+        Gives the rows changed after a data version
+        Args:
+            version (int): The data version the caller already has
+        Raises:
+            NA
+        Returns:
+            changes (dict): Row ids for each table, or None if the journal no longer goes back that far
+            version (int): The current data version
+        """
+        with self._lock:
+            if version < self._dropped_version:
+                return None, self.version
+            changes = {table: set() for table in SURVEY_COLUMNS}
+            for entry_version, table, row_id in self._entries:
+                if entry_version > version:
+                    changes[table].add(row_id)
+            return changes, self.version
+
+
+change_journal = ChangeJournal()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_crayfish_changes(session, _flush_context):
+    """Remembers the crayfish rows written by a flush until the transaction is committed"""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Crayfish1, Crayfish2)) and obj.id is not None:
+            session.info.setdefault("crayfish_changes", set()).add((obj.__tablename__, obj.id))
+
+
+@event.listens_for(Session, "after_commit")
+def _record_crayfish_changes(session):
+    changes = session.info.pop("crayfish_changes", None)
+    if changes:
+        change_journal.record(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_crayfish_changes(session):
+    session.info.pop("crayfish_changes", None)
+
+
+def survey1_from_wide(df1):
+    """
+    Turns the first sheet of the proj Excel file into one row per crayfish, in the same order
+    as data/excel_to_db.py imports it into the crayfish1 table
+    Args:
+        df1 (DataFrame): The first sheet in the proj Excel file as a dataframe
+    Raises:
+        NA
+    Returns:
+        survey1 (DataFrame): The crayfish1 rows, indexed by id
+    """
+    # Find the Gender and length columns of each site and method by position, as the columns are not sorted
+    positions = {}
+    for i, (site, method, info) in enumerate(df1.columns):
+        positions.setdefault((site, method), {})[info] = i
+    parts = []
+    for (site, method), info in positions.items():
+        part = pd.DataFrame({"site": site, "method": method, "gender": df1.iloc[:, info['Gender']],
+                             "length": df1.iloc[:, info['Carapace length  (mm)']].astype(float)})
+        parts.append(part.dropna(how='all', subset=["gender", "length"]))
+    survey1 = pd.concat(parts, ignore_index=True)
+    survey1.index = pd.RangeIndex(1, len(survey1) + 1, name="id")
+    return survey1
+
+
+def survey2_from_wide(df2):
+    """
+    Turns the second sheet of the proj Excel file into one row per crayfish, in the same order
+    as data/excel_to_db.py imports it into the crayfish2 table
+    Args:
+        df2 (DataFrame): The second sheet in the proj Excel file as a dataframe
+    Raises:
+        NA
+    Returns:
+        survey2 (DataFrame): The crayfish2 rows, indexed by id
+    """
+    positions = {}
+    for i, (site, info) in enumerate(df2.columns):
+        positions.setdefault(site, {})[info] = i
+    parts = []
+    for site, info in positions.items():
+        part = pd.DataFrame({"site": site, "gender": df2.iloc[:, info['Gender']],
+                             "length": df2.iloc[:, info['Carapace length  (mm)']].astype(float),
+                             "weight": df2.iloc[:, info['Weight (g)']].astype(float)})
+        parts.append(part.dropna(how='all', subset=["gender", "length", "weight"]))
+    survey2 = pd.concat(parts, ignore_index=True)
+    survey2.index = pd.RangeIndex(1, len(survey2) + 1, name="id")
+    return survey2
+
+
+def compact_survey(rows):
+    """
+    Stores the text columns as categories and the measurements as float32, which takes a fraction
+    of the memory of the multi-index sheets and lets pandas group by the category codes
+    Args:
+        rows (DataFrame): Crayfish rows, indexed by id
+    Raises:
+        NA
+    Returns:
+        rows (DataFrame): The same rows with compact column types
+    """
+    categories = [column for column in ("site", "method", "gender") if column in rows]
+    measurements = [column for column in ("length", "weight") if column in rows]
+    rows = rows.astype({**{column: "category" for column in categories},
+                        **{column: "float32" for column in measurements}})
+    for column in categories:
+        rows[column] = rows[column].cat.remove_unused_categories()
+    return rows
+
+
+def read_survey_rows(table, ids=None):
+    """
+    Reads crayfish rows from the database
+    Args:
+        table (str): crayfish1 or crayfish2
+        ids (list): Only read these ids, all rows are read if it is None
+    Raises:
+        NA
+    Returns:
+        rows (DataFrame): The rows, indexed by id
+    """
+    model = SURVEY_MODELS[table]
+    columns = SURVEY_COLUMNS[table]
+    select = db.select(model.id, *[getattr(model, column) for column in columns])
+    if ids is None:
+        result = db.session.execute(select.order_by(model.id)).all()
+    else:
+        ids = sorted(ids)
+        result = []
+        # SQLite limits the number of parameters in a query, so look the ids up in chunks
+        for start in range(0, len(ids), 500):
+            result += db.session.execute(select.where(model.id.in_(ids[start:start + 500]))).all()
+    return pd.DataFrame(result, columns=["id"] + columns).set_index("id")
+
+
+class SurveyData:
+    """
+    One version of the survey data. It is never changed once built, so a callback can keep using it
+    while a newer version is being made.
+    """
+
+    def __init__(self, survey1, survey2, version=0, site_summaries=None):
+        self.survey1 = compact_survey(survey1)
+        self.survey2 = compact_survey(survey2)
+        self.version = version
+        # Behind the pie charts, see site_summary.py
+        if site_summaries is None:
+            site_summaries = summarise_sites(self.survey1)
+        self.site_summaries = site_summaries
+        # Answers the bar chart filters, see range_index.py
+        self.range_index = RangeCountIndex(self.survey2)
+
+        # Sites are listed in the order they were first recorded
+        self.site_list = list(self.survey2["site"].unique())
+        if len(survey2):
+            self.length_minimum, self.length_maximum = find_min_and_max(self.survey2, 'length')
+            self.weight_minimum, self.weight_maximum = find_min_and_max(self.survey2, 'weight')
+        else:
+            # The crayfish2 table has not been filled in yet, see data/excel_to_db.py
+            self.length_minimum = self.length_maximum = self.weight_minimum = self.weight_maximum = 0
+
+        # Behind the distribution curves, see distribution.py
+        self.moments = site_sex_moments(self.survey2)
+        self.grids = {"length": measurement_grid(self.length_minimum, self.length_maximum),
+                      "weight": measurement_grid(self.weight_minimum, self.weight_maximum)}
+
+    def apply_changes(self, changed_rows, version):
+        """
+        Makes the next version of the data by replacing only the rows that changed
+        Args:
+            changed_rows (dict): For each table, the changed ids and their current rows,
+                                 ids missing from the rows have been deleted
+            version (int): The data version after the changes
+        Raises:
+            NA
+        Returns:
+            data (SurveyData): The updated data
+        """
+        frames = {"crayfish1": self.survey1, "crayfish2": self.survey2}
+        removed = {}
+        added = {}
+        for table, (ids, rows) in changed_rows.items():
+            if ids:
+                frame = frames[table]
+                removed[table] = frame.loc[frame.index.intersection(list(ids))]
+                added[table] = rows
+                kept = frame.drop(index=list(ids), errors="ignore")
+                frames[table] = pd.concat([kept, compact_survey(rows)]).sort_index() if len(rows) else kept
+
+        site_summaries = self.site_summaries
+        if "crayfish1" in added:
+            site_summaries = updated_summaries(site_summaries, removed["crayfish1"], added["crayfish1"])
+        data = SurveyData(frames["crayfish1"], frames["crayfish2"], version, site_summaries)
+        if "crayfish2" in added:
+            # Only the sites and sexes of the old and new versions of the changed rows need new trees
+            changed = set()
+            for rows in (removed["crayfish2"], added["crayfish2"]):
+                changed.update(zip(rows["site"].astype(object), rows["gender"].astype(object)))
+            data.range_index = self.range_index.updated(data.survey2, changed)
+        else:
+            data.range_index = self.range_index
+        return data
+
+
+class CrayfishDataset:
+    """
+    Holds the data behind the dashboard. Nothing is read until the data is first needed,
+    so the forum, account and REST routes never wait for it.
+
+    With the database source the data comes from the crayfish1 and crayfish2 tables, and rows
+    written through the app are applied on the next dashboard request.
+    With the excel source the data comes from the proj Excel file and never changes.
+    """
+
+    def __init__(self, flask_app, source, excel_file, snapshot_dir):
+        if source not in ("database", "excel"):
+            raise ValueError(f"Unknown dashboard data source: {source}")
+        self.flask_app = flask_app
+        self.source = source
+        self.excel_file = excel_file
+        self.snapshot_dir = snapshot_dir
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._data = None
+
+    @property
+    def ready(self):
+        """True once the data has been loaded"""
+        return self._ready.is_set()
+
+    @property
+    def version(self):
+        """The data version of the loaded data, 0 if nothing has been loaded"""
+        return self._data.version if self._data is not None else 0
+
+    def load(self):
+        """
+        Gives the latest data, loading it the first time it is called. Safe to call from several
+        threads at once, only one of them does the loading.
+        Args:
+            NA
+        Raises:
+            OSError: If the Excel file cannot be read
+        Returns:
+            data (SurveyData): The loaded data
+        """
+        data = self._data
+        if data is not None and (self.source == "excel" or data.version == change_journal.version):
+            return data
+        with self._lock:
+            with self.flask_app.app_context():
+                if self._data is None:
+                    self._data = self._read_all()
+                    self._ready.set()
+                elif self.source == "database" and self._data.version != change_journal.version:
+                    self._data = self._refresh(self._data)
+            return self._data
+
+    def _read_all(self):
+        if self.source == "excel":
+            df1, df2 = read_excel_snapshot(self.excel_file, self.snapshot_dir)
+            return SurveyData(survey1_from_wide(df1), survey2_from_wide(df2))
+        # Take the version first, so writes made while reading are applied again by the next refresh
+        version = change_journal.version
+        return SurveyData(read_survey_rows("crayfish1"), read_survey_rows("crayfish2"), version)
+
+    def _refresh(self, data):
+        changes, version = change_journal.changes_since(data.version)
+        if changes is None:
+            return self._read_all()
+        changed_rows = {table: (ids, read_survey_rows(table, ids)) for table, ids in changes.items() if ids}
+        return data.apply_changes(changed_rows, version)
+
+    def warm(self):
+        """
+        Starts loading the data in a background thread
+        Args:
+            NA
+        Raises:
+            NA
+        Returns:
+            thread (Thread): The thread doing the loading
+        """
+        thread = threading.Thread(target=self._warm, name="crayfish-dataset-warm", daemon=True)
+        thread.start()
+        return thread
+
+    def _warm(self):
+        try:
+            self.load()
+        except Exception as e:
+            # Not fatal, the first dashboard request will try to load the data again
+            print(f"Could not warm the dashboard dataset: {e}")
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+# Number of x values each distribution curve is drawn with
+GRID_POINTS = 200
+# Measurements in the crayfish2 table that the distribution curves can show
+MEASUREMENTS = ["length", "weight"]
+
+
+def measurement_grid(minimum, maximum, num_points=GRID_POINTS):
+    """
+    Gives the x values shared by every curve of one measurement, from 0 to a little past the largest value
+    Args:
+        minimum (float): The smallest value of the measurement
+        maximum (float): The largest value of the measurement
+        num_points (int): The number of x values
+    Raises:
+        NA
+    Returns:
+        grid (ndarray): Evenly spaced x values
+    """
+    # Lengths and weights cannot be negative, so the curves start at 0
+    margin = max((maximum - minimum) * 0.1, 1)
+    return np.linspace(0, maximum + margin, num_points)
+
+
+def site_sex_moments(survey2):
+    """
+    Adds up the crayfish2 measurements for each site and sex, which is enough to get the mean and
+    standard deviation of any mix of sexes without going through the rows again
+    Args:
+        survey2 (DataFrame): The crayfish2 rows
+    Raises:
+        NA
+    Returns:
+        moments (dict): For each (site, sex), the number of crayfish measured, the sum and the sum of
+                        squares of each measurement
+    """
+    values = survey2[MEASUREMENTS].astype(np.float64)
+    columns = pd.concat([survey2[["site", "gender"]], values, values.pow(2).add_suffix("_squared")], axis=1)
+    grouped = columns.groupby(["site", "gender"], observed=True)
+    sums = grouped.sum()
+    # A crayfish with a length but no weight is left out of the weight sums, so it is not counted for them
+    for column in MEASUREMENTS:
+        sums[column + "_count"] = grouped[column].count()
+    return {key: row for key, row in zip(sums.index, sums.to_dict("records"))}
+
+
+def mean_and_sd(moments, site, sex, column):
+    """
+    Gives the mean and sample standard deviation of a measurement for the chosen sexes at a site
+    Args:
+        moments (dict): The sums from site_sex_moments
+        site (str): The site
+        sex (list): 'M', 'F' or both
+        column (str): length or weight
+    Raises:
+        NA
+    Returns:
+        mean (float): The mean, nan if there are no crayfish
+        sd (float): The standard deviation, nan if there are less than two crayfish
+    """
+    rows = [moments[site, one_sex] for one_sex in set(sex) if (site, one_sex) in moments]
+    num = sum(row[column + "_count"] for row in rows)
+    total = sum(row[column] for row in rows)
+    squared = sum(row[column + "_squared"] for row in rows)
+    if num == 0:
+        return np.nan, np.nan
+    mean = total / num
+    if num < 2:
+        return mean, np.nan
+    variance = max(squared - total * mean, 0) / (num - 1)
+    return mean, np.sqrt(variance)
+
+
+def kernel_density(values, grid):
+    """
+    Estimates the probability density of the measurements at the grid values with a gaussian kernel.
+    The measurements are counted into one bin per grid value first and the bins are smoothed with the
+    kernel, so the time taken hardly grows with the number of crayfish. The grid starts at 0, where the
+    density is reflected.
+    Args:
+        values (ndarray): The measurements
+        grid (ndarray): Evenly spaced x values from measurement_grid
+    Raises:
+        NA
+    Returns:
+        density (ndarray): The estimated density at each grid value, nan if there are less than two values
+    """
+    values = np.asarray(values, dtype=np.float64)
+    sd = values.std(ddof=1) if len(values) > 1 else 0
+    if not sd > 0:
+        return np.full(len(grid), np.nan)
+    # Scott's rule for the width of the kernel
+    bandwidth = sd * len(values) ** (-1 / 5)
+
+    step = grid[1] - grid[0]
+    counts, _edges = np.histogram(values, bins=len(grid), range=(grid[0] - step / 2, grid[-1] + step / 2))
+    half = min(int(np.ceil(4 * bandwidth / step)), len(grid) - 1)
+    offsets = np.arange(-half, half + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    smoothed = np.convolve(counts, kernel)
+    density = smoothed[half:half + len(grid)]
+    # Small crayfish would spread part of their density below 0, reflect it back so none is lost
+    below = smoothed[half - 1::-1] if half else smoothed[:0]
+    density[1:len(below) + 1] += below[:len(grid) - 1]
+    return density / len(values)
@@ -0,0 +1,74 @@
+import json
+import threading
+from collections import OrderedDict
+import plotly
+
+
+class FigureCache:
+    """
+    Keeps the most recently used dashboard figures, so the same chart is not built again while the
+    data has not changed. The figures are stored as JSON, which takes less memory than the plotly
+    objects and gives every caller its own copy.
+    All figures are dropped when the data version changes.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+
+    def get_or_build(self, version, key, build):
+        """
+        Gives the cached figure for the inputs, building and caching it if it is not there
+        Args:
+            version (int): The data version the figure is built from
+            key (tuple): The normalised callback inputs
+            build (function): Builds the figure, or a tuple of figures, when it is not cached
+        Raises:
+            NA
+        Returns:
+            figure: The built figure, or the cached one as a dict
+        """
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(cached)
+            self.misses += 1
+
+        # Build outside the lock so a slow chart does not hold up the others
+        figure = build()
+        if self.max_entries > 0:
+            cached = json.dumps(figure, cls=plotly.utils.PlotlyJSONEncoder)
+            with self._lock:
+                if version == self._version:
+                    self._entries[key] = cached
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        return figure
+
+    def clear(self):
+        """Drops every cached figure"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Gives the cache counters
+        Args:
+            NA
+        Raises:
+            NA
+        Returns:
+            stats (dict): The hits, misses and number of cached figures
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
@@ -0,0 +1,201 @@
+import numpy as np
+
+# Measured with benchmarks/bench_range_index.py: a query on the trees costs about as much as scanning
+# TREE_COST_ROWS rows for each site counted, and every scan costs about SCAN_OVERHEAD_ROWS rows on top
+TREE_COST_ROWS = 10000
+SCAN_OVERHEAD_ROWS = 35000
+
+
+def trees_are_quicker(num_rows, num_sites):
+    """
+    Says whether counting with the trees is quicker than one pass over the rows, see the costs above
+    Args:
+        num_rows (int): The number of crayfish2 rows
+        num_sites (int): The number of sites counted
+    Raises:
+        NA
+    Returns:
+        quicker (bool): True if the trees should be used
+    """
+    return num_rows + SCAN_OVERHEAD_ROWS > TREE_COST_ROWS * num_sites
+
+
+def count_by_site(df, site_list, length_min, length_max, weight_min, weight_max, sex):
+    """
+    Counts the male/female/both crayfish between the given lengths and weights for every site at once,
+    by filtering the rows a single time and counting them by their site code
+    Args:
+        df (DataFrame): The dataframe that holds our data
+        site_list (list): The sites to count, in the order they should be returned
+        length_min (float): The minimum length for the search
+        length_max (float): The maximum length for the search
+        weight_min (float): The minimum weight for the search
+        weight_max (float): The maximum weight for the search
+        sex (list): Whether to search for only male, female or both
+    Raises:
+        NA
+    Returns:
+        count (list): The number of crayfish found at each site in site_list
+    """
+    length = df['length'].to_numpy()
+    weight = df['weight'].to_numpy()
+    match = ((length >= np.float32(length_min)) &
+             (length <= np.float32(length_max)) &
+             (weight >= np.float32(weight_min)) &
+             (weight <= np.float32(weight_max)) &
+             df['gender'].isin(list(sex)).to_numpy())
+
+    sites = df['site'].cat
+    counts = np.bincount(sites.codes.to_numpy()[match], minlength=len(sites.categories))
+    # Sites that are not in the data have no crayfish
+    positions = sites.categories.get_indexer(site_list)
+    return [int(counts[position]) if position >= 0 else 0 for position in positions]
+
+
+class MergeSortTree:
+    """
+    Counts the crayfish whose length and weight fall inside a rectangle without looking at every crayfish.
+
+    The crayfish are sorted by length, so a length range is a slice found with a binary search.
+    Level k of the tree splits that order into blocks of 2**k crayfish with their weights sorted inside
+    each block, and any slice is made of at most two blocks per level. Counting the weights in range in
+    those blocks with another binary search answers a query in O(log(n)**2).
+    """
+
+    def __init__(self, length, weight):
+        order = np.argsort(length, kind="stable")
+        self.length = np.asarray(length, dtype=np.float32)[order]
+
+        size = 1
+        while size < len(order):
+            size *= 2
+        # Pad the last block with inf, a query slice never reaches the padding
+        level = np.full(size, np.inf, dtype=np.float32)
+        level[:len(order)] = np.asarray(weight, dtype=np.float32)[order]
+        self.levels = [level]
+        width = 1
+        while width < size:
+            width *= 2
+            level = np.sort(level.reshape(-1, width), axis=1).ravel()
+            self.levels.append(level)
+
+    def __len__(self):
+        return len(self.length)
+
+    def count(self, length_min, length_max, weight_min, weight_max):
+        """
+        Counts the crayfish with length_min <= length <= length_max and weight_min <= weight <= weight_max
+        Args:
+            length_min (float): The minimum length for the search
+            length_max (float): The maximum length for the search
+            weight_min (float): The minimum weight for the search
+            weight_max (float): The maximum weight for the search
+        Raises:
+            NA
+        Returns:
+            num (int): The number of crayfish in the rectangle
+        """
+        low = int(np.searchsorted(self.length, np.float32(length_min), side="left"))
+        high = int(np.searchsorted(self.length, np.float32(length_max), side="right"))
+        # Counting weights <= the value just below weight_min gives the number under the range
+        bounds = np.array([np.nextafter(np.float32(weight_min), np.float32(-np.inf)), weight_max], dtype=np.float32)
+
+        num = 0
+        level = 0
+        while low < high:
+            if low & 1:
+                num += self._count_block(level, low, bounds)
+                low += 1
+            if high & 1:
+                high -= 1
+                num += self._count_block(level, high, bounds)
+            low >>= 1
+            high >>= 1
+            level += 1
+        return num
+
+    def _count_block(self, level, block, bounds):
+        width = 1 << level
+        below, up_to_max = np.searchsorted(self.levels[level][block * width:(block + 1) * width], bounds, side="right")
+        return int(up_to_max - below)
+
+
+class RangeCountIndex:
+    """
+    One MergeSortTree for each site and sex in the crayfish2 rows. The trees are built the first time
+    they are needed, and a newer version of the data keeps the trees of the sites and sexes it did not touch.
+    """
+
+    def __init__(self, survey2, trees=None):
+        self.survey2 = survey2
+        self._trees = dict(trees or {})
+
+    def tree(self, site, sex):
+        """
+        Gives the tree for the crayfish of one sex caught at a site
+        Args:
+            site (string): The site where the crayfish were caught
+            sex (string): 'M' or 'F'
+        Raises:
+            NA
+        Returns:
+            tree (MergeSortTree): The tree, built if it did not exist yet
+        """
+        tree = self._trees.get((site, sex))
+        if tree is None:
+            match = ((self.survey2['site'] == site) & (self.survey2['gender'] == sex)).to_numpy()
+            tree = MergeSortTree(self.survey2['length'].to_numpy()[match], self.survey2['weight'].to_numpy()[match])
+            self._trees[site, sex] = tree
+        return tree
+
+    def count_by_site(self, site_list, length_min, length_max, weight_min, weight_max, sex):
+        """
+        Counts the male/female/both crayfish between the given lengths and weights at each site
+        Args:
+            site_list (list): The sites to count, in the order they should be returned
+            length_min (float): The minimum length for the search
+            length_max (float): The maximum length for the search
+            weight_min (float): The minimum weight for the search
+            weight_max (float): The maximum weight for the search
+            sex (list): Whether to search for only male, female or both
+        Raises:
+            NA
+        Returns:
+            count (list): The number of crayfish found at each site in site_list
+        """
+        if not trees_are_quicker(len(self.survey2), len(site_list)):
+            return count_by_site(self.survey2, site_list, length_min, length_max, weight_min, weight_max, sex)
+        return self.count_with_trees(site_list, length_min, length_max, weight_min, weight_max, sex)
+
+    def count_with_trees(self, site_list, length_min, length_max, weight_min, weight_max, sex):
+        """
+        Counts the crayfish at each site from the trees, see count_by_site for the arguments
+        Args:
+            site_list (list): The sites to count, in the order they should be returned
+            length_min (float): The minimum length for the search
+            length_max (float): The maximum length for the search
+            weight_min (float): The minimum weight for the search
+            weight_max (float): The maximum weight for the search
+            sex (list): Whether to search for only male, female or both
+        Raises:
+            NA
+        Returns:
+            count (list): The number of crayfish found at each site in site_list
+        """
+        return [sum(self.tree(site, one_sex).count(length_min, length_max, weight_min, weight_max)
+                    for one_sex in set(sex))
+                for site in site_list]
+
+    def updated(self, survey2, changed):
+        """
+        Gives the index for a newer version of the crayfish2 rows
+        Args:
+            survey2 (DataFrame): The newer crayfish2 rows
+            changed (set): The (site, sex) pairs whose rows were added, changed or deleted
+        Raises:
+            NA
+        Returns:
+            index (RangeCountIndex): The index for the newer rows, sharing the trees that are still valid
+        """
+        trees = {key: tree for key, tree in self._trees.items() if key not in changed}
+        return RangeCountIndex(survey2, trees)
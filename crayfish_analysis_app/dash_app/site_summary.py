@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+# Trapping methods in the order the pie chart shows them
+METHODS = ['Drawdown', 'Handsearch', 'Trapping']
+
+
+class SiteSummary:
+    """
+    The crayfish1 rows of one site added up by trapping method and sex, which is all the pie charts need.
+    For each (method, sex) it keeps the number of crayfish, the number with a length and the sum of
+    the lengths. A summary is never changed once made, updates make a new one.
+    """
+
+    def __init__(self, cells=None):
+        self.cells = dict(cells or {})
+        # Work the pie chart numbers out once, they are read on every request
+        self.num_m_f = (self._count_sex('F'), self._count_sex('M'))
+        self.mean_stats = (self._mean([cell for key, cell in self.cells.items() if key[1] == 'F']),
+                           self._mean([cell for key, cell in self.cells.items() if key[1] == 'M']))
+        by_method = [[cell for key, cell in self.cells.items() if key[0] == method] for method in METHODS]
+        self.method_stats = ([sum(cell[1] for cell in cells) for cells in by_method],
+                             [self._mean(cells) for cells in by_method])
+
+    def __len__(self):
+        return sum(cell[0] for cell in self.cells.values())
+
+    def _count_sex(self, sex):
+        return sum(cell[0] for key, cell in self.cells.items() if key[1] == sex)
+
+    @staticmethod
+    def _mean(cells):
+        measured = sum(cell[1] for cell in cells)
+        if measured == 0:
+            return np.nan
+        return round(float(sum(cell[2] for cell in cells) / measured), 2)
+
+    def added(self, sums, sign=1):
+        """
+        Makes the summary with some crayfish added, or taken away
+        Args:
+            sums (dict): (method, sex) -> (crayfish, crayfish with a length, sum of the lengths)
+            sign (int): 1 to add the crayfish, -1 to take them away
+        Raises:
+            NA
+        Returns:
+            summary (SiteSummary): The new summary
+        """
+        cells = dict(self.cells)
+        for key, (num, measured, total) in sums.items():
+            old = cells.get(key, (0, 0, 0.0))
+            cell = (old[0] + sign * num, old[1] + sign * measured, old[2] + sign * total)
+            if cell[0] > 0:
+                cells[key] = cell
+            else:
+                cells.pop(key, None)
+        return SiteSummary(cells)
+
+
+def survey1_sums(survey1):
+    """
+    Adds up crayfish1 rows by site, method and sex
+    Args:
+        survey1 (DataFrame): crayfish1 rows
+    Raises:
+        NA
+    Returns:
+        sums (dict): site -> {(method, sex): (crayfish, crayfish with a length, sum of the lengths)}
+    """
+    sums = {}
+    if len(survey1) == 0:
+        return sums
+    # Rows with no method or sex still count towards the other one, so keep the missing values
+    keys = survey1[["site", "method", "gender"]].astype(object)
+    keys = keys.where(keys.notna(), None)
+    length = survey1["length"].astype(np.float64)
+    grouped = length.groupby([keys["site"], keys["method"], keys["gender"]], dropna=False)
+    table = pd.DataFrame({"num": grouped.size(), "measured": grouped.count(), "total": grouped.sum()})
+    for (site, method, sex), num, measured, total in zip(table.index, table["num"], table["measured"], table["total"]):
+        sums.setdefault(site, {})[method, sex] = (int(num), int(measured), float(total))
+    return sums
+
+
+def summarise_sites(survey1):
+    """
+    Makes the summary of every site in the crayfish1 rows
+    Args:
+        survey1 (DataFrame): crayfish1 rows
+    Raises:
+        NA
+    Returns:
+        summaries (dict): site -> SiteSummary
+    """
+    return {site: SiteSummary(cells) for site, cells in survey1_sums(survey1).items()}
+
+
+def updated_summaries(summaries, removed, added):
+    """
+    Updates the site summaries for changed crayfish1 rows, the sites that did not change are shared
+    Args:
+        summaries (dict): site -> SiteSummary before the change
+        removed (DataFrame): The old versions of the changed or deleted rows
+        added (DataFrame): The new versions of the inserted or changed rows
+    Raises:
+        NA
+    Returns:
+        summaries (dict): site -> SiteSummary after the change
+    """
+    summaries = dict(summaries)
+    for rows, sign in ((removed, -1), (added, 1)):
+        for site, sums in survey1_sums(rows).items():
+            summary = summaries.get(site, SiteSummary()).added(sums, sign)
+            if len(summary):
+                summaries[site] = summary
+            else:
+                summaries.pop(site, None)
+    return summaries
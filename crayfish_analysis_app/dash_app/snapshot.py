@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from crayfish_analysis_app.helper_functions import read_excel_multi_index
+
+
+def workbook_hash(excel_file):
+    """
+    Calculates the content hash of the Excel file, used to tell whether a snapshot is still valid
+    Args:
+        excel_file (xlsx): The proj Excel file
+    Raises:
+        OSError: If the file cannot be read
+    Returns:
+        digest (str): The sha256 hex digest of the file contents
+    """
+    sha = hashlib.sha256()
+    with open(excel_file, "rb") as file:
+        for block in iter(lambda: file.read(1 << 16), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def save_frames(snapshot_file, frames):
+    """
+    Saves the dataframes column by column into a single .npz file
+    Args:
+        snapshot_file (Path): Where the snapshot is written
+        frames (dict): The dataframes to be saved, keyed by name
+    Raises:
+        OSError: If the snapshot cannot be written
+    Returns:
+        NA
+    """
+    arrays = {}
+    meta = {}
+    for name, df in frames.items():
+        columns = []
+        for i, label in enumerate(df.columns):
+            key = f"{name}_{i}"
+            series = df.iloc[:, i]
+            if series.dtype == object:
+                # Text columns are stored as fixed width strings, with '' standing in for NaN
+                arrays[key] = series.fillna("").astype(str).to_numpy(dtype=str)
+                kind = "str"
+            else:
+                arrays[key] = series.to_numpy()
+                kind = "num"
+            columns.append({"key": key, "label": list(label) if isinstance(label, tuple) else label, "kind": kind})
+        meta[name] = {"names": list(df.columns.names), "columns": columns}
+    arrays["__meta__"] = np.array(json.dumps(meta))
+
+    # Write to a temporary file first so other workers never read a half written snapshot
+    tmp_file = snapshot_file.with_name(f"{snapshot_file.name}.{os.getpid()}.tmp")
+    with open(tmp_file, "wb") as file:
+        np.savez(file, **arrays)
+    os.replace(tmp_file, snapshot_file)
+
+
+def load_frames(snapshot_file):
+    """
+    Loads the dataframes saved by save_frames
+    Args:
+        snapshot_file (Path): The .npz snapshot
+    Raises:
+        OSError: If the snapshot cannot be read
+        ValueError: If the snapshot is corrupt
+    Returns:
+        frames (dict): The dataframes, keyed by name
+    """
+    frames = {}
+    with np.load(snapshot_file, allow_pickle=False) as data:
+        meta = json.loads(str(data["__meta__"]))
+        for name, info in meta.items():
+            values = []
+            labels = []
+            for column in info["columns"]:
+                array = data[column["key"]]
+                if column["kind"] == "str":
+                    text = array.astype(object)
+                    text[array == ""] = np.nan
+                    array = text
+                values.append(array)
+                labels.append(tuple(column["label"]) if isinstance(column["label"], list) else column["label"])
+            df = pd.DataFrame(dict(enumerate(values)))
+            if len(info["names"]) > 1:
+                df.columns = pd.MultiIndex.from_tuples(labels, names=info["names"])
+            else:
+                df.columns = pd.Index(labels, name=info["names"][0])
+            frames[name] = df
+    return frames
+
+
+def read_excel_snapshot(excel_file, snapshot_dir):
+    """
+    Returns the two sheets of the proj Excel file, parsing the workbook only when it has
+    changed since the last snapshot was taken
+    Args:
+        excel_file (xlsx): The proj Excel file
+        snapshot_dir (Path): The folder where the snapshots are kept
+    Raises:
+        NA
+    Returns:
+        df1 (DataFrame): The first sheet in the proj Excel file as a dataframe
+        df2 (DataFrame): The second sheet in the proj Excel file as a dataframe
+    """
+    excel_file = Path(excel_file)
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_file = snapshot_dir.joinpath(f"{excel_file.stem}-{workbook_hash(excel_file)[:16]}.npz")
+
+    if snapshot_file.exists():
+        try:
+            frames = load_frames(snapshot_file)
+            return frames["df1"], frames["df2"]
+        except (OSError, ValueError, KeyError):
+            # The snapshot is unreadable, so fall back to the workbook and write it again
+            pass
+
+    df1, df2 = read_excel_multi_index(excel_file)
+
+    try:
+        snapshot_dir.mkdir(parents=True, exist_ok=True)
+        save_frames(snapshot_file, {"df1": df1, "df2": df2})
+        # Remove the snapshots of older versions of the workbook
+        for old_file in snapshot_dir.glob(f"{excel_file.stem}-*.npz"):
+            if old_file != snapshot_file:
+                old_file.unlink(missing_ok=True)
+    except OSError:
+        # A read-only deployment still works, it just parses the workbook every time
+        pass
+
+    return df1, df2
@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+
+
+class FragmentCache:
+    """
+    Keeps the most recently used pieces of rendered HTML, such as the forum post cards.
+    The key must hold everything the HTML depends on, e.g. the post id and version and what the viewer
+    is allowed to do, so an entry never needs to be removed by hand. Old versions drop off the end.
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get_or_render(self, key, render):
+        """
+        Gives the cached HTML for the key, rendering and caching it if it is not there
+        Args:
+            key (tuple): What the HTML depends on
+            render (function): Renders the HTML when it is not cached
+        Raises:
+            NA
+        Returns:
+            html (str): The HTML
+        """
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+
+        html = render()
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[key] = html
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return html
+
+    def clear(self):
+        """Drops every cached fragment"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Gives the cache counters
+        Args:
+            NA
+        Raises:
+            NA
+        Returns:
+            stats (dict): The hits, misses, hit rate and number of cached fragments
+        """
+        with self._lock:
+            requests = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / requests if requests else 0.0, "entries": len(self._entries)}
@@ -23,3 +23,21 @@ def read_excel_multi_index(excel_file):
     df2_final.columns = df2_final.columns.set_names(["Site", "Info"])
     df2_final = df2_final.drop(0).reset_index(drop=True)
     return df1_final, df2_final
+
+
+def find_min_and_max(df, attribute):
+    """
+    This function find the minimum and maximum value for an attribute of the crayfish
+    Args:
+        df (DataFrame): The dataframe that holds our data, one row per crayfish
+        attribute (string): The column with the size (length) or the weight (weight) of the crayfish
+    Raises:
+        NA
+    Returns:
+        minimum (float): The minimum value for the attribute in the dataframe
+        maximum (float): The maximum value for the attribute in the dataframe
+    """
+    minimum = float(df[attribute].min())
+    maximum = float(df[attribute].max())
+
+    return minimum, maximum
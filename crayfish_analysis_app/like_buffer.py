@@ -0,0 +1,208 @@
+import atexit
+import threading
+import time
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .models import db, User, Post, Like
+
+
+class LikeBuffer:
+    """
+    Write-behind buffer for likes. A like or unlike is answered from memory straight away, and a background
+    thread writes all the likes and unlikes of the last LIKE_BUFFER_WINDOW seconds in one transaction, so a
+    burst of likes takes the SQLite write lock a few times instead of once per click.
+
+    Liking and unliking the same post before it is written cancels out. Until a change is written, the
+    liked state and like count of the post are read from the buffer, see overlay_liked and like_count.
+    The buffer holds where the like and the count should end up, not the change, so a page read while the
+    batch is being committed shows the same numbers whether it read the database before or after.
+    """
+
+    def __init__(self, flask_app, window=0.05):
+        self.flask_app = flask_app
+        self.window = window
+        self._lock = threading.Lock()
+        # (user id, post id) -> liked, and post id -> like count, not yet written
+        self._pending = {}
+        self._pending_counts = {}
+        # The batch being written, and the one written before it, still read until the next batch is written
+        self._flushing = ({}, {})
+        self._written = ({}, {})
+        # Counts the batches that have left the buffer, see toggle
+        self._generation = 0
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def toggle(self, user_id, post_id):
+        """
+        Likes a post, or takes the like away if the user has already liked it. Written by the next flush.
+        Args:
+            user_id (int): The id of the user
+            post_id (int): The id of the post
+        Raises:
+            NA
+        Returns:
+            liked (bool): True if the post is now liked by the user
+            like_count (int): The number of likes of the post, None if the post does not exist
+        """
+        post_id = int(post_id)
+        while True:
+            with self._lock:
+                generation = self._generation
+            # Read outside the lock, so a read waiting on a busy database does not hold up the other likes
+            stored_count = db.session.execute(db.select(Post.like_count).where(Post.id == post_id)).scalar()
+            stored_liked = db.session.execute(db.select(Like.id).where(Like.author == user_id,
+                                                                       Like.post_id == post_id)).first() is not None
+            with self._lock:
+                like_count = self._overlay_count(post_id)
+                liked = self._overlay_liked(user_id, post_id)
+                if (like_count is None or liked is None) and generation != self._generation:
+                    # A written batch left the buffer during the reads, which may be from before it was written
+                    continue
+                if like_count is None:
+                    like_count = stored_count
+                    if like_count is None:
+                        return False, None
+                if liked is None:
+                    liked = stored_liked
+                liked = not liked
+                like_count += 1 if liked else -1
+                self._pending[user_id, post_id] = liked
+                self._pending_counts[post_id] = like_count
+                break
+        self._start()
+        self._wake.set()
+        return liked, like_count
+
+    def _overlay_liked(self, user_id, post_id):
+        for likes in (self._pending, self._flushing[0], self._written[0]):
+            if (user_id, post_id) in likes:
+                return likes[user_id, post_id]
+        return None
+
+    def _overlay_count(self, post_id):
+        for counts in (self._pending_counts, self._flushing[1], self._written[1]):
+            if post_id in counts:
+                return counts[post_id]
+        return None
+
+    def overlay_liked(self, user_id, posts, liked):
+        """
+        Adds the likes and unlikes not written yet to the posts a user has liked
+        Args:
+            user_id (int): The id of the user
+            posts (iterable): The posts on the page
+            liked (set): The ids of the posts the user has liked in the database, see liked_post_ids
+        Raises:
+            NA
+        Returns:
+            liked (set): The ids of the posts the user has liked
+        """
+        liked = set(liked)
+        with self._lock:
+            for post in posts:
+                state = self._overlay_liked(user_id, post.id)
+                if state is True:
+                    liked.add(post.id)
+                elif state is False:
+                    liked.discard(post.id)
+        return liked
+
+    def like_count(self, post_id, stored_count):
+        """
+        Gives the like count of a post, including the likes not written yet
+        Args:
+            post_id (int): The id of the post
+            stored_count (int): The like count read from the database
+        Raises:
+            NA
+        Returns:
+            like_count (int): The like count to show
+        """
+        with self._lock:
+            like_count = self._overlay_count(post_id)
+        return stored_count if like_count is None else like_count
+
+    def flush(self):
+        """
+        Writes the likes and unlikes in the buffer in one transaction
+        Args:
+            NA
+        Raises:
+            NA
+        Returns:
+            num (int): The number of likes and unlikes written
+        """
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        with self._lock:
+            batch = (self._pending, self._pending_counts)
+            self._pending, self._pending_counts = {}, {}
+            self._flushing = batch
+        likes, _counts = batch
+        if not likes:
+            with self._lock:
+                self._written = batch
+                self._flushing = ({}, {})
+                self._generation += 1
+            return 0
+        try:
+            for (user_id, post_id), liked in likes.items():
+                if liked:
+                    # Through a select, so a like on a post or by a user deleted since is dropped
+                    user_exists = db.select(User.id).where(User.id == user_id).exists()
+                    like = db.select(db.literal(user_id), Post.id).where(Post.id == post_id, user_exists)
+                    db.session.execute(sqlite_insert(Like).from_select(["author", "post_id"], like)
+                                       .on_conflict_do_nothing())
+                else:
+                    db.session.execute(db.delete(Like).where(Like.author == user_id, Like.post_id == post_id))
+            # Count the likes again, so the stored counts are right even if the buffer was not
+            post_ids = {post_id for _user_id, post_id in likes}
+            count = db.select(db.func.count(Like.id)).where(Like.post_id == Post.id).scalar_subquery()
+            db.session.execute(db.update(Post).where(Post.id.in_(post_ids))
+                               .values(like_count=count, version=Post.version + 1))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                # Keep the batch for the next flush, changes made since it was taken are newer
+                self._pending = {**likes, **self._pending}
+                self._pending_counts = {**batch[1], **self._pending_counts}
+                self._flushing = ({}, {})
+            raise
+        with self._lock:
+            self._written = batch
+            self._flushing = ({}, {})
+            self._generation += 1
+        return len(likes)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="like-buffer", daemon=True)
+            self._thread.start()
+        # Write what is left when the app stops
+        atexit.register(self._flush_in_app)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            # Let the other likes of the burst come in
+            time.sleep(self.window)
+            if self._flush_in_app():
+                # Flush once more, to stop reading the written batch from the buffer
+                self._wake.set()
+
+    def _flush_in_app(self):
+        with self.flask_app.app_context():
+            try:
+                return self.flush()
+            except Exception as e:
+                # Not lost, the batch is written by the next flush
+                print(f"Could not write the buffered likes: {e}")
+                self._wake.set()
+                return 0
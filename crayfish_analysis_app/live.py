@@ -0,0 +1,249 @@
+import json
+import queue
+import threading
+from collections import deque
+from flask import current_app
+from .models import db, ForumEvent
+
+
+class Subscription:
+    """The events waiting to be sent down one open stream"""
+
+    def __init__(self, queue_size):
+        self.events = queue.Queue(queue_size)
+        # Set when the stream fell too far behind, the browser reconnects and catches up from the history
+        self.closed = False
+
+    def get(self, timeout):
+        """
+        Waits for the next event
+        Args:
+            timeout (float): Seconds to wait
+        Raises:
+            NA
+        Returns:
+            event (tuple): (event id, kind, data), None if no event came in time
+        """
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class LocalBroker:
+    """
+    Passes forum events to the streams open in this process. Every stream gets its own queue, so a slow
+    browser never holds up the request that published the event.
+
+    The last events are kept, so a browser that reconnects with a Last-Event-ID gets what it missed.
+    """
+
+    def __init__(self, history=200, queue_size=100):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._history = deque(maxlen=history)
+        self._next_id = 1
+        self.queue_size = queue_size
+
+    def publish(self, kind, data):
+        """
+        Sends an event to every open stream
+        Args:
+            kind (str): What happened, e.g. 'like'
+            data (dict): The details, sent to the browser as JSON
+        Raises:
+            NA
+        Returns:
+            event_id (int): The id of the event
+        """
+        # The id is given out under the same lock as the event is stored and queued, so the history and
+        # every stream get the events in id order
+        with self._lock:
+            event_id = self._next_id
+            self._next_id += 1
+            self._deliver_locked((event_id, kind, data))
+        return event_id
+
+    def _deliver(self, event_id, kind, data):
+        with self._lock:
+            self._deliver_locked((event_id, kind, data))
+
+    def _deliver_locked(self, event):
+        self._history.append(event)
+        # put_nowait never waits, so a slow browser does not hold the lock
+        for subscription in list(self._subscriptions):
+            try:
+                subscription.events.put_nowait(event)
+            except queue.Full:
+                subscription.closed = True
+                self._subscriptions.discard(subscription)
+
+    def subscribe(self, last_event_id=None):
+        """
+        Opens a stream of events
+        Args:
+            last_event_id (int): The last event the browser got before it reconnected, None for a new stream
+        Raises:
+            NA
+        Returns:
+            subscription (Subscription): The events for the stream, starting with any the browser missed
+        """
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            latest_id = self._latest_id()
+            if last_event_id is not None and last_event_id < latest_id:
+                missed = [event for event in self._history if event[0] > last_event_id]
+                if not self._history or self._history[0][0] > last_event_id + 1:
+                    # Too much was missed to catch up, the page has to be loaded again
+                    missed = [(latest_id, "reload", {})]
+                for event in missed[-self.queue_size:]:
+                    subscription.events.put_nowait(event)
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def _latest_id(self):
+        # The id of the last event published, called with the lock held
+        return self._next_id - 1
+
+    def unsubscribe(self, subscription):
+        """Closes a stream opened by subscribe"""
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+
+class DatabaseBroker(LocalBroker):
+    """
+    Passes forum events between the worker processes of the app through the forum_event table.
+    Each event is written to the table, and in every process with open streams a thread reads the new
+    rows and hands them to those streams.
+
+    A process only keeps the events its thread has read since its first stream opened. A browser that
+    reconnects to a process that has not read the events it missed is sent "reload".
+    """
+
+    def __init__(self, flask_app, poll_interval=0.5, keep=1000, **kwargs):
+        super().__init__(**kwargs)
+        self.flask_app = flask_app
+        self.poll_interval = poll_interval
+        self.keep = keep
+        self._poller = None
+        self._poll_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._last_id = None
+
+    def publish(self, kind, data):
+        # On a connection of its own, so publishing never commits what the caller's session has pending
+        with db.engine.begin() as connection:
+            event_id = connection.execute(db.insert(ForumEvent).values(kind=kind, data=json.dumps(data))
+                                          ).inserted_primary_key[0]
+            if event_id % 100 == 0:
+                # Only the last events are needed, for streams that reconnect
+                connection.execute(db.delete(ForumEvent).where(ForumEvent.id <= event_id - self.keep))
+        return event_id
+
+    def subscribe(self, last_event_id=None):
+        self._start_poller()
+        return super().subscribe(last_event_id)
+
+    def _latest_id(self):
+        # The last event handed to the streams of this process
+        return self._last_id or 0
+
+    def _start_poller(self):
+        with self._lock:
+            if self._poller is not None:
+                return
+            # Events published before the first stream opened are not sent
+            self._last_id = db.session.execute(db.select(db.func.max(ForumEvent.id))).scalar() or 0
+            self._poller = threading.Thread(target=self._poll, name="forum-events", daemon=True)
+            self._poller.start()
+
+    def _poll(self):
+        with self.flask_app.app_context():
+            while not self._stopped.is_set():
+                self.poll_once()
+                self._stopped.wait(self.poll_interval)
+
+    def close(self):
+        """Stops reading the forum_event table"""
+        self._stopped.set()
+
+    def poll_once(self):
+        """
+        Hands the events written since the last poll to the open streams
+        Args:
+            NA
+        Raises:
+            NA
+        Returns:
+            num (int): The number of new events
+        """
+        with self._poll_lock:
+            try:
+                rows = db.session.execute(db.select(ForumEvent).where(ForumEvent.id > self._last_id)
+                                          .order_by(ForumEvent.id)).scalars().all()
+                events = [(row.id, row.kind, json.loads(row.data)) for row in rows]
+            except Exception as e:
+                print(f"Could not read the forum events: {e}")
+                events = []
+            finally:
+                # End the read, so the next poll sees the rows committed by the other workers
+                db.session.rollback()
+            for event in events:
+                self._deliver(*event)
+                self._last_id = event[0]
+            return len(events)
+
+
+def create_broker(flask_app):
+    """
+    Makes the broker named by LIVE_EVENTS_BROKER
+    Args:
+        flask_app (Flask): The Flask app
+    Raises:
+        ValueError: If the broker is not 'local' or 'database'
+    Returns:
+        broker (LocalBroker): The broker
+    """
+    name = flask_app.config.get("LIVE_EVENTS_BROKER", "local")
+    if name == "local":
+        return LocalBroker()
+    if name == "database":
+        return DatabaseBroker(flask_app, flask_app.config.get("LIVE_EVENTS_POLL_INTERVAL", 0.5))
+    raise ValueError(f"Unknown live events broker: {name}")
+
+
+def publish_forum_event(kind, **data):
+    """
+    Tells the open forum pages about a change, call it after the change is committed
+    Args:
+        kind (str): 'post', 'post_deleted', 'like' or 'comment'
+        **data: The details, e.g. post_id and like_count
+    Raises:
+        NA
+    Returns:
+        NA
+    """
+    current_app.extensions["forum_events"].publish(kind, data)
+
+
+def event_stream(subscription, heartbeat):
+    """
+    Writes the events of a subscription in the Server-Sent Events format
+    Args:
+        subscription (Subscription): The events to send
+        heartbeat (float): Seconds between comments sent to keep the connection open
+    Raises:
+        NA
+    Returns:
+        chunks (generator): The text to send
+    """
+    # Tells the browser how long to wait before reconnecting
+    yield "retry: 3000\n\n"
+    while not subscription.closed:
+        event = subscription.get(heartbeat)
+        if event is None:
+            yield ": keep-alive\n\n"
+            continue
+        event_id, kind, data = event
+        yield f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,99 @@
+from sqlalchemy import inspect, text
+from .models import db, User, Post, Comment, Like, reconcile_post_counts
+
+# Columns added to the models after data/database.db was first made, with how to add them to a table
+ADDED_COLUMNS = {
+    "post": {
+        "like_count": "INTEGER NOT NULL DEFAULT 0",
+        "comment_count": "INTEGER NOT NULL DEFAULT 0",
+        "version": "INTEGER NOT NULL DEFAULT 0",
+    },
+    "user": {
+        "deleting": "BOOLEAN NOT NULL DEFAULT 0",
+    },
+}
+
+
+def remove_duplicate_likes():
+    """
+    Deletes all but the first like of a post by the same user, which the unique like index does not allow
+    Args:
+        NA
+    Raises:
+        NA
+    Returns:
+        num (int): The number of likes deleted
+    """
+    first_likes = db.select(db.func.min(Like.id)).group_by(Like.author, Like.post_id)
+    result = db.session.execute(db.delete(Like).where(Like.id.not_in(first_likes)))
+    db.session.commit()
+    if result.rowcount:
+        reconcile_post_counts()
+    return result.rowcount
+
+
+def remove_orphaned_rows():
+    """
+    Deletes the likes and comments left behind by posts and users deleted before foreign keys were enforced,
+    see enable_foreign_keys in models.py
+    Args:
+        NA
+    Raises:
+        NA
+    Returns:
+        num (int): The number of rows deleted
+    """
+    num = 0
+    for model in (Like, Comment):
+        result = db.session.execute(db.delete(model).where(db.or_(model.post_id.not_in(db.select(Post.id)),
+                                                                  model.author.not_in(db.select(User.id)))))
+        num += result.rowcount
+    db.session.commit()
+    if num:
+        reconcile_post_counts()
+    return num
+
+
+# Run before an index is added to a database that already has rows
+BEFORE_INDEX = {
+    "ix_like_author_post_id": remove_duplicate_likes,
+}
+
+
+def upgrade_database():
+    """
+    Brings an existing database up to date with the models. db.create_all only makes missing tables,
+    so columns and indexes added to existing tables are added here.
+    Args:
+        NA
+    Raises:
+        NA
+    Returns:
+        added (list): The (table, column or index) pairs that were added
+    """
+    inspector = inspect(db.engine)
+    added = []
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {column["name"] for column in inspector.get_columns(table)}
+        for column, definition in columns.items():
+            if column not in existing:
+                db.session.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {definition}'))
+                added.append((table, column))
+    db.session.commit()
+
+    if ("post", "like_count") in added or ("post", "comment_count") in added:
+        # The counts start at 0, so count the likes and comments that are already there
+        reconcile_post_counts()
+    if ("user", "deleting") in added:
+        # Added together with foreign key enforcement, so the database may still hold orphaned rows
+        remove_orphaned_rows()
+
+    for table in db.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                if index.name in BEFORE_INDEX:
+                    BEFORE_INDEX[index.name]()
+                index.create(db.engine)
+                added.append((table.name, index.name))
+    return added
@@ -1,4 +1,10 @@
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import joinedload
 from flask_login import UserMixin
 from flask_login import LoginManager
 from datetime import datetime
@@ -8,6 +14,18 @@ from config import Config
 db = SQLAlchemy()
 
 
+@event.listens_for(Engine, "connect")
+def enable_foreign_keys(dbapi_connection, _connection_record):
+    """
+    SQLite only enforces foreign keys, and their ON DELETE CASCADE, on connections that turn them on.
+    With it on, deleting a user or a post also deletes everything that belongs to it.
+    """
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys = ON")
+        cursor.close()
+
+
 class User(db.Model, UserMixin):
     """User"""
 
@@ -17,6 +35,8 @@ class User(db.Model, UserMixin):
     username = db.Column(db.String(150), unique=True, nullable=False)
     email = db.Column(db.String(150), unique=True, nullable=False)
     password = db.Column(db.String(150), nullable=False)
+    # Set while a large account is being deleted in the background, see accounts.py
+    deleting = db.Column(db.Boolean, nullable=False, default=False, server_default="0")
     posts = db.relationship('Post', backref='user', passive_deletes=True)
     comments = db.relationship('Comment', backref='user', passive_deletes=True)
     likes = db.relationship('Like', backref='user', passive_deletes=True)
@@ -77,17 +97,26 @@ login_manager.login_view = "views.login"
 
 @login_manager.user_loader
 def load_user(id):
-    return User.query.get(int(id))
+    user = User.query.get(int(id))
+    # An account being deleted is logged out everywhere
+    return user if user and not user.deleting else None
 
 
 class Post(db.Model):
     """Posts made"""
 
     __tablename__ = "post"
+    # The forum pages seek through the posts in (date_created, id) order, see pagination.py
+    __table_args__ = (db.Index("ix_post_date_created_id", "date_created", "id"),)
     id = db.Column(db.Integer, primary_key=True)
     date_created = db.Column(db.Date, nullable=True, default=datetime.utcnow)
     text = db.Column(db.Text, nullable=False)
-    author = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    author = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    # Kept up to date by the views that add and delete likes and comments, see adjust_post_count
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # Goes up whenever something shown on the post card changes, so a cached card is not used again
+    version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     comments = db.relationship('Comment', backref='post', passive_deletes=True)
     likes = db.relationship('Like', backref='Post', passive_deletes=True)
 
@@ -107,8 +136,8 @@ class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date_created = db.Column(db.Date, nullable=True, default=datetime.utcnow)
     text = db.Column(db.String(200), nullable=False)
-    author = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
-    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), nullable=False)
+    author = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), nullable=False, index=True)
 
     def __repr__(self):
         """
@@ -123,10 +152,13 @@ class Like(db.Model):
     """Likes on post"""
 
     __tablename__ = "like"
+    # A user can like a post once, the index also finds a user's like of a post without a scan.
+    # It starts with author, so it is used for the likes of a user as well
+    __table_args__ = (db.Index("ix_like_author_post_id", "author", "post_id", unique=True),)
     id = db.Column(db.Integer, primary_key=True)
     date_created = db.Column(db.Date, nullable=True, default=datetime.utcnow)
     author = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
-    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), nullable=False, index=True)
 
     def __repr__(self):
         """
@@ -137,10 +169,148 @@ class Like(db.Model):
         return f"{clsname}: <{self.date_created}, {self.id}, {self.author}, {self.post_id}>"
 
 
+class ForumEvent(db.Model):
+    """Forum changes passed between the worker processes for the live forum streams, see live.py"""
+
+    __tablename__ = "forum_event"
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    data = db.Column(db.Text, nullable=False)
+
+
+def post_card_loads():
+    """
+    Gives the loader options for everything posts_div.html shows with the posts, so a page of posts is
+    loaded in one query instead of one query per post. The comments are loaded when they are opened,
+    see post_comments in views.py.
+    Args:
+        NA
+    Raises:
+        NA
+    Returns:
+        options (tuple): The options to pass to select(Post).options()
+    """
+    return (joinedload(Post.user),)
+
+
+def liked_post_ids(user, posts):
+    """
+    Finds which of a page of posts a user has liked, with one query on the (author, post_id) like index
+    Args:
+        user (User): The user viewing the posts, may be anonymous
+        posts (iterable): The posts on the page
+    Raises:
+        NA
+    Returns:
+        post_ids (set): The ids of the posts the user has liked
+    """
+    post_ids = [post.id for post in posts]
+    if not post_ids or not user.is_authenticated:
+        return set()
+    return set(db.session.execute(db.select(Like.post_id)
+                                  .where(Like.author == user.id, Like.post_id.in_(post_ids))).scalars())
+
+
+def adjust_post_count(post_id, column, change):
+    """
+    Adds to the like or comment count of a post in the current transaction, so the count is
+    committed together with the like or comment. The version of the post goes up as well.
+    Args:
+        post_id (int): The id of the post
+        column (str): 'like_count' or 'comment_count'
+        change (int): The number to add, negative to take away
+    Raises:
+        NA
+    Returns:
+        NA
+    """
+    counter = getattr(Post, column)
+    db.session.execute(db.update(Post).where(Post.id == post_id)
+                       .values({counter: counter + change, Post.version: Post.version + 1}))
+
+
+def toggle_like(user_id, post_id):
+    """
+    Likes a post, or takes the like away if the user has already liked it, and commits
+    Args:
+        user_id (int): The id of the user
+        post_id (int): The id of the post
+    Raises:
+        NA
+    Returns:
+        liked (bool): True if the post is now liked by the user
+        like_count (int): The number of likes of the post, None if the post does not exist
+    """
+    # Each statement finds the like through the unique (author, post_id) index
+    unliked = db.session.execute(db.delete(Like).where(Like.author == user_id, Like.post_id == post_id))
+    if unliked.rowcount:
+        liked, change = False, -1
+    else:
+        # If the same like is being added at the same time, only one of them is inserted
+        try:
+            inserted = db.session.execute(sqlite_insert(Like).values(author=user_id, post_id=post_id)
+                                          .on_conflict_do_nothing())
+        except IntegrityError:
+            # The foreign key does not allow a like on a post that does not exist
+            db.session.rollback()
+            return False, None
+        liked, change = True, inserted.rowcount
+
+    like_count = db.session.execute(db.update(Post).where(Post.id == post_id)
+                                    .values(like_count=Post.like_count + change, version=Post.version + 1)
+                                    .returning(Post.like_count)).scalar()
+    if like_count is None:
+        db.session.rollback()
+        return False, None
+    db.session.commit()
+    return liked, like_count
+
+
+def remove_user_from_post_counts(user_id):
+    """
+    Takes the likes and comments of a user off the counts of the posts they are on, before they are deleted
+    Args:
+        user_id (int): The id of the user
+    Raises:
+        NA
+    Returns:
+        NA
+    """
+    for model, counter in ((Like, Post.like_count), (Comment, Post.comment_count)):
+        num = (db.select(db.func.count(model.id))
+               .where(model.post_id == Post.id, model.author == user_id)
+               .scalar_subquery())
+        on_posts = db.select(model.post_id).where(model.author == user_id)
+        db.session.execute(db.update(Post).where(Post.id.in_(on_posts))
+                           .values({counter: counter - num, Post.version: Post.version + 1}))
+
+
+def reconcile_post_counts():
+    """
+    Counts the likes and comments of every post again and stores the counts on the posts
+    Args:
+        NA
+    Raises:
+        NA
+    Returns:
+        num (int): The number of posts whose counts were wrong
+    """
+    likes = db.select(db.func.count(Like.id)).where(Like.post_id == Post.id).scalar_subquery()
+    comments = db.select(db.func.count(Comment.id)).where(Comment.post_id == Post.id).scalar_subquery()
+    result = db.session.execute(db.update(Post)
+                                .where(db.or_(Post.like_count != likes, Post.comment_count != comments))
+                                .values(like_count=likes, comment_count=comments, version=Post.version + 1))
+    db.session.commit()
+    return result.rowcount
+
+
 class Crayfish1(db.Model):
     """Sheet_1 form prepared_datasets.xlsx"""
 
     __tablename__ = "crayfish1"
+    # Used by the filters and sorts of the survey collections, see survey_query.py
+    __table_args__ = (db.Index("ix_crayfish1_site_method_gender", "site", "method", "gender"),
+                      db.Index("ix_crayfish1_length_id", "length", "id"))
     id = db.Column(db.Integer, primary_key=True)
     site = db.Column(db.String(10), nullable=False)
     method = db.Column(db.String(25), nullable=False)
@@ -160,6 +330,9 @@ class Crayfish2(db.Model):
     """Sheet_2 form prepared_datasets.xlsx"""
 
     __tablename__ = "crayfish2"
+    __table_args__ = (db.Index("ix_crayfish2_site_gender", "site", "gender"),
+                      db.Index("ix_crayfish2_length_id", "length", "id"),
+                      db.Index("ix_crayfish2_weight_id", "weight", "id"))
     id = db.Column(db.Integer, primary_key=True)
     site = db.Column(db.String(10), nullable=False)
     gender = db.Column(db.String(2), nullable=False)
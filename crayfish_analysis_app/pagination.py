@@ -0,0 +1,136 @@
+from datetime import date
+from .models import db
+
+
+class KeysetPage:
+    """
+    One page of posts, newest first, with the cursors of the pages either side of it
+    """
+
+    def __init__(self, items, newer=None, older=None):
+        self.items = items
+        self.newer = newer
+        self.older = older
+
+    @property
+    def newer_args(self):
+        """The URL arguments of the newer page, see page_url in views.py"""
+        return {"after": self.newer} if self.newer else None
+
+    @property
+    def older_args(self):
+        """The URL arguments of the older page"""
+        return {"before": self.older} if self.older else None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(item):
+    """
+    Makes the cursor that points at a post
+    Args:
+        item (Post): The post
+    Raises:
+        NA
+    Returns:
+        cursor (str): The date and id of the post, e.g. '2023-04-01.15'
+    """
+    day = item.date_created.isoformat() if item.date_created else ""
+    return f"{day}.{item.id}"
+
+
+def decode_cursor(cursor):
+    """
+    Reads a cursor made by encode_cursor
+    Args:
+        cursor (str): The cursor from the request
+    Raises:
+        ValueError: If the cursor is not a date and id
+    Returns:
+        day (date): The date of the post, None if it has no date
+        item_id (int): The id of the post
+    """
+    day, _dot, item_id = cursor.rpartition(".")
+    return (date.fromisoformat(day) if day else None), int(item_id)
+
+
+def _older_than(model, day, item_id):
+    # Posts without a date come after every dated post, as the oldest
+    if day is None:
+        return db.and_(model.date_created.is_(None), model.id < item_id)
+    return db.or_(model.date_created < day,
+                  db.and_(model.date_created == day, model.id < item_id),
+                  model.date_created.is_(None))
+
+
+def _newer_than(model, day, item_id):
+    if day is None:
+        return db.or_(model.date_created.is_not(None), model.id > item_id)
+    return db.or_(model.date_created > day, db.and_(model.date_created == day, model.id > item_id))
+
+
+def paginate_by_date(statement, model, page_size, before=None, after=None):
+    """
+    Gives one page of rows, newest first, by seeking to the (date_created, id) of a cursor
+    instead of counting rows with an offset, so every page takes the same time to load
+    Args:
+        statement (Select): Selects the rows to page through
+        model (Model): The model with the date_created and id columns, e.g. Post
+        page_size (int): The number of rows on a page
+        before (str): Cursor, give the rows older than it
+        after (str): Cursor, give the rows newer than it
+    Raises:
+        ValueError: If a cursor cannot be read
+    Returns:
+        page (KeysetPage): The rows and the cursors of the newer and older pages
+    """
+    newest_first = (model.date_created.desc(), model.id.desc())
+    if after is not None:
+        # Walk towards the newer rows, then put the page back in newest first order
+        query = statement.where(_newer_than(model, *decode_cursor(after)))
+        query = query.order_by(model.date_created.asc(), model.id.asc())
+        items = list(db.session.execute(query.limit(page_size + 1)).scalars())
+        has_newer = len(items) > page_size
+        items = items[:page_size][::-1]
+        has_older = True
+    else:
+        query = statement
+        if before is not None:
+            query = query.where(_older_than(model, *decode_cursor(before)))
+        items = list(db.session.execute(query.order_by(*newest_first).limit(page_size + 1)).scalars())
+        has_older = len(items) > page_size
+        items = items[:page_size]
+        has_newer = before is not None
+
+    if not items and (before is not None or after is not None):
+        # The cursor went past the end, e.g. its post was deleted, so start again from the newest
+        return paginate_by_date(statement, model, page_size)
+    return KeysetPage(items,
+                      newer=encode_cursor(items[0]) if items and has_newer else None,
+                      older=encode_cursor(items[-1]) if items and has_older else None)
+
+
+def paginate_by_id(statement, model, page_size, after=None):
+    """
+    Gives one page of rows, oldest first, by seeking past the id of the last row of the page before
+    Args:
+        statement (Select): Selects the rows to page through
+        model (Model): The model with the id column, e.g. Comment
+        page_size (int): The number of rows on a page
+        after (int): Cursor, the id of the last row already shown
+    Raises:
+        NA
+    Returns:
+        items (list): The rows on the page
+        next_cursor (int): The cursor of the next page, None if this is the last page
+    """
+    if after is not None:
+        statement = statement.where(model.id > after)
+    items = list(db.session.execute(statement.order_by(model.id).limit(page_size + 1)).scalars())
+    if len(items) > page_size:
+        return items[:page_size], items[page_size - 1].id
+    return items, None
@@ -0,0 +1,210 @@
+import re
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from .models import db, Post, post_card_loads
+
+# FTS5 table holding the text of every post and comment. A post is stored at rowid 2 * id and a comment
+# at rowid 2 * id + 1, so a row can be found and deleted by its rowid without a scan
+SEARCH_TABLE = "forum_search"
+
+
+def create_search_table():
+    """
+    Makes the search table if the database does not have it yet, and fills it from the posts and comments
+    Args:
+        NA
+    Raises:
+        NA
+    Returns:
+        available (bool): False if this SQLite was built without FTS5, then search is turned off
+    """
+    exists = db.session.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+                                {"name": SEARCH_TABLE}).first()
+    if exists:
+        return True
+    try:
+        db.session.execute(text(f"CREATE VIRTUAL TABLE {SEARCH_TABLE} "
+                                f"USING fts5(text, post_id UNINDEXED, tokenize = 'porter unicode61')"))
+    except OperationalError:
+        db.session.rollback()
+        return False
+    rebuild_search_index()
+    return True
+
+
+def search_available():
+    """True if the forum search table can be used"""
+    return current_app.extensions.get("forum_search", False)
+
+
+def rebuild_search_index():
+    """
+    Fills the search table again from the post and comment tables
+    Args:
+        NA
+    Raises:
+        NA
+    Returns:
+        num (int): The number of posts and comments in the search table
+    """
+    db.session.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    db.session.execute(text(f"INSERT INTO {SEARCH_TABLE} (rowid, text, post_id) "
+                            f"SELECT 2 * id, text, id FROM post"))
+    # Comments left behind by deleted posts are not searched
+    db.session.execute(text(f"INSERT INTO {SEARCH_TABLE} (rowid, text, post_id) "
+                            f"SELECT 2 * comment.id + 1, comment.text, comment.post_id "
+                            f"FROM comment JOIN post ON post.id = comment.post_id"))
+    db.session.commit()
+    return db.session.execute(text(f"SELECT count(*) FROM {SEARCH_TABLE}")).scalar()
+
+
+def index_post(post):
+    """
+    Adds a post to the search table in the current transaction
+    Args:
+        post (Post): The post, flushed so it has an id
+    Raises:
+        NA
+    Returns:
+        NA
+    """
+    if search_available():
+        # SQLite can give a new post the id of a deleted one, so replace any row left behind by a
+        # delete that did not go through the views
+        db.session.execute(text(f"INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, text, post_id) "
+                                f"VALUES (:rowid, :text, :post_id)"),
+                           {"rowid": 2 * post.id, "text": post.text, "post_id": post.id})
+
+
+def index_comment(comment):
+    """
+    Adds a comment to the search table in the current transaction
+    Args:
+        comment (Comment): The comment, flushed so it has an id
+    Raises:
+        NA
+    Returns:
+        NA
+    """
+    if search_available():
+        # The post id can come from the URL as a string, the search table does not turn it into a number
+        db.session.execute(text(f"INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, text, post_id) "
+                                f"VALUES (:rowid, :text, :post_id)"),
+                           {"rowid": 2 * comment.id + 1, "text": comment.text, "post_id": int(comment.post_id)})
+
+
+def unindex_comment(comment_id):
+    """
+    Removes a comment from the search table in the current transaction
+    Args:
+        comment_id (int): The id of the comment
+    Raises:
+        NA
+    Returns:
+        NA
+    """
+    if search_available():
+        db.session.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = :rowid"), {"rowid": 2 * comment_id + 1})
+
+
+def unindex_post(post_id):
+    """
+    Removes a post and its comments from the search table in the current transaction
+    Args:
+        post_id (int): The id of the post
+    Raises:
+        NA
+    Returns:
+        NA
+    """
+    if search_available():
+        db.session.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = :rowid "
+                                f"OR rowid IN (SELECT 2 * id + 1 FROM comment WHERE post_id = :post_id)"),
+                           {"rowid": 2 * int(post_id), "post_id": post_id})
+
+
+def unindex_user(user_id):
+    """
+    Removes the posts and comments of a user, and the comments on their posts, from the search table
+    in the current transaction. Call it before they are deleted.
+    Args:
+        user_id (int): The id of the user
+    Raises:
+        NA
+    Returns:
+        NA
+    """
+    if search_available():
+        db.session.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ("
+                                f"SELECT 2 * id FROM post WHERE author = :user_id "
+                                f"UNION SELECT 2 * id + 1 FROM comment WHERE author = :user_id "
+                                f"UNION SELECT 2 * comment.id + 1 FROM comment "
+                                f"JOIN post ON post.id = comment.post_id WHERE post.author = :user_id)"),
+                           {"user_id": user_id})
+
+
+def match_query(query):
+    """
+    Turns what the user typed into an FTS5 query that finds posts with all the words, so quotes and
+    FTS5 operators typed by the user cannot make the query fail
+    Args:
+        query (str): The search text
+    Raises:
+        NA
+    Returns:
+        match (str): The FTS5 query, empty if there are no words
+    """
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", query))
+
+
+class SearchPage:
+    """
+    One page of search results, best match first, with the numbers of the pages either side of it
+    """
+
+    def __init__(self, items, page, has_next):
+        self.items = items
+        self.page = page
+        # The URL arguments of the pages before and after this one, see page_url in views.py
+        self.newer_args = {"page": page - 1} if page > 1 else None
+        self.older_args = {"page": page + 1} if has_next else None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def search_posts(query, page, page_size):
+    """
+    Finds the posts whose text or comments match the search, ranked with bm25
+    Args:
+        query (str): The search text
+        page (int): The page of results, from 1
+        page_size (int): The number of posts on a page
+    Raises:
+        NA
+    Returns:
+        page (SearchPage): The matching posts on the page
+    """
+    match = match_query(query)
+    if not match or not search_available():
+        return SearchPage([], 1, False)
+
+    # A post is ranked by its best matching text, its own or one of its comments
+    rows = db.session.execute(text(f"SELECT {SEARCH_TABLE}.post_id FROM {SEARCH_TABLE} "
+                                   f"JOIN post ON post.id = {SEARCH_TABLE}.post_id "
+                                   f"WHERE {SEARCH_TABLE} MATCH :match "
+                                   f"GROUP BY {SEARCH_TABLE}.post_id ORDER BY min(rank), {SEARCH_TABLE}.post_id "
+                                   f"LIMIT :limit OFFSET :offset"),
+                              {"match": match, "limit": page_size + 1, "offset": (page - 1) * page_size})
+    post_ids = [row[0] for row in rows]
+    has_next = len(post_ids) > page_size
+    post_ids = post_ids[:page_size]
+
+    posts = db.session.execute(db.select(Post).where(Post.id.in_(post_ids))
+                               .options(*post_card_loads())).scalars().all()
+    by_id = {post.id: post for post in posts}
+    return SearchPage([by_id[post_id] for post_id in post_ids if post_id in by_id], page, has_next)
@@ -0,0 +1,37 @@
+// Loads the comments of a post the first time they are shown, and the next page of them when asked,
+// so the forum page only carries the posts.
+function loadComments(container, url, moreLink) {
+    fetch(url, {headers: {"Accept": "text/html"}})
+        .then(function (response) {
+            return response.ok ? response.text() : null;
+        })
+        .then(function (html) {
+            if (html === null) {
+                // Let the user try again
+                delete container.dataset.loaded;
+                return;
+            }
+            if (moreLink) {
+                moreLink.remove();
+            }
+            container.insertAdjacentHTML("beforeend", html);
+        });
+}
+
+document.addEventListener("show.bs.collapse", function (event) {
+    const container = event.target.querySelector("[data-comments-url]");
+    if (!container || container.dataset.loaded) {
+        return;
+    }
+    container.dataset.loaded = "true";
+    loadComments(container, container.dataset.commentsUrl, null);
+});
+
+document.addEventListener("click", function (event) {
+    const moreLink = event.target.closest(".more-comments");
+    if (!moreLink) {
+        return;
+    }
+    event.preventDefault();
+    loadComments(moreLink.closest("[data-comments-url]"), moreLink.href, moreLink);
+});
@@ -0,0 +1,28 @@
+// Likes and unlikes posts without loading the whole forum page again.
+// Without javascript the like links still work, they load the page again.
+document.addEventListener("click", function (event) {
+    const button = event.target.closest(".like-button");
+    if (!button) {
+        return;
+    }
+    event.preventDefault();
+
+    fetch(button.href, {method: "POST", headers: {"Accept": "application/json"}})
+        .then(function (response) {
+            // Not logged in or the post is gone, follow the link so the page shows why
+            if (response.redirected || !response.ok) {
+                window.location = button.href;
+                return null;
+            }
+            return response.json();
+        })
+        .then(function (result) {
+            if (!result) {
+                return;
+            }
+            document.getElementById("like-count-" + result.post_id).textContent = result.like_count;
+            const icon = button.querySelector("i");
+            icon.classList.toggle("fas", result.liked);
+            icon.classList.toggle("far", !result.liked);
+        });
+});
@@ -0,0 +1,83 @@
+// Keeps the forum page up to date with the posts, comments and likes made by everyone, from the
+// Server-Sent Events of /forum/events, instead of loading the whole page again.
+(function () {
+    const posts = document.getElementById("posts");
+    if (!posts || !window.EventSource) {
+        return;
+    }
+
+    function fetchCard(postId, then) {
+        fetch("/posts/" + postId + "/card")
+            .then(function (response) {
+                return response.ok ? response.text() : null;
+            })
+            .then(function (html) {
+                if (html !== null) {
+                    then(html);
+                }
+            });
+    }
+
+    function data(event) {
+        return JSON.parse(event.data);
+    }
+
+    // The browser reconnects by itself, sending the id of the last event so it is sent what it missed
+    const source = new EventSource("/forum/events");
+
+    source.addEventListener("like", function (event) {
+        const change = data(event);
+        const count = document.getElementById("like-count-" + change.post_id);
+        if (count) {
+            count.textContent = change.like_count;
+        }
+    });
+
+    source.addEventListener("comment", function (event) {
+        const change = data(event);
+        const card = document.getElementById("post-" + change.post_id);
+        if (!card) {
+            return;
+        }
+        const count = document.getElementById("comment-count-" + change.post_id);
+        if (!count || change.comment_count === 0) {
+            // The card changes between "No comments" and the link to the comments
+            fetchCard(change.post_id, function (html) {
+                card.outerHTML = html;
+            });
+            return;
+        }
+        count.textContent = change.comment_count;
+        // Comments that have been loaded are loaded again, see comments.js
+        const container = document.getElementById("comments-expanded-" + change.post_id);
+        if (container.dataset.loaded) {
+            container.innerHTML = "";
+            loadComments(container, container.dataset.commentsUrl, null);
+        }
+    });
+
+    source.addEventListener("post", function (event) {
+        const change = data(event);
+        if (posts.dataset.newPosts !== "live" || document.getElementById("post-" + change.post_id)) {
+            return;
+        }
+        fetchCard(change.post_id, function (html) {
+            posts.insertAdjacentHTML("afterbegin", html + "<br />");
+        });
+    });
+
+    source.addEventListener("post_deleted", function (event) {
+        const card = document.getElementById("post-" + data(event).post_id);
+        if (card) {
+            if (card.nextElementSibling && card.nextElementSibling.tagName === "BR") {
+                card.nextElementSibling.remove();
+            }
+            card.remove();
+        }
+    });
+
+    // Too many changes were missed while disconnected to patch the page
+    source.addEventListener("reload", function () {
+        window.location.reload();
+    });
+})();
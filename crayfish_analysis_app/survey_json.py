@@ -0,0 +1,71 @@
+import json
+from flask import Response
+from .models import db
+from .survey_query import survey_columns
+
+try:
+    import orjson
+except ImportError:
+    # orjson is optional, without it the json module is used
+    orjson = None
+
+
+def dumps(data):
+    """
+    Encodes data as JSON
+    Args:
+        data (dict or list): Made of dicts, lists, strings, numbers and None
+    Raises:
+        TypeError: If the data has something else in it
+    Returns:
+        body (bytes): The JSON in UTF-8
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def json_response(data, status=200):
+    """
+    Makes a JSON response without going through the Flask JSON provider
+    Args:
+        data (dict or list): The data to send, see dumps
+        status (int): The HTTP status code
+    Raises:
+        NA
+    Returns:
+        response (Response): The response
+    """
+    return Response(dumps(data), status=status, mimetype="application/json")
+
+
+def survey_records(model, *where):
+    """
+    Reads survey records as plain column values, without making an ORM object for each row
+    Args:
+        model (Model): Crayfish1 or Crayfish2
+        *where: Conditions the records must meet, e.g. Crayfish1.id == 3, none for the whole table
+    Raises:
+        NA
+    Returns:
+        records (list): The records as dicts, ordered by id
+    """
+    columns = survey_columns(model)
+    names = [column.key for column in columns]
+    rows = db.session.execute(db.select(*columns).where(*where).order_by(model.id))
+    return [dict(zip(names, row)) for row in rows]
+
+
+def survey_record(model, record_id):
+    """
+    Reads one survey record, see survey_records
+    Args:
+        model (Model): Crayfish1 or Crayfish2
+        record_id (int): The id of the record
+    Raises:
+        NA
+    Returns:
+        record (dict): The record, None if there is no record with the id
+    """
+    records = survey_records(model, model.id == record_id)
+    return records[0] if records else None
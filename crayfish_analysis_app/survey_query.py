@@ -0,0 +1,168 @@
+from .models import db, Crayfish1, Crayfish2
+
+# What each survey table can be filtered and sorted on
+SURVEY_FIELDS = {
+    Crayfish1: {"text": ["site", "method", "gender"], "range": ["length"]},
+    Crayfish2: {"text": ["site", "gender"], "range": ["length", "weight"]},
+}
+
+
+def survey_columns(model):
+    """
+    Gives the columns of a survey table
+    Args:
+        model (Model): Crayfish1 or Crayfish2
+    Raises:
+        NA
+    Returns:
+        columns (list): The id column, then the text columns, then the number columns
+    """
+    return [getattr(model, column) for column in ["id", *SURVEY_FIELDS[model]["text"], *SURVEY_FIELDS[model]["range"]]]
+
+
+class SurveyQuery:
+    """
+    The filters, sort and page asked for in the URL of a survey collection, checked against the table
+    """
+
+    def __init__(self, model, args, default_limit=100, max_limit=1000):
+        """
+        Reads the URL arguments
+        Args:
+            model (Model): Crayfish1 or Crayfish2
+            args (MultiDict): The URL arguments, e.g. request.args
+            default_limit (int): The number of rows on a page when limit is not given
+            max_limit (int): The largest limit allowed
+        Raises:
+            ValueError: If an argument is unknown or cannot be read, with a message for the client
+        """
+        self.model = model
+        fields = SURVEY_FIELDS[model]
+        range_args = [f"{column}_{end}" for column in fields["range"] for end in ("min", "max")]
+        allowed = {"limit", "after", "sort", *fields["text"], *range_args}
+        unknown = sorted(set(args) - allowed)
+        if unknown:
+            raise ValueError(f"Unknown arguments {unknown}, use {sorted(allowed)}")
+
+        self.limit = _read_number(args, "limit", int, default_limit)
+        if not 1 <= self.limit <= max_limit:
+            raise ValueError(f"limit must be between 1 and {max_limit}")
+
+        sort = args.get("sort", "id")
+        self.descending = sort.startswith("-")
+        self.sort = sort.lstrip("-")
+        if self.sort not in ["id", *fields["text"], *fields["range"]]:
+            raise ValueError(f"Cannot sort by {self.sort}")
+
+        # site=DGB2016,CON2016 and site=DGB2016&site=CON2016 both ask for either site
+        self.values = {}
+        for column in fields["text"]:
+            values = [value for arg in args.getlist(column) for value in arg.split(",") if value]
+            if values:
+                self.values[column] = values
+        self.ranges = {arg: _read_number(args, arg, float, None) for arg in range_args if arg in args}
+
+        self.after = decode_sort_cursor(args["after"], self.sort_column) if args.get("after") else None
+
+    @property
+    def sort_column(self):
+        """The column the rows are sorted on"""
+        return getattr(self.model, self.sort)
+
+    def statement(self):
+        """
+        Makes the SQL for one page. The filters, sort, cursor and limit are all done by the database,
+        using the indexes on the survey tables.
+        Args:
+            NA
+        Raises:
+            NA
+        Returns:
+            statement (Select): Selects the columns of the rows on the page, and one more row if there is a next page
+        """
+        model = self.model
+        statement = db.select(*survey_columns(model))
+        for column, values in self.values.items():
+            statement = statement.where(getattr(model, column).in_(values))
+        for arg, value in self.ranges.items():
+            column, _underscore, end = arg.rpartition("_")
+            column = getattr(model, column)
+            statement = statement.where(column >= value if end == "min" else column <= value)
+
+        if self.sort == "id":
+            order = [model.id.desc() if self.descending else model.id]
+            if self.after is not None:
+                statement = statement.where(model.id < self.after if self.descending else model.id > self.after)
+        else:
+            # Ties are broken by id, so every row has its own place in the order
+            key = db.tuple_(self.sort_column, model.id)
+            if self.after is not None:
+                statement = statement.where(key < self.after if self.descending else key > self.after)
+            order = ([self.sort_column.desc(), model.id.desc()] if self.descending
+                     else [self.sort_column, model.id])
+        return statement.order_by(*order).limit(self.limit + 1)
+
+    def page(self):
+        """
+        Gets one page of rows
+        Args:
+            NA
+        Raises:
+            NA
+        Returns:
+            items (list): The rows on the page as dicts
+            next_cursor (str): The after argument of the next page, None if this is the last page
+        """
+        rows = db.session.execute(self.statement()).mappings().all()
+        items = [dict(row) for row in rows[:self.limit]]
+        if len(rows) > self.limit:
+            return items, encode_sort_cursor(items[-1], self.sort)
+        return items, None
+
+
+def _read_number(args, name, kind, default):
+    value = args.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return kind(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number") from None
+
+
+def encode_sort_cursor(row, sort):
+    """
+    Makes the cursor that points at a row in the sort order
+    Args:
+        row (dict): The last row on the page
+        sort (str): The column the rows are sorted on
+    Raises:
+        NA
+    Returns:
+        cursor (str): The id when sorted by id, otherwise the sort value and the id, e.g. '23.5.1204'
+    """
+    if sort == "id":
+        return str(row["id"])
+    return f"{row[sort]}.{row['id']}"
+
+
+def decode_sort_cursor(cursor, sort_column):
+    """
+    Reads a cursor made by encode_sort_cursor
+    Args:
+        cursor (str): The cursor from the URL
+        sort_column (Column): The column the rows are sorted on
+    Raises:
+        ValueError: If the cursor does not fit the sort
+    Returns:
+        after (int or tuple): The id, or the (sort value, id) of the row
+    """
+    try:
+        if sort_column.key == "id":
+            return int(cursor)
+        value, _dot, row_id = cursor.rpartition(".")
+        if isinstance(sort_column.type, db.Float):
+            value = float(value)
+        return value, int(row_id)
+    except ValueError:
+        raise ValueError("after is not a cursor for this sort") from None
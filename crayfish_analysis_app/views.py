@@ -1,13 +1,24 @@
 import csv
 from io import StringIO
-from flask import Blueprint, render_template, flash, url_for, redirect, request, make_response, jsonify
+from flask import Blueprint, render_template, flash, url_for, redirect, request, make_response, jsonify, current_app, \
+    Response
 from flask_login import login_user, logout_user, login_required, current_user
+from werkzeug.datastructures import MultiDict
+from marshmallow import ValidationError
 from werkzeug.security import generate_password_hash, check_password_hash
-from .models import User, db, Post, Comment, Like, Crayfish1, Crayfish2
+from markupsafe import Markup
+from sqlalchemy.orm import joinedload
+from .models import User, db, Post, Comment, Crayfish1, Crayfish2, adjust_post_count, toggle_like, post_card_loads, \
+    liked_post_ids
 import re
 from flask_mail import Message
 from config import Config
 from crayfish_analysis_app.schemas import Crayfish1Schema, Crayfish2Schema
+from .pagination import paginate_by_date, paginate_by_id
+from .live import publish_forum_event, event_stream
+from .survey_query import SurveyQuery, survey_columns
+from .survey_json import json_response, survey_records, survey_record
+from .search import search_posts, index_post, index_comment, unindex_post, unindex_comment
 
 main_bp = Blueprint('views', __name__)
 
@@ -97,8 +108,8 @@ def login():
         # finding the email in database
         user = User.query.filter_by(email=email).first()
 
-        # validating the inputs from form
-        if user:
+        # validating the inputs from form, an account being deleted cannot log in
+        if user and not user.deleting:
             if check_password_hash(user.password, password):
                 flash('Logged in!', category='success')
                 login_user(user, remember=True)
@@ -246,7 +257,10 @@ def create_post():
             # creates a new post and updates the database
             post = Post(text=text, author=current_user.id)
             db.session.add(post)
+            db.session.flush()
+            index_post(post)
             db.session.commit()
+            publish_forum_event("post", post_id=post.id)
             flash('Post created!', category='success')
             return redirect(url_for('views.forum'))
 
@@ -277,8 +291,11 @@ def delete_post(id):
     else:
 
         # deletes the post and updates the database
+        post_id = post.id
+        unindex_post(post_id)
         db.session.delete(post)
         db.session.commit()
+        publish_forum_event("post_deleted", post_id=post_id)
         flash("Post deleted.", category="success")
     return redirect(url_for('views.forum'))
 
@@ -345,16 +362,12 @@ def delete_user(id):
     elif current_user.id != user.id:
         flash("You do not have permission to delete this user.", category="error")
     else:
-        # Delete the user's posts
-        Post.query.filter_by(author=id).delete()
-        # Delete the user's comments
-        Comment.query.filter_by(author=id).delete()
-        # Delete the user's likes
-        Like.query.filter_by(author=id).delete()
-        # Delete the user
-        db.session.delete(user)
-        db.session.commit()
-        flash("Account successfully deleted.", category="success")
+        # Deletes the user with their posts, comments and likes, large accounts in the background
+        if current_app.extensions["account_purger"].delete(user.id):
+            logout_user()
+            flash("Your account is being deleted.", category="success")
+        else:
+            flash("Account successfully deleted.", category="success")
         return redirect(url_for('views.home'))
     return redirect(url_for('views.home'))
 
@@ -378,9 +391,10 @@ def posts(username):
         flash("No user with that username exists.", category="error")
         return redirect(url_for("views.forum"))
 
-    # Obtains the posts of the user
-    posts = user.posts
-    return render_template("posts.html", user=current_user, posts=posts, username=username)
+    # Obtains one page of the posts of the user
+    posts = page_of_posts(db.select(Post).where(Post.author == user.id))
+    return render_template("posts.html", user=current_user, posts=posts, username=username,
+                           liked_posts=viewer_liked_posts(posts))
 
 
 @main_bp.route("/create-comment/<post_id>", methods=['POST'])
@@ -401,13 +415,19 @@ def create_comment(post_id):
     if not text:
         flash("Comment cannot be empty.", category='error')
     else:
-        post = Post.query.filter_by(id=post_id)
+        post = Post.query.filter_by(id=post_id).first()
         if post:
             # Adds the comment to the database
             comment = Comment(text=text, author=current_user.id, post_id=post_id)
             db.session.add(comment)
+            adjust_post_count(post_id, "comment_count", 1)
+            db.session.flush()
+            index_comment(comment)
             db.session.commit()
+            publish_forum_event("comment", post_id=post.id, comment_count=post.comment_count)
             flash("Comment added.", category="success")
+        else:
+            flash("Post does not exist.", category="error")
 
     return redirect(url_for("views.forum"))
 
@@ -432,13 +452,51 @@ def delete_comment(comment_id):
     elif current_user.id != comment.author and current_user.id != comment.post.author:
         flash("You do not have permission to delete this comment.", category="error")
     else:
+        post = comment.post
         db.session.delete(comment)
+        adjust_post_count(post.id, "comment_count", -1)
+        unindex_comment(comment.id)
         db.session.commit()
+        publish_forum_event("comment", post_id=post.id, comment_count=post.comment_count)
         flash("Comment deleted.", category="success")
 
     return redirect(url_for("views.forum"))
 
 
+def toggle_post_like(post_id):
+    """
+    Likes a post for the current user, or takes the like away, through the like buffer if it is turned on
+    Args:
+        post_id (int): The id of the post
+    Raises:
+        NA
+    Returns:
+        liked (bool): True if the post is now liked by the user
+        like_count (int): The number of likes of the post, None if the post does not exist
+    """
+    like_buffer = current_app.extensions["like_buffer"]
+    if like_buffer is not None:
+        return like_buffer.toggle(current_user.id, post_id)
+    return toggle_like(current_user.id, post_id)
+
+
+def viewer_liked_posts(posts):
+    """
+    Finds which of a page of posts the current user has liked, including likes still in the like buffer
+    Args:
+        posts (iterable): The posts on the page
+    Raises:
+        NA
+    Returns:
+        post_ids (set): The ids of the posts the user has liked
+    """
+    liked = liked_post_ids(current_user, posts)
+    like_buffer = current_app.extensions["like_buffer"]
+    if like_buffer is not None and current_user.is_authenticated:
+        liked = like_buffer.overlay_liked(current_user.id, posts, liked)
+    return liked
+
+
 @main_bp.route("/like-post/<post_id>", methods=["GET"])
 @login_required
 def like(post_id):
@@ -451,25 +509,37 @@ def like(post_id):
     Returns:
         The 'forum.html' page
     """
-    # Obtains the post id from the database
-    post = Post.query.filter_by(id=post_id)
-    # Checks if current user has already liked the post
-    like = Like.query.filter_by(author=current_user.id, post_id=post_id).first()
+    # Likes the post, or unlikes it if the current user has already liked it
+    _liked, like_count = toggle_post_like(post_id)
 
-    if not post:
+    if like_count is None:
         flash("Post does not exist.", category="error")
-    elif like:
-        db.session.delete(like)
-        db.session.commit()
     else:
-        # Add new like to database
-        like = Like(author=current_user.id, post_id=post_id)
-        db.session.add(like)
-        db.session.commit()
+        publish_forum_event("like", post_id=int(post_id), like_count=like_count)
 
     return redirect(url_for("views.forum"))
 
 
+@main_bp.post("/like-post/<post_id>")
+@login_required
+def like_json(post_id):
+    """
+    This function is used to like a post from the forum page without loading the page again.
+    Args:
+        post_id (int): The id of the post
+    Raises:
+        NA
+    Returns:
+        HTTP response with whether the post is liked and its number of likes in JSON
+    """
+    liked, like_count = toggle_post_like(post_id)
+
+    if like_count is None:
+        return jsonify({"message": "Post does not exist."}), 404
+    publish_forum_event("like", post_id=int(post_id), like_count=like_count)
+    return jsonify({"post_id": int(post_id), "liked": liked, "like_count": like_count})
+
+
 @main_bp.route("/about")
 def about():
     """
@@ -507,17 +577,191 @@ def forum():
     Returns:
         forum.html
     """
-    # Needs to get all posts from the post model
-    posts = Post.query.all()
-    return render_template('forum.html', user=current_user, posts=posts)
+    # Gets one page of posts, newest first
+    posts = page_of_posts(db.select(Post))
+    return render_template('forum.html', user=current_user, posts=posts,
+                           liked_posts=viewer_liked_posts(posts))
+
+
+@main_bp.route("/posts/<int:post_id>/comments")
+def post_comments(post_id):
+    """
+    This function renders one page of the comments of a post, oldest first, for comments.js to add to the post
+    Args:
+        post_id (int): The id of the post
+    Raises:
+        NA
+    Returns:
+        comments.html, or a 404 if the post does not exist
+    """
+    post = db.session.get(Post, post_id)
+    if post is None:
+        return "Post does not exist.", 404
+    statement = db.select(Comment).where(Comment.post_id == post_id).options(joinedload(Comment.user))
+    comments, next_cursor = paginate_by_id(statement, Comment, current_app.config.get("COMMENT_PAGE_SIZE", 20),
+                                           after=request.args.get("cursor", type=int))
+    return render_template("comments.html", user=current_user, post=post, comments=comments,
+                           next_cursor=next_cursor)
+
+
+@main_bp.route("/posts/<int:post_id>/card")
+def post_card_fragment(post_id):
+    """
+    This function renders the card of one post for the current user, for live.js to add a new post to the forum
+    Args:
+        post_id (int): The id of the post
+    Raises:
+        NA
+    Returns:
+        post_card.html, or a 404 if the post does not exist
+    """
+    post = db.session.execute(db.select(Post).where(Post.id == post_id).options(*post_card_loads())).scalar()
+    if post is None:
+        return "Post does not exist.", 404
+    return post_card(post, post.id in viewer_liked_posts([post]))
+
+
+@main_bp.route("/forum/events")
+def forum_events():
+    """
+    This function streams the forum changes to live.js as Server-Sent Events, so open forum pages can update
+    the likes, comments and posts they show without loading the page again
+
+    Raises:
+        NA
+    Returns:
+        HTTP response with the text/event-stream of the changes
+    """
+    broker = current_app.extensions["forum_events"]
+    # Sent by the browser when it reconnects, so it gets the events it missed
+    last_event_id = request.headers.get("Last-Event-ID", type=int)
+    subscription = broker.subscribe(last_event_id)
+    heartbeat = current_app.config.get("LIVE_EVENTS_HEARTBEAT", 15)
+
+    def stream():
+        try:
+            yield from event_stream(subscription, heartbeat)
+        finally:
+            broker.unsubscribe(subscription)
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@main_bp.route("/forum/search")
+def forum_search():
+    """
+    This function renders the posts whose text or comments match the search, best match first
+
+    Raises:
+        NA
+    Returns:
+        search.html
+    """
+    query = request.args.get("q", "")
+    page = request.args.get("page", 1, type=int)
+    posts = search_posts(query, max(page, 1), current_app.config.get("FORUM_PAGE_SIZE", 20))
+    return render_template('search.html', user=current_user, posts=posts, query=query,
+                           liked_posts=viewer_liked_posts(posts))
 
 
-crayfish1s_schema = Crayfish1Schema(many=True)
+def page_of_posts(statement):
+    """
+    Gets the page of posts asked for by the 'before' or 'after' cursor in the URL
+    Args:
+        statement (Select): Selects the posts to page through
+    Raises:
+        NA
+    Returns:
+        page (KeysetPage): The posts on the page and the cursors of the newer and older pages
+    """
+    page_size = current_app.config.get("FORUM_PAGE_SIZE", 20)
+    statement = statement.options(*post_card_loads())
+    try:
+        return paginate_by_date(statement, Post, page_size,
+                                before=request.args.get("before"), after=request.args.get("after"))
+    except ValueError:
+        # A cursor that has been edited by hand, show the newest posts instead
+        return paginate_by_date(statement, Post, page_size)
+
+
+@main_bp.app_context_processor
+def post_card_renderer():
+    """Lets posts_div.html render the post cards through the fragment cache and link to other pages"""
+    return {"post_card": post_card, "page_url": page_url}
+
+
+def page_url(page_args):
+    """
+    Makes the URL of another page of the current list of posts
+    Args:
+        page_args (dict): The URL arguments of the page, e.g. {'before': cursor}
+    Raises:
+        NA
+    Returns:
+        url (str): The current URL with the page arguments replaced
+    """
+    args = {name: value for name, value in request.args.items() if name not in ("before", "after", "page")}
+    return url_for(request.endpoint, **request.view_args, **args, **page_args)
+
+
+def post_card(post, liked):
+    """
+    Renders the card of a post for the current user, reusing the HTML from an earlier request
+    if nothing shown on the card has changed
+    Args:
+        post (Post): The post, with its author loaded
+        liked (bool): Whether the current user has liked the post, see liked_post_ids
+    Raises:
+        NA
+    Returns:
+        html (Markup): The card
+    """
+    # Who is viewing only matters for whether they can delete the post
+    is_author = current_user.is_authenticated and current_user.id == post.author
+    like_buffer = current_app.extensions["like_buffer"]
+    like_count = like_buffer.like_count(post.id, post.like_count) if like_buffer else post.like_count
+    # SQLite gives the id of a deleted last post to the next post, so the key also holds what tells the two apart
+    key = (post.id, post.author, post.user.username, post.date_created, hash(post.text), post.version, liked,
+           is_author, like_count)
+    cache = current_app.extensions["post_card_cache"]
+    html = cache.get_or_render(key, lambda: render_template("post_card.html", post=post, user=current_user,
+                                                            liked=liked, like_count=like_count))
+    return Markup(html)
+
+
+# Only used to check the JSON sent to the REST routes, records are sent back through survey_json.py
 crayfish1_schema = Crayfish1Schema()
-crayfish2s_schema = Crayfish2Schema(many=True)
 crayfish2_schema = Crayfish2Schema()
 
 
+def survey_page(model):
+    """
+    Gets the page of a survey table asked for in the URL, for the crayfish1 and crayfish2 pages
+    Args:
+        model (Model): Crayfish1 or Crayfish2
+    Raises:
+        NA
+    Returns:
+        items (list): The records on the page as dicts
+        next_url (str): The URL of the next page, None if this is the last page
+        first_url (str): The URL of the first page, None if this is the first page
+    """
+    page_size = current_app.config.get("SURVEY_PAGE_SIZE", 100)
+    max_limit = current_app.config.get("SURVEY_API_MAX_LIMIT", 1000)
+    try:
+        query = SurveyQuery(model, request.args, page_size, max_limit)
+    except ValueError as e:
+        # An argument edited by hand, show the first page instead
+        flash(str(e), category="error")
+        query = SurveyQuery(model, MultiDict(), page_size, max_limit)
+    items, next_cursor = query.page()
+    args = {name: values for name, values in request.args.to_dict(flat=False).items() if name != "after"}
+    next_url = url_for(request.endpoint, **args, after=next_cursor) if next_cursor is not None else None
+    first_url = url_for(request.endpoint, **args) if "after" in request.args else None
+    return items, next_url, first_url
+
+
 @main_bp.route("/crayfish1")
 def crayfish1():
     """
@@ -528,12 +772,93 @@ def crayfish1():
     Returns:
         crayfish1.html
     """
-    # Select all the regions using Flask-SQLAlchemy
-    all_crayfish1 = db.session.execute(db.select(Crayfish1)).scalars()
-    # Get the data using Marshmallow schema (returns JSON)
-    result = crayfish1s_schema.dump(all_crayfish1)
-    # Return a list crayfish data in crayfish1 in JSON
-    return render_template("crayfish1.html", crayfish_list=result, user=current_user)
+    # Gets one page of the records, the same way as /api/crayfish1
+    result, next_url, first_url = survey_page(Crayfish1)
+    return render_template("crayfish1.html", crayfish_list=result, next_url=next_url, first_url=first_url,
+                           user=current_user)
+
+
+def survey_collection(model):
+    """
+    Gives one page of a survey table as JSON, filtered and sorted as asked for in the URL
+    Args:
+        model (Model): Crayfish1 or Crayfish2
+    Raises:
+        NA
+    Returns:
+        HTTP response with the rows and the URL of the next page in JSON, or a 400 if the URL cannot be read
+    """
+    try:
+        query = SurveyQuery(model, request.args, current_app.config.get("SURVEY_API_PAGE_SIZE", 100),
+                            current_app.config.get("SURVEY_API_MAX_LIMIT", 1000))
+    except ValueError as e:
+        return json_response({"message": str(e)}, 400)
+    items, next_cursor = query.page()
+    next_url = None
+    if next_cursor is not None:
+        next_url = url_for(request.endpoint, **{**request.args.to_dict(flat=False), "after": next_cursor})
+    return json_response({"items": items, "next": next_cursor, "next_url": next_url})
+
+
+@main_bp.get("/api/crayfish1")
+def crayfish1_collection():
+    """
+    This function returns one page of the crayfish1 records in JSON
+    Args (in the URL):
+        limit (int): The number of records, up to SURVEY_API_MAX_LIMIT
+        after (str): The 'next' cursor of the page before
+        sort (str): id, site, method, gender or length, with a - in front for the largest first
+        site, method, gender (str): Only records with these values, several can be given with commas
+        length_min, length_max (float): Only records in this range
+    Raises:
+        NA
+    Returns:
+        HTTP response with the records in JSON
+    """
+    return survey_collection(Crayfish1)
+
+
+@main_bp.get("/api/crayfish2")
+def crayfish2_collection():
+    """
+    This function returns one page of the crayfish2 records in JSON
+    Args (in the URL):
+        limit (int): The number of records, up to SURVEY_API_MAX_LIMIT
+        after (str): The 'next' cursor of the page before
+        sort (str): id, site, gender, length or weight, with a - in front for the largest first
+        site, gender (str): Only records with these values, several can be given with commas
+        length_min, length_max, weight_min, weight_max (float): Only records in these ranges
+    Raises:
+        NA
+    Returns:
+        HTTP response with the records in JSON
+    """
+    return survey_collection(Crayfish2)
+
+
+@main_bp.get("/api/crayfish1/export")
+def crayfish1_export():
+    """
+    This function returns every crayfish1 record in JSON
+    Raises:
+        NA
+    Returns:
+        HTTP response with a list of the records in JSON
+    """
+    # Read as plain column values and encoded in one go, Marshmallow would make and read an object per row
+    return json_response(survey_records(Crayfish1))
+
+
+@main_bp.get("/api/crayfish2/export")
+def crayfish2_export():
+    """
+    This function returns every crayfish2 record in JSON
+    Raises:
+        NA
+    Returns:
+        HTTP response with a list of the records in JSON
+    """
+    return json_response(survey_records(Crayfish2))
 
 
 @main_bp.get("/crayfish1/<int:id>")
@@ -545,14 +870,10 @@ def crayfish1_id(id):
     Raises:
         NA
     Returns:
-        crayfish1_schema.dump(crayfish)
+        HTTP response with the record in JSON, an empty object if there is no record with the id
     """
-    # Query the database to find the record, return a 404 not found code it the record isn't found
-    crayfish = db.session.execute(
-        db.select(Crayfish1).filter_by(id=id)
-    ).scalar_one_or_none()
-    # Get the data using Marshmallow schema (returns JSON) and return the data
-    return crayfish1_schema.dump(crayfish)
+    # Query the database for the columns of the record, without making a Crayfish1 object
+    return json_response(survey_record(Crayfish1, id) or {})
 
 
 @main_bp.get("/crayfish2")
@@ -565,12 +886,10 @@ def crayfish2():
     Returns:
         crayfish2.html
     """
-    # Select all the regions using Flask-SQLAlchemy
-    all_crayfish2 = db.session.execute(db.select(Crayfish2)).scalars()
-    # Get the data using Marshmallow schema (returns JSON)
-    result = crayfish2s_schema.dump(all_crayfish2)
-    # Return a list of crayfish data in crayfish2 in JSON
-    return render_template("crayfish2.html", crayfish_list=result, user=current_user)
+    # Gets one page of the records, the same way as /api/crayfish2
+    result, next_url, first_url = survey_page(Crayfish2)
+    return render_template("crayfish2.html", crayfish_list=result, next_url=next_url, first_url=first_url,
+                           user=current_user)
 
 
 @main_bp.get("/crayfish2/<int:id>")
@@ -582,14 +901,10 @@ def crayfish2_id(id):
     Raises:
         NA
     Returns:
-        crayfish2_schema.dump(crayfish)
+        HTTP response with the record in JSON, an empty object if there is no record with the id
     """
-    # Query the database to find the record, return a 404 not found code it the record isn't found
-    crayfish = db.session.execute(
-        db.select(Crayfish2).filter_by(id=id)
-    ).scalar_one_or_none()
-    # Get the data using Marshmallow schema (returns JSON) and return the data
-    return crayfish2_schema.dump(crayfish)
+    # Query the database for the columns of the record, without making a Crayfish2 object
+    return json_response(survey_record(Crayfish2, id) or {})
 
 
 @main_bp.delete('/crayfish1/<code>')
@@ -652,6 +967,10 @@ def crayfish1_add():
     Returns:
         HTTP response
     """
+    # Check the JSON sent in the request with the Marshmallow schema
+    errors = crayfish1_schema.validate(request.json)
+    if errors:
+        return json_response({"message": "The record is not valid.", "errors": errors}, 400)
     # Get the values of the JSON sent in the request
     site = request.json.get("site", "")
     method = request.json.get("method", "")
@@ -661,10 +980,11 @@ def crayfish1_add():
     crayfish = Crayfish1(site=site, method=method, gender=gender, length=length)
     # Save the new crayfish to the database
     db.session.add(crayfish)
+    db.session.flush()
+    crayfish_id = crayfish.id
     db.session.commit()
     # Return a response to the user with the newly added region in JSON format
-    result = crayfish1_schema.jsonify(crayfish)
-    return result
+    return json_response(survey_record(Crayfish1, crayfish_id))
 
 
 @main_bp.post("/crayfish2")
@@ -677,6 +997,10 @@ def crayfish2_add():
     Returns:
         HTTP response
     """
+    # Check the JSON sent in the request with the Marshmallow schema
+    errors = crayfish2_schema.validate(request.json)
+    if errors:
+        return json_response({"message": "The record is not valid.", "errors": errors}, 400)
     # Get the values of the JSON sent in the request
     site = request.json.get("site", "")
     gender = request.json.get("gender", "")
@@ -686,10 +1010,11 @@ def crayfish2_add():
     crayfish = Crayfish2(site=site, gender=gender, length=length, weight=weight)
     # Save the new crayfish to the database
     db.session.add(crayfish)
+    db.session.flush()
+    crayfish_id = crayfish.id
     db.session.commit()
     # Return a response to the user with the newly added region in JSON format
-    result = crayfish2_schema.jsonify(crayfish)
-    return result
+    return json_response(survey_record(Crayfish2, crayfish_id))
 
 
 @main_bp.patch('/crayfish1/<code>')
@@ -709,16 +1034,16 @@ def crayfish1_update(code):
     ).scalar_one_or_none()
     # Get the updated details from the json sent in the HTTP patch request
     crayfish_json = request.get_json()
-    # Use Marshmallow to update the existing records with the changes in the json
-    crayfish1_schema.load(crayfish_json, instance=existing_crayfish, partial=True)
+    # Use Marshmallow to check the changes in the json and update the existing record with them
+    try:
+        crayfish1_schema.load(crayfish_json, instance=existing_crayfish, partial=True)
+    except ValidationError as e:
+        db.session.rollback()
+        return json_response({"message": "The record is not valid.", "errors": e.messages}, 400)
     # Commit the changes to the database
     db.session.commit()
     # Return json showing the updated record
-    updated_region = db.session.execute(
-        db.select(Crayfish1).filter_by(id=code)
-    ).scalar_one_or_none()
-    result = crayfish1_schema.jsonify(updated_region)
-    return result
+    return json_response(survey_record(Crayfish1, code))
 
 
 @main_bp.patch('/crayfish2/<code>')
@@ -738,16 +1063,16 @@ def crayfish2_update(code):
     ).scalar_one_or_none()
     # Get the updated details from the json sent in the HTTP patch request
     crayfish_json = request.get_json()
-    # Use Marshmallow to update the existing records with the changes in the json
-    crayfish2_schema.load(crayfish_json, instance=existing_crayfish, partial=True)
+    # Use Marshmallow to check the changes in the json and update the existing record with them
+    try:
+        crayfish2_schema.load(crayfish_json, instance=existing_crayfish, partial=True)
+    except ValidationError as e:
+        db.session.rollback()
+        return json_response({"message": "The record is not valid.", "errors": e.messages}, 400)
     # Commit the changes to the database
     db.session.commit()
     # Return json showing the updated record
-    updated_region = db.session.execute(
-        db.select(Crayfish2).filter_by(id=code)
-    ).scalar_one_or_none()
-    result = crayfish2_schema.jsonify(updated_region)
-    return result
+    return json_response(survey_record(Crayfish2, code))
 
 
 @main_bp.route('/crayfish1/download')
@@ -763,13 +1088,11 @@ def post1():
     si = StringIO()
     # Creating a new csv instance
     cw = csv.writer(si)
-    # Get the data from the crayfish1 table
-    crayfish_list = Crayfish1.query.all()
+    # Get the data from the crayfish1 table, as plain rows without making a Crayfish1 object for each
+    rows = db.session.execute(db.select(*survey_columns(Crayfish1)).order_by(Crayfish1.id))
     cw.writerow(["id", "site", "method", "gender", "length (mm)"])
     # Add the data to the csv file
-    for crayfish in crayfish_list:
-        crayfish_ls = [crayfish.id, crayfish.site, crayfish.method, crayfish.gender, crayfish.length]
-        cw.writerow(crayfish_ls)
+    cw.writerows(rows)
     output = make_response(si.getvalue())
     # Name the file
     output.headers["Content-Disposition"] = "attachment; filename=database1.csv"
@@ -790,13 +1113,11 @@ def post2():
     si = StringIO()
     # Creating a new csv instance
     cw = csv.writer(si)
-    # Get the data from the crayfish2 table
-    crayfish_list = Crayfish2.query.all()
+    # Get the data from the crayfish2 table, as plain rows without making a Crayfish2 object for each
+    rows = db.session.execute(db.select(*survey_columns(Crayfish2)).order_by(Crayfish2.id))
     cw.writerow(["id", "site", "gender", "length (mm)", "weight (g)"])
     # Add the data to the csv file
-    for crayfish in crayfish_list:
-        crayfish_ls = [crayfish.id, crayfish.site, crayfish.gender, crayfish.length, crayfish.weight]
-        cw.writerow(crayfish_ls)
+    cw.writerows(rows)
     # Name the file
     output = make_response(si.getvalue())
     output.headers["Content-Disposition"] = "attachment; filename=database2.csv"
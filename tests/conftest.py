@@ -1,3 +1,5 @@
+import os
+import shutil
 import pytest
 import config
 from crayfish_analysis_app import create_app
@@ -7,11 +9,30 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver import Chrome
 import subprocess
 import socket
+from contextlib import contextmanager
+from sqlalchemy import event
 
 
 @pytest.fixture(scope="session")
-def app():
-    """Create a Flask app configured for testing"""
+def test_database(tmp_path_factory):
+    """
+    Copies data/database.db for the tests to write to, and points TestingConfig at the copy through
+    TEST_DATABASE_URI, which the live server started for the Selenium tests also gets
+    """
+    database = tmp_path_factory.mktemp("data").joinpath("database.db")
+    shutil.copy(config.basedir.joinpath("data", "database.db"), database)
+    uri = "sqlite:///" + str(database)
+    real_uri = config.TestingConfig.SQLALCHEMY_DATABASE_URI
+    os.environ["TEST_DATABASE_URI"] = uri
+    config.TestingConfig.SQLALCHEMY_DATABASE_URI = uri
+    yield uri
+    os.environ.pop("TEST_DATABASE_URI", None)
+    config.TestingConfig.SQLALCHEMY_DATABASE_URI = real_uri
+
+
+@pytest.fixture(scope="session")
+def app(test_database):
+    """Create a Flask app configured for testing, using a copy of the database"""
     app = create_app(config.TestingConfig)
     yield app
 
@@ -64,6 +85,28 @@ def create_record_crayfish1():
         db.session.commit()
 
 
+@pytest.fixture(scope="function")
+def count_queries(app):
+    """Counts the SQL statements run inside a with block, to catch a page loading rows one at a time"""
+
+    @contextmanager
+    def counter():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    return counter
+
+
 # Used for Selenium tests
 @pytest.fixture(scope="class")
 def chrome_driver():
@@ -92,7 +135,7 @@ def flask_port():
 
 
 @pytest.fixture(scope="module")
-def run_app_win(flask_port):
+def run_app_win(flask_port, test_database):
     """Runs the Flask app for live server testing on Windows"""
     server = subprocess.Popen(
         [
@@ -359,9 +359,13 @@ def test_011_comment(chrome_driver, run_app_win, flask_port, test_client, create
         EC.presence_of_element_located((By.XPATH, '//*[@id="posts"]/div/div[2]/p/a/small'))
     )
     view_comment.click()
-    source = chrome_driver.page_source
+    # The comments are fetched when they are first shown
+    loaded = WebDriverWait(chrome_driver, 10).until(
+        EC.text_to_be_present_in_element((By.XPATH, '//*[@id="posts"]/div/div[2]/div[2]'),
+                                         'This is a new comment that I made.')
+    )
 
-    assert 'This is a new comment that I made.' in source
+    assert loaded
 
 
 def test_012_crayfish1_page_title(chrome_driver, run_app_win, flask_port):
@@ -602,23 +606,15 @@ def test_017_database_1_delete_record(chrome_driver, run_app_win, flask_port, te
     )
     login_button.click()
 
-    database_1 = WebDriverWait(chrome_driver, 10).until(
+    WebDriverWait(chrome_driver, 10).until(
         EC.presence_of_element_located((By.XPATH, '//*[@id="navbar"]/div/a[5]'))
     )
-    database_1.click()
-
-    chrome_driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-
-    target = db.session.execute(
-        db.select(Crayfish1).filter_by(site="Test_site")
-    ).scalar()
-
-    # Ensure the driver has scrolled to the bottom and the delete button is visible and clickable
-    time.sleep(5)
+    # The page only shows 100 records at a time, so go to the page with just the test record
+    chrome_driver.get(f"http://localhost:{flask_port}/crayfish1?site=Test_site")
 
     delete = WebDriverWait(chrome_driver, 10).until(
         EC.presence_of_element_located(
-            (By.XPATH, f'/html/body/div/div/div/div/div/ul/li[{target.id}]/div[2]/form/button'))
+            (By.XPATH, '/html/body/div/div/div/div/div/ul/li[1]/div[2]/form/button'))
     )
     delete.click()
 
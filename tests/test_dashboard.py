@@ -0,0 +1,336 @@
+from pathlib import Path
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import config
+from crayfish_analysis_app import create_app
+from crayfish_analysis_app.helper_functions import read_excel_multi_index
+from crayfish_analysis_app.dash_app.snapshot import read_excel_snapshot
+from crayfish_analysis_app.dash_app.dataset import CrayfishDataset, ChangeJournal, compact_survey
+from crayfish_analysis_app.dash_app.app import num_m_f, mean_stats, method_stats, count_crayfish, distribution_chart
+from crayfish_analysis_app.dash_app.distribution import mean_and_sd, kernel_density, site_sex_moments
+from crayfish_analysis_app.dash_app.range_index import count_by_site, MergeSortTree, RangeCountIndex
+from crayfish_analysis_app.dash_app.figure_cache import FigureCache
+
+excel = Path(__file__).parents[1].joinpath("data/prepared_datasets.xlsx")
+
+
+def test_043_snapshot_matches_workbook(tmp_path):
+    """
+    GIVEN the prepared Excel workbook
+    WHEN it is read through the snapshot twice
+    THEN one snapshot should be written
+        and both reads should give the same dataframes as parsing the workbook
+    """
+    df1, df2 = read_excel_multi_index(excel)
+
+    first = read_excel_snapshot(excel, tmp_path)
+    second = read_excel_snapshot(excel, tmp_path)
+
+    assert len(list(tmp_path.glob("*.npz"))) == 1
+    for snapshot in (first, second):
+        pd.testing.assert_frame_equal(snapshot[0], df1)
+        pd.testing.assert_frame_equal(snapshot[1], df2)
+
+
+def test_044_snapshot_rebuilt_when_workbook_changes(tmp_path):
+    """
+    GIVEN a snapshot of the workbook
+    WHEN the workbook contents change
+    THEN the old snapshot should be replaced by a new one
+    """
+    workbook = tmp_path.joinpath("prepared_datasets.xlsx")
+    shutil.copy(excel, workbook)
+    snapshot_dir = tmp_path.joinpath("snapshots")
+    read_excel_snapshot(workbook, snapshot_dir)
+    old_snapshot = list(snapshot_dir.glob("*.npz"))
+
+    shutil.copy(excel.parent.joinpath("data_preparation/prepared_datasets.xlsx"), workbook)
+    read_excel_snapshot(workbook, snapshot_dir)
+    new_snapshot = list(snapshot_dir.glob("*.npz"))
+
+    assert len(new_snapshot) == 1
+    assert new_snapshot != old_snapshot
+
+
+def test_045_dataset_loads_lazily(app, tmp_path):
+    """
+    GIVEN a dataset that has not been used
+    WHEN it is warmed in the background
+    THEN it should only be ready once the thread finishes
+        and give the sites and default filter values from the workbook
+    """
+    dataset = CrayfishDataset(app, "excel", excel, tmp_path)
+    assert dataset.ready is False
+
+    dataset.warm().join()
+    data = dataset.load()
+
+    assert dataset.ready is True
+    assert data.site_list == ['DGB2016', 'CON2016', 'DGB2017', 'PAD2017']
+    assert data.length_minimum < data.length_maximum
+    assert dataset.load() is data
+
+
+def test_046_dataset_applies_database_writes(app, test_client):
+    """
+    GIVEN the dashboard dataset is loaded from the database
+    WHEN a crayfish2 record is added, changed and deleted through the REST routes
+    THEN the dataset should pick up each change with a new data version
+    """
+    dataset = app.extensions["crayfish_dataset"]
+    before = dataset.load()
+
+    response = test_client.post("/crayfish2", json={"site": "Test_site", "gender": "F", "length": 40, "weight": 20})
+    new_id = response.json["id"]
+    added = dataset.load()
+
+    test_client.patch(f"/crayfish2/{new_id}", json={"length": 41})
+    changed = dataset.load()
+
+    test_client.delete(f"/crayfish2/{new_id}")
+    deleted = dataset.load()
+
+    assert before.version < added.version < changed.version < deleted.version
+    assert "Test_site" in added.site_list
+    assert added.survey2.loc[new_id, "length"] == 40
+    assert changed.survey2.loc[new_id, "length"] == 41
+    assert "Test_site" not in deleted.site_list
+    assert len(deleted.survey2) == len(before.survey2)
+
+
+def test_047_survey_rows_are_compact(app, tmp_path):
+    """
+    GIVEN the workbook loaded as one row per crayfish
+    WHEN the pie chart and bar chart helpers are used on it
+    THEN the text columns should be categories and the measurements float32
+        and the helpers should give the same numbers as the original multi-index sheets
+    """
+    data = CrayfishDataset(app, "excel", excel, tmp_path).load()
+
+    assert str(data.survey1["site"].dtype) == "category"
+    assert str(data.survey2["gender"].dtype) == "category"
+    assert str(data.survey2["weight"].dtype) == "float32"
+    assert num_m_f(data.survey1, 'DGB2016') == (610, 434)
+    assert mean_stats(data.survey1, 'DGB2016') == (21.21, 22.36)
+    assert method_stats(data.survey1, 'DGB2016') == ([469, 353, 222], [20.45, 16.41, 32.71])
+    assert count_crayfish(data.survey2, 'PAD2017', 0, 1000, 0, 30, ['M', 'F']) == 593
+
+
+def test_048_count_by_site_matches_count_crayfish(app, tmp_path):
+    """
+    GIVEN the bar chart filters
+    WHEN every site is counted in one pass
+    THEN each count should be the same as counting the site on its own
+        and a site with no data should count as 0
+    """
+    data = CrayfishDataset(app, "excel", excel, tmp_path).load()
+    site_list = data.site_list + ['No_site']
+
+    for filters in [(0, 1000, 0, 1000, ['M', 'F']), (30, 40, 10.5, 20, ['F']), (25, 25, 0, 1000, ['M'])]:
+        expected = [count_crayfish(data.survey2, site, *filters) for site in site_list]
+        assert count_by_site(data.survey2, site_list, *filters) == expected
+    assert count_by_site(data.survey2, site_list, 0, 1000, 0, 1000, ['M', 'F'])[-1] == 0
+
+
+def test_049_merge_sort_tree_counts_rectangle():
+    """
+    GIVEN a merge sort tree over random lengths and weights
+    WHEN it is asked how many crayfish are inside a length x weight rectangle
+    THEN it should give the same count as checking every crayfish, including on the edges
+    """
+    rng = np.random.default_rng(0)
+    length = rng.integers(10, 60, 1000).astype(np.float32)
+    weight = (rng.integers(0, 300, 1000) / 10).astype(np.float32)
+    tree = MergeSortTree(length, weight)
+
+    for _ in range(200):
+        length_min, length_max = sorted(rng.choice(length, 2))
+        weight_min, weight_max = sorted(rng.choice(weight, 2))
+        expected = np.count_nonzero((length >= length_min) & (length <= length_max) &
+                                    (weight >= weight_min) & (weight <= weight_max))
+        assert tree.count(length_min, length_max, weight_min, weight_max) == expected
+    assert tree.count(40, 30, 0, 100) == 0
+
+
+def test_050_range_index_keeps_untouched_trees(app, test_client):
+    """
+    GIVEN the bar chart trees have been built
+    WHEN a female crayfish is added to one site
+    THEN only the tree for the females at that site should be rebuilt
+        and the counts should include the new crayfish
+    """
+    dataset = app.extensions["crayfish_dataset"]
+    before = dataset.load()
+    trees = {(site, sex): before.range_index.tree(site, sex) for site in before.site_list for sex in "MF"}
+
+    response = test_client.post("/crayfish2", json={"site": "DGB2016", "gender": "F", "length": 40, "weight": 20})
+    after = dataset.load()
+    test_client.delete(f"/crayfish2/{response.json['id']}")
+
+    for (site, sex), tree in trees.items():
+        assert (after.range_index.tree(site, sex) is tree) == ((site, sex) != ("DGB2016", "F"))
+    assert len(after.range_index.tree("DGB2016", "F")) == len(trees["DGB2016", "F"]) + 1
+
+
+def test_051_figure_cache_reuses_figures():
+    """
+    GIVEN a figure cache with room for two figures
+    WHEN figures are asked for again, a third figure is added and the data version changes
+    THEN a cached figure should not be built again
+        the least recently used figure should be dropped
+        and every figure should be built again for the new data version
+    """
+    cache = FigureCache(2)
+    built = []
+
+    def build(name):
+        built.append(name)
+        return go.Figure(go.Bar(x=[name], y=[1]))
+
+    first = cache.get_or_build(1, ('bar', 'a'), lambda: build('a'))
+    again = cache.get_or_build(1, ('bar', 'a'), lambda: build('a'))
+    cache.get_or_build(1, ('bar', 'b'), lambda: build('b'))
+    cache.get_or_build(1, ('bar', 'a'), lambda: build('a'))
+    cache.get_or_build(1, ('bar', 'c'), lambda: build('c'))
+    cache.get_or_build(1, ('bar', 'b'), lambda: build('b'))
+    cache.get_or_build(2, ('bar', 'a'), lambda: build('a'))
+
+    assert built == ['a', 'b', 'c', 'b', 'a']
+    assert again['data'][0]['x'] == list(first.data[0].x)
+    assert cache.stats() == {"hits": 2, "misses": 5, "entries": 1}
+
+
+def test_052_distribution_curves_are_deterministic(app, tmp_path):
+    """
+    GIVEN the survey data
+    WHEN the distribution curves are drawn from the per site and sex sums
+    THEN the mean and sd should be the same as from the rows
+        the same inputs should always give the same curves on the shared grid
+        and the kernel density should add up to about 1
+    """
+    data = CrayfishDataset(app, "excel", excel, tmp_path).load()
+    values = data.survey2.loc[(data.survey2['site'] == 'CON2016') & (data.survey2['gender'] == 'F'), 'weight']
+
+    mean, sd = mean_and_sd(data.moments, 'CON2016', ['F'], 'weight')
+    first = distribution_chart(data, data.site_list, ['M', 'F'], 'Weight (g)')
+    second = distribution_chart(data, data.site_list, ['M', 'F'], 'Weight (g)')
+    grid = data.grids['weight']
+    density = kernel_density(values.to_numpy(), grid)
+
+    assert np.isclose(mean, values.astype(float).mean())
+    assert np.isclose(sd, values.astype(float).std())
+    assert first.to_json() == second.to_json()
+    assert all(list(trace.x) == list(grid) for trace in first.data)
+    assert np.isclose(density.sum() * (grid[1] - grid[0]), 1, atol=0.01)
+
+
+def test_053_site_summaries_follow_database_writes(app, test_client):
+    """
+    GIVEN the pie chart site summaries
+    WHEN a crayfish1 record is added, moved to another method and deleted through the REST routes
+    THEN each summary should give the same numbers as working them out from the rows
+        and the sites that were not written to should keep their summaries
+    """
+    dataset = app.extensions["crayfish_dataset"]
+    before = dataset.load()
+
+    response = test_client.post("/crayfish1", json={"site": "CON2016", "method": "Trapping", "gender": "M",
+                                                    "length": 30})
+    new_id = response.json["id"]
+    added = dataset.load()
+    test_client.patch(f"/crayfish1/{new_id}", json={"method": "Drawdown"})
+    changed = dataset.load()
+    test_client.delete(f"/crayfish1/{new_id}")
+    deleted = dataset.load()
+
+    for data in (before, added, changed, deleted):
+        for site in data.site_list:
+            summary = data.site_summaries[site]
+            assert summary.num_m_f == num_m_f(data.survey1, site)
+            assert summary.mean_stats == mean_stats(data.survey1, site)
+            assert summary.method_stats == method_stats(data.survey1, site)
+    assert added.site_summaries['CON2016'].num_m_f[1] == before.site_summaries['CON2016'].num_m_f[1] + 1
+    assert added.site_summaries['DGB2016'] is before.site_summaries['DGB2016']
+
+
+def test_076_dashboard_warms_after_the_tables_are_created(tmp_path):
+    """
+    GIVEN a new, empty database and the dashboard set to warm on start
+    WHEN the app is created
+    THEN the dashboard data should be loaded from the tables create_app has just made
+    """
+    class WarmConfig(config.TestingConfig):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + str(tmp_path.joinpath("new.db"))
+        SQLALCHEMY_ECHO = False
+        DASHBOARD_WARM_ON_START = True
+
+    app = create_app(WarmConfig)
+    for thread in threading.enumerate():
+        if thread.name == "crayfish-dataset-warm":
+            thread.join()
+
+    assert app.extensions["crayfish_dataset"].ready is True
+
+
+def test_077_change_journal_knows_when_it_dropped_rows():
+    """
+    GIVEN a change journal with room for three rows
+    WHEN one commit writes five rows and the next commit writes one
+    THEN the changes since before the big commit should no longer be known, so the tables are read again
+        and the changes since the big commit should still be known
+    """
+    journal = ChangeJournal(max_entries=3)
+
+    journal.record({("crayfish1", row_id) for row_id in range(1, 6)})
+    journal.record({("crayfish2", 7)})
+
+    assert journal.changes_since(0) == (None, 2)
+    assert journal.changes_since(1) == ({"crayfish1": set(), "crayfish2": {7}}, 2)
+
+
+def test_078_range_index_only_builds_trees_when_quicker(app, tmp_path):
+    """
+    GIVEN the workbook's crayfish2 rows, and the same four sites with 20 times as many crayfish
+    WHEN the bar chart counts are asked of the range index
+    THEN the workbook rows should be scanned without building any trees
+        the larger rows should be counted from the trees
+        and both should give the same counts as the scan
+    """
+    data = CrayfishDataset(app, "excel", excel, tmp_path).load()
+    rng = np.random.default_rng(0)
+    larger = compact_survey(pd.DataFrame({
+        "site": np.repeat(data.site_list, 20000),
+        "gender": rng.choice(["M", "F"], 80000),
+        "length": rng.normal(35, 8, 80000).clip(5),
+        "weight": rng.normal(15, 6, 80000).clip(1),
+    }))
+    filters = (30, 40, 10.5, 20, ['M', 'F'])
+
+    for survey2, uses_trees in ((data.survey2, False), (larger, True)):
+        index = RangeCountIndex(survey2)
+        assert index.count_by_site(data.site_list, *filters) == count_by_site(survey2, data.site_list, *filters)
+        assert bool(index._trees) == uses_trees
+
+
+def test_079_moments_skip_missing_measurements():
+    """
+    GIVEN crayfish2 rows where one crayfish has a length but no weight
+    WHEN the mean and sd are worked out from the per site and sex sums
+    THEN the weight should only count the crayfish that were weighed
+        and the length should count every crayfish
+    """
+    survey2 = compact_survey(pd.DataFrame({
+        "site": ["DGB2016"] * 4,
+        "gender": ["F"] * 4,
+        "length": [30.0, 32.0, 34.0, 36.0],
+        "weight": [10.0, 12.0, 14.0, np.nan],
+    }))
+
+    moments = site_sex_moments(survey2)
+
+    assert np.allclose(mean_and_sd(moments, "DGB2016", ["F"], "weight"), (12, 2))
+    assert np.allclose(mean_and_sd(moments, "DGB2016", ["F"], "length"),
+                       (33, np.std([30, 32, 34, 36], ddof=1)))
@@ -1,5 +1,17 @@
-from crayfish_analysis_app.models import db, User, Post
+import gzip
+import re
+import sqlite3
+import sys
+import threading
+import time
+import config
+from crayfish_analysis_app import create_app
+from crayfish_analysis_app.models import db, User, Post, Like, Comment, Crayfish1, Crayfish2, liked_post_ids
+from crayfish_analysis_app.pagination import paginate_by_date
+from crayfish_analysis_app.live import LocalBroker, DatabaseBroker
+from crayfish_analysis_app.like_buffer import LikeBuffer
 from flask import get_flashed_messages
+from sqlalchemy import event
 from werkzeug.security import check_password_hash, generate_password_hash
 import datetime
 
@@ -473,3 +485,745 @@ def test_042_change_password_new_password_not_same(test_client, create_user):
     text = get_flashed_messages()[1]
 
     assert text == 'New passwords don\'t match!'
+
+
+def test_054_responses_are_compressed(test_client):
+    """
+    GIVEN the crayfish1 download and a small JSON response
+    WHEN they are requested by a client that accepts gzip
+    THEN the download should be gzipped and give the same CSV once decompressed
+        and the small response should be sent as it is
+    """
+    plain = test_client.get("/crayfish1/download")
+    response = test_client.get("/crayfish1/download", headers={"Accept-Encoding": "gzip"})
+    small = test_client.get("/crayfish1/1", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in plain.headers
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert gzip.decompress(response.data) == plain.data
+    assert len(response.data) < len(plain.data) / 2
+    assert "Content-Encoding" not in small.headers
+
+
+def test_055_forum_pages(app, test_client, create_user):
+    """
+    GIVEN more posts than fit on one forum page
+    WHEN the user follows the older and newer links
+    THEN each page should show the next posts, newest first, without repeating any
+        and going back to the newer page should show the first page again
+    """
+    user = db.session.execute(db.select(User).filter_by(username="IamTest")).scalar()
+    db.session.execute(db.delete(Post))
+    posts = [Post(text=f"Paged post {i}", author=user.id, date_created=datetime.date(2023, 4, 1 + i // 2))
+             for i in range(5)]
+    db.session.add_all(posts)
+    db.session.commit()
+    app.config["FORUM_PAGE_SIZE"] = 2
+
+    try:
+        first = paginate_by_date(db.select(Post), Post, 2)
+        second = paginate_by_date(db.select(Post), Post, 2, before=first.older)
+        last = paginate_by_date(db.select(Post), Post, 2, before=second.older)
+        back = paginate_by_date(db.select(Post), Post, 2, after=second.newer)
+        response = test_client.get(f"/forum?before={first.older}")
+        user_page = test_client.get(f"/posts/IamTest?before={first.older}")
+    finally:
+        app.config["FORUM_PAGE_SIZE"] = 20
+
+    pages = [[post.text for post in page] for page in (first, second, last)]
+    assert pages == [["Paged post 4", "Paged post 3"], ["Paged post 2", "Paged post 1"], ["Paged post 0"]]
+    assert first.newer is None and last.older is None
+    assert [post.id for post in back] == [post.id for post in first]
+    assert b"Paged post 2" in response.data and b"Paged post 4" not in response.data
+    assert b"Older posts" in response.data and b"Newer posts" in response.data
+    assert b"Paged post 1" in user_page.data
+
+
+def test_056_forum_page_query_count(test_client, create_user, count_queries):
+    """
+    GIVEN forum posts with likes and comments
+    WHEN a logged-in user opens the forum with 2 posts and again with 12 posts
+    THEN the same number of SQL statements should be run for both
+        and it should be only a handful
+    """
+    test_client.post("/login", data={"email": "testingsample@test.com", "password": "123456"})
+    user = db.session.execute(db.select(User).filter_by(username="IamTest")).scalar()
+    db.session.execute(db.delete(Post))
+    db.session.commit()
+
+    counts = []
+    for num_posts in (2, 12):
+        for i in range(num_posts - len(db.session.execute(db.select(Post)).all())):
+            post = Post(text=f"Counted post {i}", author=user.id)
+            db.session.add(post)
+            db.session.flush()
+            db.session.add_all([Like(author=user.id, post_id=post.id),
+                                Comment(text="A comment", author=user.id, post_id=post.id)])
+        db.session.commit()
+        with count_queries() as statements:
+            response = test_client.get("/forum")
+        assert response.data.count(b"Counted post") == num_posts
+        counts.append(len(statements))
+
+    assert counts[0] == counts[1]
+    assert counts[1] <= 6
+
+
+def test_057_post_counts_follow_likes_and_comments(app, test_client, create_user):
+    """
+    GIVEN a post by the logged-in user
+    WHEN the post is liked, commented on, unliked and the comment deleted
+    THEN the like and comment counts on the post should follow each change
+        and the reconcile command should leave them as they are
+    """
+    test_client.post("/login", data={"email": "testingsample@test.com", "password": "123456"})
+    user = db.session.execute(db.select(User).filter_by(username="IamTest")).scalar()
+    post = Post(text="Counted", author=user.id)
+    db.session.add(post)
+    db.session.commit()
+
+    def counts():
+        db.session.expire_all()
+        return post.like_count, post.comment_count
+
+    test_client.get(f"/like-post/{post.id}")
+    test_client.post(f"/create-comment/{post.id}", data={"text": "Nice"})
+    after_adding = counts()
+    comment = db.session.execute(db.select(Comment).filter_by(post_id=post.id)).scalar()
+    test_client.get(f"/like-post/{post.id}")
+    test_client.get(f"/delete-comment/{comment.id}")
+    after_removing = counts()
+    result = app.test_cli_runner().invoke(args=["reconcile-post-counts"])
+
+    assert after_adding == (1, 1)
+    assert after_removing == (0, 0)
+    assert result.exit_code == 0
+    assert counts() == (0, 0)
+
+
+def test_058_upgrade_adds_post_counts(tmp_path):
+    """
+    GIVEN a database made before posts had like and comment counts
+    WHEN the app starts with it
+    THEN the columns should be added and filled in from the likes and comments already there
+        the duplicate like should be removed before the unique like index is added
+        and the indexes on the existing tables should be added
+    """
+    database = tmp_path.joinpath("old.db")
+    connection = sqlite3.connect(database)
+    connection.executescript("""
+        CREATE TABLE user (id INTEGER PRIMARY KEY, date_created DATE, username VARCHAR(150) NOT NULL,
+                           email VARCHAR(150) NOT NULL, password VARCHAR(150) NOT NULL);
+        CREATE TABLE post (id INTEGER PRIMARY KEY, date_created DATE, text TEXT NOT NULL, author INTEGER NOT NULL);
+        CREATE TABLE "like" (id INTEGER PRIMARY KEY, date_created DATE, author INTEGER NOT NULL,
+                             post_id INTEGER NOT NULL);
+        INSERT INTO user VALUES (1, NULL, 'old', 'old@test.com', 'x');
+        INSERT INTO post VALUES (1, NULL, 'Old post', 1), (2, NULL, 'Other post', 1);
+        INSERT INTO "like" VALUES (1, NULL, 1, 1), (2, NULL, 1, 1);
+    """)
+    connection.close()
+
+    class OldDatabaseConfig(config.TestingConfig):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + str(database)
+
+    create_app(OldDatabaseConfig)
+
+    connection = sqlite3.connect(database)
+    counts = connection.execute("SELECT id, like_count, comment_count FROM post ORDER BY id").fetchall()
+    likes = connection.execute('SELECT id FROM "like"').fetchall()
+    indexes = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")]
+    connection.close()
+    assert counts == [(1, 1, 0), (2, 0, 0)]
+    assert likes == [(1,)]
+    assert {"ix_like_author_post_id", "ix_like_post_id", "ix_post_author", "ix_post_date_created_id"} <= set(indexes)
+
+
+def test_059_like_post_json(test_client, create_user):
+    """
+    GIVEN a post and a logged-in user
+    WHEN the user likes it twice and likes a post that does not exist through the JSON endpoint
+    THEN the first like should give a count of 1, the second should take it back to 0
+        and the missing post should give a 404
+    """
+    test_client.post("/login", data={"email": "testingsample@test.com", "password": "123456"})
+    user = db.session.execute(db.select(User).filter_by(username="IamTest")).scalar()
+    post = Post(text="Liked by JSON", author=user.id)
+    db.session.add(post)
+    db.session.commit()
+
+    liked = test_client.post(f"/like-post/{post.id}")
+    unliked = test_client.post(f"/like-post/{post.id}")
+    missing = test_client.post("/like-post/999999")
+
+    assert liked.json == {"post_id": post.id, "liked": True, "like_count": 1}
+    assert unliked.json == {"post_id": post.id, "liked": False, "like_count": 0}
+    assert missing.status_code == 404
+    assert db.session.execute(db.select(Like).filter_by(post_id=999999)).scalar() is None
+
+
+def test_060_post_cards_are_cached(app, test_client, create_user):
+    """
+    GIVEN a forum page that has been viewed once
+    WHEN it is viewed again, and again after one of its posts is liked
+    THEN the second view should use the cached cards
+        and only the liked post should be rendered again, with its new count
+    """
+    test_client.post("/login", data={"email": "testingsample@test.com", "password": "123456"})
+    user = db.session.execute(db.select(User).filter_by(username="IamTest")).scalar()
+    db.session.execute(db.delete(Post))
+    db.session.execute(db.delete(Like))
+    posts = [Post(text=f"Cached post {i}", author=user.id) for i in range(3)]
+    db.session.add_all(posts)
+    db.session.commit()
+    cache = app.extensions["post_card_cache"]
+    # Show the login message first, so it is not on the pages that are compared
+    test_client.get("/home")
+    cache.clear()
+
+    first = test_client.get("/forum")
+    before = cache.stats()
+    second = test_client.get("/forum")
+    after_second = cache.stats()
+    test_client.post(f"/like-post/{posts[0].id}")
+    third = test_client.get("/forum")
+    after_like = cache.stats()
+
+    assert first.data == second.data
+    assert after_second["hits"] - before["hits"] == 3
+    assert after_like["misses"] - after_second["misses"] == 1
+    assert f'<span id="like-count-{posts[0].id}">1</span>'.encode() in third.data
+
+
+def test_061_forum_search(app, test_client, create_user):
+    """
+    GIVEN posts and comments in the forum
+    WHEN the user searches for a word
+    THEN the posts with the word in their text or in a comment should be found, best match first
+        a deleted post should not be found
+        and the results should be split into pages
+    """
+    test_client.post("/login", data={"email": "testingsample@test.com", "password": "123456"})
+    test_client.post("/create-post", data={"text": "Signal crayfish signal crayfish everywhere"})
+    test_client.post("/create-post", data={"text": "A post about the river"})
+    test_client.post("/create-post", data={"text": "Signal crayfish seen once"})
+    river = db.session.execute(db.select(Post).filter_by(text="A post about the river")).scalar()
+    test_client.post(f"/create-comment/{river.id}", data={"text": "I saw a signal crayfish here"})
+    deleted = Post(text="Signal crayfish in a deleted post", author=river.author)
+    db.session.add(deleted)
+    db.session.commit()
+    test_client.get(f"/delete-post/{deleted.id}")
+
+    response = test_client.get("/forum/search?q=signal+crayfish")
+    app.config["FORUM_PAGE_SIZE"] = 2
+    try:
+        first = test_client.get("/forum/search?q=signal+crayfish")
+        second = test_client.get("/forum/search?q=signal+crayfish&page=2")
+    finally:
+        app.config["FORUM_PAGE_SIZE"] = 20
+
+    found = [text for text in (b"everywhere", b"seen once", b"about the river") if text in response.data]
+    assert found == [b"everywhere", b"seen once", b"about the river"]
+    assert response.data.index(b"everywhere") < response.data.index(b"seen once")
+    assert b"deleted post" not in response.data
+    assert b"More results" in first.data and b"about the river" not in first.data
+    assert b"Previous results" in second.data and b"about the river" in second.data
+
+
+def test_062_forum_search_odd_queries(app, test_client):
+    """
+    GIVEN the forum search
+    WHEN it is given FTS5 syntax, no words or a bad page number
+    THEN it should show the search page without an error
+        and the rebuild command should fill the search table again
+    """
+    responses = [test_client.get(f"/forum/search?q={query}") for query in ('"AND(', "NEAR*", "", "crayfish&page=x")]
+    result = app.test_cli_runner().invoke(args=["rebuild-search-index"])
+
+    assert all(response.status_code == 200 for response in responses)
+    assert result.exit_code == 0
+    assert "Indexed" in result.output
+
+
+def test_063_liked_posts_on_page(test_client, create_user):
+    """
+    GIVEN a page of posts, one liked by the logged-in user and one liked only by someone else
+    WHEN the forum is shown
+    THEN only the post the user liked should be found by the liked posts lookup
+        and be shown with a filled in like icon
+    """
+    test_client.post("/login", data={"email": "testingsample@test.com", "password": "123456"})
+    user = db.session.execute(db.select(User).filter_by(username="IamTest")).scalar()
+    other = User(username="Liker", email="liker@test.com", password="x")
+    db.session.execute(db.delete(Post))
+    db.session.execute(db.delete(Like))
+    posts = [Post(text=f"Liked post {i}", author=user.id) for i in range(3)]
+    db.session.add_all(posts + [other])
+    db.session.flush()
+    db.session.add_all([Like(author=user.id, post_id=posts[0].id), Like(author=other.id, post_id=posts[1].id)])
+    db.session.commit()
+
+    liked = liked_post_ids(user, posts)
+    response = test_client.get("/forum")
+    db.session.execute(db.delete(Like))
+    db.session.delete(other)
+    db.session.commit()
+
+    assert liked == {posts[0].id}
+    assert response.data.count(b'class="fas fa-thumbs-up"') == 1
+    assert response.data.count(b'class="far fa-thumbs-up"') == 2
+
+
+def make_account_with_activity():
+    """
+    Gives IamTest a post that another user has liked and commented on, and has IamTest like and comment
+    on a post of the other user
+    Returns:
+        user (User): IamTest
+        other_post (Post): The post of the other user
+    """
+    user = db.session.execute(db.select(User).filter_by(username="IamTest")).scalar()
+    other = db.session.execute(db.select(User).filter_by(username="Other")).scalar()
+    if not other:
+        other = User(username="Other", email="other@test.com", password="x")
+        db.session.add(other)
+        db.session.flush()
+    own_post = Post(text="Post to be deleted", author=user.id, like_count=1, comment_count=1)
+    other_post = Post(text="Post that stays", author=other.id, like_count=1, comment_count=1)
+    db.session.add_all([own_post, other_post])
+    db.session.flush()
+    db.session.add_all([Like(author=other.id, post_id=own_post.id),
+                        Comment(text="Hi", author=other.id, post_id=own_post.id),
+                        Like(author=user.id, post_id=other_post.id),
+                        Comment(text="Yo", author=user.id, post_id=other_post.id)])
+    db.session.commit()
+    return user, other_post
+
+
+def test_064_delete_account_cascades(test_client, create_user):
+    """
+    GIVEN a user who has a post, and has liked and commented on another user's post
+    WHEN the user deletes their account
+    THEN the database should delete their post, likes and comments, and the likes and comments on their post
+        and the other post should be left with no likes or comments
+    """
+    test_client.post("/login", data={"email": "testingsample@test.com", "password": "123456"})
+    user, other_post = make_account_with_activity()
+    user_id, other_post_id = user.id, other_post.id
+    foreign_keys = db.session.execute(db.text("PRAGMA foreign_keys")).scalar()
+
+    response = test_client.post(f"/delete-account/{user_id}")
+    db.session.expire_all()
+    other_post = db.session.get(Post, other_post_id)
+
+    assert response.status_code == 302
+    assert foreign_keys == 1
+    assert db.session.get(User, user_id) is None
+    assert db.session.execute(db.select(Post).filter_by(author=user_id)).first() is None
+    assert db.session.execute(db.select(Like).where(Like.post_id.not_in(db.select(Post.id)))).first() is None
+    assert db.session.execute(db.select(Comment).filter_by(author=user_id)).first() is None
+    assert (other_post.like_count, other_post.comment_count) == (0, 0)
+    assert other_post.likes == [] and other_post.comments == []
+
+
+def test_065_delete_large_account_in_background(app, test_client, create_user):
+    """
+    GIVEN a user whose account is larger than the background purge threshold
+    WHEN the user deletes their account
+    THEN the request should log them out straight away
+        and once the purge finishes the account and everything on it should be gone
+    """
+    test_client.post("/login", data={"email": "testingsample@test.com", "password": "123456"})
+    user, other_post = make_account_with_activity()
+    user_id, other_post_id = user.id, other_post.id
+    purger = app.extensions["account_purger"]
+    purger.threshold = 0
+
+    try:
+        response = test_client.post(f"/delete-account/{user_id}")
+        account_page = test_client.get("/account-management")
+        purger.wait()
+    finally:
+        purger.threshold = app.config["ACCOUNT_PURGE_THRESHOLD"]
+    db.session.expire_all()
+    other_post = db.session.get(Post, other_post_id)
+
+    assert response.status_code == 302
+    assert account_page.status_code == 302
+    assert db.session.get(User, user_id) is None
+    assert db.session.execute(db.select(Post).filter_by(author=user_id)).first() is None
+    assert (other_post.like_count, other_post.comment_count) == (0, 0)
+    assert other_post.likes == [] and other_post.comments == []
+
+
+def test_066_comments_loaded_on_demand(app, test_client, create_user):
+    """
+    GIVEN a post with more comments than fit on one page of comments
+    WHEN the forum is shown and the comments of the post are fetched a page at a time
+    THEN the forum page should not contain the comments
+        each page should give the next comments, oldest first, with a link to the next page
+        and a post that does not exist should give a 404
+    """
+    user = db.session.execute(db.select(User).filter_by(username="IamTest")).scalar()
+    post = Post(text="Post with many comments", author=user.id, comment_count=5)
+    db.session.add(post)
+    db.session.flush()
+    db.session.add_all([Comment(text=f"Lazy comment {i}", author=user.id, post_id=post.id) for i in range(5)])
+    db.session.commit()
+    app.config["COMMENT_PAGE_SIZE"] = 2
+
+    try:
+        forum = test_client.get("/forum")
+        pages = []
+        url = f"/posts/{post.id}/comments"
+        while url:
+            response = test_client.get(url)
+            pages.append(response)
+            more = re.search(rb'href="([^"]+)" class="more-comments"', response.data)
+            url = more.group(1).decode() if more else None
+        missing = test_client.get("/posts/999999/comments")
+    finally:
+        app.config["COMMENT_PAGE_SIZE"] = 20
+
+    assert b"Lazy comment" not in forum.data
+    assert f'data-comments-url="/posts/{post.id}/comments"'.encode() in forum.data
+    assert [re.findall(rb"Lazy comment (\d)", page.data) for page in pages] == [[b"0", b"1"], [b"2", b"3"], [b"4"]]
+    assert missing.status_code == 404
+
+
+def test_067_forum_events_stream(app, test_client, create_user):
+    """
+    GIVEN an open stream of forum events
+    WHEN a post is made, liked, commented on and deleted
+    THEN the stream should get each change in order
+        and a browser reconnecting with the id of the first event should be sent the events after it
+    """
+    test_client.post("/login", data={"email": "testingsample@test.com", "password": "123456"})
+    broker = app.extensions["forum_events"]
+    subscription = broker.subscribe()
+
+    try:
+        test_client.post("/create-post", data={"text": "Live post"})
+        post = db.session.execute(db.select(Post).filter_by(text="Live post")).scalar()
+        test_client.post(f"/like-post/{post.id}")
+        test_client.post(f"/create-comment/{post.id}", data={"text": "Live comment"})
+        test_client.get(f"/delete-post/{post.id}")
+        events = [subscription.get(0) for _ in range(4)]
+    finally:
+        broker.unsubscribe(subscription)
+    response = test_client.get("/forum/events", headers={"Last-Event-ID": str(events[0][0])})
+    chunks = response.response
+    replayed = [next(chunks) for _ in range(4)]
+    response.close()
+
+    assert [(kind, data) for _id, kind, data in events] == [
+        ("post", {"post_id": post.id}),
+        ("like", {"post_id": post.id, "like_count": 1}),
+        ("comment", {"post_id": post.id, "comment_count": 1}),
+        ("post_deleted", {"post_id": post.id}),
+    ]
+    assert response.mimetype == "text/event-stream"
+    assert replayed[0].startswith(b"retry:")
+    assert replayed[1] == f'id: {events[1][0]}\nevent: like\ndata: {{"post_id": {post.id}, "like_count": 1}}\n\n'.encode()
+    assert [chunk.split(b"\n")[1] for chunk in replayed[2:]] == [b"event: comment", b"event: post_deleted"]
+
+
+def test_068_database_broker_between_workers(app):
+    """
+    GIVEN two worker processes using the database broker
+    WHEN one of them publishes a forum event
+    THEN a stream open on the other should get it
+    """
+    with app.app_context():
+        publisher = DatabaseBroker(app)
+        reader = DatabaseBroker(app, poll_interval=0.05)
+        subscription = reader.subscribe()
+        try:
+            event_id = publisher.publish("like", {"post_id": 1, "like_count": 3})
+            event = subscription.get(5)
+        finally:
+            reader.close()
+
+    assert event == (event_id, "like", {"post_id": 1, "like_count": 3})
+
+
+def test_069_like_buffer(app, test_client, create_user):
+    """
+    GIVEN the like buffer is turned on
+    WHEN a post is liked and unliked and another post is liked, before the buffer is written
+    THEN the answers and the forum page should already show the likes
+        the like and unlike should cancel out
+        and writing the buffer should store just the one like with the right count
+    """
+    test_client.post("/login", data={"email": "testingsample@test.com", "password": "123456"})
+    user = db.session.execute(db.select(User).filter_by(username="IamTest")).scalar()
+    db.session.execute(db.delete(Post))
+    posts = [Post(text=f"Buffered post {i}", author=user.id) for i in range(2)]
+    db.session.add_all(posts)
+    db.session.commit()
+    like_buffer = LikeBuffer(app, window=60)
+    app.extensions["like_buffer"] = like_buffer
+
+    try:
+        answers = [test_client.post(f"/like-post/{post.id}").json for post in (posts[0], posts[0], posts[1])]
+        likes_before = db.session.execute(db.select(Like).where(Like.post_id.in_([p.id for p in posts]))).all()
+        forum = test_client.get("/forum")
+        written = like_buffer.flush()
+    finally:
+        app.extensions["like_buffer"] = None
+    db.session.expire_all()
+    likes_after = db.session.execute(db.select(Like.author, Like.post_id)
+                                     .where(Like.post_id.in_([p.id for p in posts]))).all()
+
+    assert [(answer["liked"], answer["like_count"]) for answer in answers] == [(True, 1), (False, 0), (True, 1)]
+    assert likes_before == []
+    assert f'<span id="like-count-{posts[1].id}">1</span>'.encode() in forum.data
+    assert forum.data.count(b'class="fas fa-thumbs-up"') == 1
+    assert written == 2
+    assert likes_after == [(user.id, posts[1].id)]
+    assert (posts[0].like_count, posts[1].like_count) == (0, 1)
+
+
+def test_070_survey_collection_pages(test_client):
+    """
+    GIVEN the crayfish2 records
+    WHEN they are paged through with filters and a sort, following the next links
+    THEN the pages together should hold exactly the matching records, in the sorted order
+        and the last page should have no next link
+    """
+    url = "/api/crayfish2?limit=50&sort=-weight&site=DGB2016,PAD2017&gender=F&length_min=30&weight_max=40"
+    rows = []
+    pages = 0
+    while url:
+        response = test_client.get(url)
+        rows += response.json["items"]
+        url = response.json["next_url"]
+        pages += 1
+
+    expected = db.session.execute(db.select(Crayfish2.id)
+                                  .where(Crayfish2.site.in_(["DGB2016", "PAD2017"]), Crayfish2.gender == "F",
+                                         Crayfish2.length >= 30, Crayfish2.weight <= 40)
+                                  .order_by(Crayfish2.weight.desc(), Crayfish2.id.desc())).scalars().all()
+    assert [row["id"] for row in rows] == expected
+    assert pages == (len(expected) + 49) // 50
+    assert set(rows[0]) == {"id", "site", "gender", "length", "weight"}
+
+
+def test_071_survey_collection_bad_arguments(test_client):
+    """
+    GIVEN the survey collections
+    WHEN they are asked for with arguments that cannot be used
+    THEN they should give a 400 with a message saying what is wrong
+    """
+    for url in ("/api/crayfish1?weight_min=3", "/api/crayfish1?limit=0", "/api/crayfish2?limit=ten",
+                "/api/crayfish2?sort=method", "/api/crayfish2?sort=length&after=12"):
+        response = test_client.get(url)
+        assert response.status_code == 400
+        assert response.json["message"]
+
+
+def test_072_survey_pages_are_paginated(app, test_client):
+    """
+    GIVEN more crayfish2 records than fit on one page
+    WHEN the crayfish2 page is shown and its next page links are followed
+    THEN each page should list at most a page of records
+        and the pages together should list every record once
+    """
+    app.config["SURVEY_PAGE_SIZE"] = 500
+    try:
+        url = "/crayfish2"
+        ids = []
+        sizes = []
+        while url:
+            response = test_client.get(url)
+            page_ids = re.findall(rb'action="/crayfish2delete/(\d+)"', response.data)
+            if not page_ids:
+                # The delete buttons are only shown when logged in
+                page_ids = re.findall(rb'<div>\s+(\d+) \w+ [MF] ', response.data)
+            ids += [int(i) for i in page_ids]
+            sizes.append(len(page_ids))
+            link = re.search(rb'href="([^"]+)" class="btn btn-outline-secondary">Next page', response.data)
+            url = link.group(1).decode().replace("&amp;", "&") if link else None
+    finally:
+        app.config["SURVEY_PAGE_SIZE"] = 100
+
+    expected = db.session.execute(db.select(Crayfish2.id).order_by(Crayfish2.id)).scalars().all()
+    assert max(sizes) == 500
+    assert ids == expected
+
+
+def test_073_survey_json_without_marshmallow(test_client):
+    """
+    GIVEN the survey tables
+    WHEN the records are read through the export and detail routes, and records are added and changed
+        with JSON that is and is not valid
+    THEN the export should give every record with its columns, the same as reading them through the ORM
+        and the JSON that is not valid should be turned away with a 400
+    """
+    exported = test_client.get("/api/crayfish1/export")
+    crayfish_list = db.session.execute(db.select(Crayfish1).order_by(Crayfish1.id)).scalars().all()
+    assert exported.mimetype == "application/json"
+    assert exported.json == [{"id": c.id, "site": c.site, "method": c.method, "gender": c.gender, "length": c.length}
+                             for c in crayfish_list]
+    assert len(test_client.get("/api/crayfish2/export").json) == db.session.query(Crayfish2).count()
+    assert test_client.get("/crayfish2/1").json == test_client.get("/api/crayfish2/export").json[0]
+    assert test_client.get("/crayfish2/999999").json == {}
+
+    missing = test_client.post("/crayfish2", json={"site": "Test_site", "length": "long"})
+    added = test_client.post("/crayfish2", json={"site": "Test_site", "gender": "F", "length": 40, "weight": 20})
+    not_a_number = test_client.patch(f"/crayfish2/{added.json['id']}", json={"weight": "heavy"})
+    changed = test_client.patch(f"/crayfish2/{added.json['id']}", json={"weight": 21})
+    test_client.delete(f"/crayfish2/{added.json['id']}")
+
+    assert missing.status_code == 400
+    assert set(missing.json["errors"]) == {"gender", "length", "weight"}
+    assert added.json == {"id": added.json["id"], "site": "Test_site", "gender": "F", "length": 40, "weight": 20}
+    assert not_a_number.status_code == 400
+    assert changed.json["weight"] == 21
+
+
+def test_074_local_broker_keeps_id_order():
+    """
+    GIVEN an open stream on the local broker
+    WHEN several threads publish forum events at once
+    THEN the history and the stream should have the events in id order
+        and a browser reconnecting part way through should be sent only the events after its id, in order
+    """
+    broker = LocalBroker(history=1000, queue_size=1000)
+    subscription = broker.subscribe()
+    start = threading.Barrier(8)
+
+    def publisher(num):
+        start.wait()
+        for i in range(50):
+            broker.publish("like", {"post_id": num, "like_count": i})
+
+    # Switch threads as often as possible, so the publishes overlap
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=publisher, args=(num,)) for num in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    queued = [subscription.get(0)[0] for _ in range(400)]
+    replayed = broker.subscribe(last_event_id=200)
+    replayed_ids = [replayed.get(0)[0] for _ in range(200)]
+
+    assert [event[0] for event in broker._history] == list(range(1, 401))
+    assert queued == list(range(1, 401))
+    assert replayed_ids == list(range(201, 401))
+
+
+def test_075_like_buffer_reads_outside_the_lock(app, test_client, create_user):
+    """
+    GIVEN the like buffer, and a like whose database read is held up by a busy database
+    WHEN another user likes the same post and the like count is read while it waits
+    THEN the other like and the like count should not wait for the held up read
+        and once the read finishes both likes should be counted
+    """
+    user = db.session.execute(db.select(User).filter_by(username="IamTest")).scalar()
+    other = User(username="OtherLiker", email="other_liker@test.com", password="x")
+    post = Post(text="Busy post", author=user.id)
+    db.session.add_all([other, post])
+    db.session.commit()
+    user_id, other_id, post_id = user.id, other.id, post.id
+    like_buffer = LikeBuffer(app, window=60)
+    reading = threading.Event()
+    release = threading.Event()
+    slow_answer = []
+
+    def slow_read(_conn, _cursor, statement, _parameters, _context, _executemany):
+        if threading.current_thread().name == "slow-like" and "like_count" in statement:
+            reading.set()
+            release.wait(10)
+
+    def slow_like():
+        with app.app_context():
+            slow_answer.append(like_buffer.toggle(user_id, post_id))
+            db.session.remove()
+
+    event.listen(db.engine, "before_cursor_execute", slow_read)
+    thread = threading.Thread(target=slow_like, name="slow-like")
+    try:
+        thread.start()
+        assert reading.wait(10)
+        began = time.perf_counter()
+        other_answer = like_buffer.toggle(other_id, post_id)
+        count = like_buffer.like_count(post_id, 0)
+        waited = time.perf_counter() - began
+        # The held up read is still waiting
+        assert not slow_answer
+    finally:
+        release.set()
+        thread.join(10)
+        event.remove(db.engine, "before_cursor_execute", slow_read)
+    like_buffer.flush()
+    db.session.expire_all()
+
+    assert waited < 1
+    assert other_answer == (True, 1)
+    assert count == 1
+    assert slow_answer == [(True, 2)]
+    assert db.session.get(Post, post_id).like_count == 2
+
+
+def test_080_post_card_cache_after_post_id_is_reused(app, test_client, create_user):
+    """
+    GIVEN a post whose card has been cached by someone viewing the forum
+    WHEN the post is deleted and another user's new post is given the same id
+    THEN the forum should show the new post and not the cached card of the deleted one
+    """
+    other = db.session.execute(db.select(User).filter_by(username="Other")).scalar()
+    if not other:
+        other = User(username="Other", email="other@test.com", password="x")
+        db.session.add(other)
+        db.session.commit()
+    test_client.post("/login", data={"email": "testingsample@test.com", "password": "123456"})
+    test_client.post("/create-post", data={"text": "Text of the deleted post"})
+    old_post = db.session.execute(db.select(Post).filter_by(text="Text of the deleted post")).scalar()
+    old_id = old_post.id
+    test_client.get("/logout")
+    before = test_client.get("/forum")
+    test_client.post("/login", data={"email": "testingsample@test.com", "password": "123456"})
+    test_client.get(f"/delete-post/{old_id}")
+    test_client.get("/logout")
+    new_post = Post(text="Text of the new post", author=other.id)
+    db.session.add(new_post)
+    db.session.commit()
+    after = test_client.get("/forum")
+    new_id = new_post.id
+    db.session.delete(new_post)
+    db.session.commit()
+
+    assert b"Text of the deleted post" in before.data
+    assert new_id == old_id
+    assert b"Text of the new post" in after.data
+    assert b"Text of the deleted post" not in after.data
+
+
+def test_081_database_broker_keeps_to_its_own_transaction(app, test_client, create_user):
+    """
+    GIVEN the database broker, and a post added to the session but not committed
+    WHEN an event is published, and a browser that missed it reconnects to another worker
+    THEN publishing should not commit the post, so rolling back leaves it out of the database
+        and the other worker, which has not read the missed event, should tell the browser to reload
+    """
+    user = db.session.execute(db.select(User).filter_by(username="IamTest")).scalar()
+    publisher = DatabaseBroker(app)
+    first_id = publisher.publish("like", {"post_id": 1, "like_count": 3})
+    db.session.add(Post(text="Not committed", author=user.id))
+    second_id = publisher.publish("like", {"post_id": 1, "like_count": 4})
+    db.session.rollback()
+    other_worker = DatabaseBroker(app, poll_interval=60)
+    try:
+        subscription = other_worker.subscribe(last_event_id=first_id)
+        event = subscription.get(0)
+    finally:
+        other_worker.close()
+
+    assert db.session.execute(db.select(Post).filter_by(text="Not committed")).scalar() is None
+    assert event == (second_id, "reload", {})